@@ -0,0 +1,11 @@
+"""
+Helpers shared by the benchmarks (imported as '_util': the benchmarks are run as scripts from this directory).
+"""
+import gc
+import timeit
+
+
+def best(function, repeat=5):
+    """Returns the shortest duration of a single call to the function, in seconds, among several runs."""
+    gc.collect()
+    return min(timeit.repeat(function, number=1, repeat=repeat))
@@ -0,0 +1,71 @@
+"""
+Benchmark of the batch rendering: one template rendered for many records given by column, with a main() call per
+record, with a compiled template rendered once per record, and with render_batch(). The first template only prints
+(evaluated column-wise), the second one also has a loop (executed record by record).
+
+Usage: python benchmarks/bench_batch.py [number of records]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _util import best  # noqa: E402
+from dumbo import main  # noqa: E402
+from dumbo_core.batch import render_batch  # noqa: E402
+from dumbo_core.bindings import bind_data  # noqa: E402
+from dumbo_core.dumbo_transformers import compile_template  # noqa: E402
+
+TEMPLATES = [
+    ("prints only", "<html><head><title>{{ print site; }}</title></head><body>\n<h1>{{ print nom; }}</h1>\n"
+                    "<p>{{ print 'Âge : '.age.', ville : '.adresse.ville; }}</p>\n<footer>{{ print site; }}</footer>"
+                    "</body></html>\n"),
+    ("with a loop", "<html><body>\n<h1>{{ print nom; }}</h1>\n<ul>{{ for t in tags do print '<li>'.t.'</li>'; "
+                    "endfor; }}</ul>\n<p>{{ print adresse.ville; }}</p></body></html>\n"),
+]
+
+
+def columns(count):
+    return {
+        "nom": [f"nom{i}" for i in range(count)],
+        "age": [i % 90 for i in range(count)],
+        "adresse": [{"ville": f"ville{i % 100}"} for i in range(count)],
+        "tags": [[f"t{i}", f"t{i + 1}"] for i in range(count)],
+    }
+
+
+def records(data, count):
+    return [{name: column[i] for name, column in data.items()} for i in range(count)]
+
+
+def per_record_main(text, rows, shared):
+    return [main({**shared, **row}, text) for row in rows]
+
+
+def per_record_compiled(text, rows, shared):
+    template = compile_template(text, bind_data({**shared, **rows[0]}))
+    return [template.render(bind_data({**shared, **row})) for row in rows]
+
+
+def batch(text, data, shared):
+    return list(render_batch(text, data, symbol_table=bind_data(shared)))
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    data = columns(count)
+    rows = records(data, count)
+    shared = {"site": "Dumbo"}
+
+    print(f"{count} records")
+    for name, text in TEMPLATES:
+        assert batch(text, data, shared) == per_record_main(text, rows[:100], shared) + \
+            per_record_compiled(text, rows[100:], shared)
+        main_loop = best(lambda: per_record_main(text, rows, shared), repeat=1)
+        compiled = best(lambda: per_record_compiled(text, rows, shared), repeat=3)
+        batched = best(lambda: batch(text, data, shared), repeat=3)
+        print(name)
+        print(f"  main() per record:   {main_loop * 1000:9.1f} ms  {main_loop / count * 1e6:7.1f} us per record")
+        print(f"  compiled per record: {compiled * 1000:9.1f} ms  {compiled / count * 1e6:7.1f} us per record")
+        print(f"  render_batch():      {batched * 1000:9.1f} ms  {batched / count * 1e6:7.1f} us per record  "
+              f"({main_loop / batched:.0f}x main, {compiled / batched:.1f}x compiled)")
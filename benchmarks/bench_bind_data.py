@@ -0,0 +1,53 @@
+"""
+Benchmark of the Python data binding: data held as Python dicts and lists, rendered after serializing it into a
+Dumbo data file (parsed back by main()), and after binding it directly (bind_data()).
+
+Usage: python benchmarks/bench_bind_data.py [number of records]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _util import best  # noqa: E402
+from dumbo import main  # noqa: E402
+
+TEMPLATE = "<h1>{{ print titre; }}</h1><ul>{{ for p in gens where p.age > 80 limit 10 do " \
+           "print '<li>'.p.nom.'</li>'; endfor; }}</ul><p>{{ print join(tags, ', '); }}</p>\n"
+
+
+def python_data(count):
+    return {
+        "titre": "Liste",
+        "tags": [f"tag{i}" for i in range(count)],
+        "gens": [{"nom": f"nom{i}", "age": i % 90} for i in range(count)],
+    }
+
+
+def serialize(data):
+    # ce que faisaient les services : écrire les données en Dumbo pour que main() les parse
+    statements = []
+    for name, value in data.items():
+        if isinstance(value, str):
+            statements.append(f"{name} := '{value}';")
+        elif value and isinstance(value[0], dict):
+            records = ", ".join("(" + ", ".join(f"{key}: '{item}'" if isinstance(item, str) else f"{key}: {item}"
+                                                for key, item in record.items()) + ")" for record in value)
+            statements.append(f"{name} := ({records});")
+        else:
+            statements.append(f"{name} := (" + ", ".join(f"'{item}'" for item in value) + ");")
+    return "{{ " + " ".join(statements) + " }}"
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    data = python_data(count)
+
+    assert main(serialize(data), TEMPLATE) == main(data, TEMPLATE)
+    serialized = best(lambda: main(serialize(data), TEMPLATE), repeat=3)
+    bound = best(lambda: main(data, TEMPLATE), repeat=3)
+    template_only = best(lambda: main({"titre": "", "tags": [], "gens": []}, TEMPLATE), repeat=3)
+    print(f"{count} records and strings")
+    print(f"serialized and parsed: {serialized * 1000:9.1f} ms")
+    print(f"bound:                 {bound * 1000:9.1f} ms  ({serialized / bound:.0f}x)")
+    print(f"template only:         {template_only * 1000:9.1f} ms")
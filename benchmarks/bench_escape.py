@@ -0,0 +1,47 @@
+"""
+Benchmark of the HTML escaping: throughput of a loop printing a large list of strings, raw, escaped on the first
+rendering (the escaped list is computed) and escaped on the next ones (the escaped list is cached on the data).
+
+Usage: python benchmarks/bench_escape.py [number of strings]
+"""
+import html
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _util import best  # noqa: E402
+from dumbo import load_data  # noqa: E402
+from dumbo_core.dumbo_transformers import parse_inline  # noqa: E402
+from dumbo_core.escaping import HTML_ESCAPE_TABLE, escape_html  # noqa: E402
+
+TEMPLATE = "<ul>{{ for l in lignes do print '<li>'; print l; print '</li>'; endfor; }}</ul>"
+ESCAPED_TEMPLATE = "<ul>{{ for l in lignes do print raw '<li>'; print l; print raw '</li>'; endfor; }}</ul>"
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    strings = [f"<b>ligne {i}</b> & \"co\"" for i in range(size)]
+    data = "{{ lignes := (" + ", ".join(f"'{s}'" for s in strings) + "); }}"
+    symbol_table = load_data(data, None)
+    megabytes = sum(len(s) for s in strings) / 1e6
+
+    raw = best(lambda: parse_inline(TEMPLATE, symbol_table.copy()))
+
+    start = time.perf_counter()
+    parse_inline(ESCAPED_TEMPLATE, symbol_table.copy(), autoescape=True)
+    cold = time.perf_counter() - start
+    warm = best(lambda: parse_inline(ESCAPED_TEMPLATE, symbol_table.copy(), autoescape=True))
+
+    replace = best(lambda: [escape_html(s) for s in strings])
+    translate = best(lambda: [s.translate(HTML_ESCAPE_TABLE) for s in strings])
+    html_escape = best(lambda: [html.escape(s) for s in strings])
+
+    print(f"{size} strings, {megabytes:.2f} MB")
+    print(f"raw rendering:              {raw * 1000:8.1f} ms")
+    print(f"escaped rendering (first):  {cold * 1000:8.1f} ms")
+    print(f"escaped rendering (cached): {warm * 1000:8.1f} ms")
+    print(f"escape_html:                {replace * 1000:8.1f} ms ({megabytes / replace:.0f} MB/s)")
+    print(f"str.translate table:        {translate * 1000:8.1f} ms ({megabytes / translate:.0f} MB/s)")
+    print(f"html.escape:                {html_escape * 1000:8.1f} ms ({megabytes / html_escape:.0f} MB/s)")
@@ -0,0 +1,64 @@
+"""
+Benchmark of the lowering of a large data file and a large template: parse tree + Transformer versus
+the transformer applied by the LALR parser while parsing (no parse tree).
+
+Usage: python benchmarks/bench_inline_lowering.py [number of variables]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import dumbo_core.dumbo_transformers as dt  # noqa: E402
+from dumbo import get_parser  # noqa: E402
+
+
+def build(variables):
+    data = "{{\n" + "".join(f"v{i} := 'valeur {i}';\n" for i in range(variables)) + "}}\n"
+    # le template est découpé en petits blocs : la règle programme est récursive, l'arbre reste dans la limite
+    template = "".join(f"<p>{{{{ print v{i}; }}}}</p>\n" for i in range(0, variables, 10))
+    return data, template
+
+
+def with_tree(data, template):
+    symbol_table = dt.SymbolTable()
+    dt.DumboBlocTransformer(symbol_table, dt.IntermediateCodeInterpreter()).transform(get_parser().parse(data))
+    return dt.DumboTemplateTransformer(symbol_table).transform(get_parser().parse(template))
+
+
+def inline(data, template):
+    symbol_table = dt.SymbolTable()
+    dt.parse_inline(data, symbol_table)
+    return dt.parse_inline(template, symbol_table)
+
+
+def measure(function, *args):
+    # le temps et le pic de mémoire sont mesurés séparément, tracemalloc ralentit beaucoup l'exécution
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == "__main__":
+    variables = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    # l'arbre du fichier data est aussi profond que le nombre d'instructions
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * variables))
+    data, template = build(variables)
+    get_parser()
+    inline("{{ }}", "")  # chargement des grammaires hors mesure
+
+    tree_output, tree_time, tree_peak = measure(with_tree, data, template)
+    inline_output, inline_time, inline_peak = measure(inline, data, template)
+    assert tree_output == inline_output
+
+    print(f"{variables} variables, {len(data) / 2 ** 20:.1f} MB data, {len(template) / 2 ** 10:.0f} KB template")
+    print(f"tree   : {tree_time:.2f} s, peak {tree_peak / 2 ** 20:.1f} MB")
+    print(f"inline : {inline_time:.2f} s, peak {inline_peak / 2 ** 20:.1f} MB")
@@ -0,0 +1,45 @@
+"""
+Benchmark of the demand-driven evaluation of data files: a data file of 100k variables and a template reading 10 of
+them, rendered after executing the whole data file and after loading it lazily.
+
+Usage: python benchmarks/bench_lazy_data.py [number of variables]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _util import best  # noqa: E402
+from dumbo import load_data  # noqa: E402
+from dumbo_core.dumbo_transformers import parse_inline  # noqa: E402
+
+
+def data_file(size):
+    # des chaînes, des listes et des calculs qui dépendent des variables précédentes
+    statements = []
+    for i in range(size):
+        if i % 3 == 0:
+            statements.append(f"v{i} := 'valeur {i}';")
+        elif i % 3 == 1:
+            statements.append(f"v{i} := ('a{i}', 'b{i}', 'c{i}');")
+        else:
+            statements.append(f"v{i} := len(v{i - 1}) * {i};")
+    return "{{\n" + "\n".join(statements) + "\n}}\n"
+
+
+def render(data, template, lazy):
+    return parse_inline(template, load_data(data, None, lazy=lazy))
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    data = data_file(size)
+    read = [size * k // 10 + 2 for k in range(10)]
+    template = "<ul>{{ " + " ".join(f"print '<li>'.v{i}.'</li>';" for i in read) + " }}</ul>\n"
+
+    assert render(data, template, lazy=True) == render(data, template, lazy=False)
+    eager = best(lambda: render(data, template, lazy=False), repeat=3)
+    lazy = best(lambda: render(data, template, lazy=True))
+    print(f"{size} variables, {len(read)} read ({len(data) / 1e6:.1f} MB)")
+    print(f"eager: {eager * 1000:9.1f} ms")
+    print(f"lazy:  {lazy * 1000:9.1f} ms  ({eager / lazy:.0f}x)")
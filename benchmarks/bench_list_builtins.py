@@ -0,0 +1,38 @@
+"""
+Benchmark of the list built-ins: join() and len() against the equivalent loop-based templates.
+
+Usage: python benchmarks/bench_list_builtins.py [number of elements]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _util import best  # noqa: E402
+from dumbo import load_data  # noqa: E402
+from dumbo_core.dumbo_transformers import parse_inline  # noqa: E402
+
+CASES = [
+    ("join", "{{ for l in lignes do print l.', '; endfor; }}", "{{ print join(lignes, ', ').', '; }}"),
+    ("slice + join", "{{ for l in lignes do print l; endfor; }}", "{{ print join(lignes[0:], ''); }}"),
+    ("sum", None, "{{ print sum(nombres); }}"),
+    ("len", None, "{{ print len(lignes); }}"),
+]
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    data = "{{ lignes := (" + ", ".join(f"'ligne {i}'" for i in range(size)) + "); " \
+           "nombres := (" + ", ".join(str(i) for i in range(1, size + 1)) + "); }}"
+    symbol_table = load_data(data, None)
+
+    print(f"{size} elements")
+    for name, loop_template, builtin_template in CASES:
+        builtin = best(lambda: parse_inline(builtin_template, symbol_table.copy()))
+        if loop_template is None:
+            # pas d'équivalent sous forme de boucle (pas de compteur dans le langage)
+            print(f"{name:14} loop:      n/a    built-in: {builtin * 1000:8.2f} ms")
+            continue
+        assert parse_inline(loop_template, symbol_table.copy()) == parse_inline(builtin_template, symbol_table.copy())
+        loop = best(lambda: parse_inline(loop_template, symbol_table.copy()))
+        print(f"{name:14} loop: {loop * 1000:8.2f} ms  built-in: {builtin * 1000:8.2f} ms  ({loop / builtin:.0f}x)")
@@ -0,0 +1,44 @@
+"""
+Benchmark of the overhead of the metrics collection, disabled and enabled (the template filters a list of records
+with a 'where' clause, which must keep its native filter when the instructions are counted).
+
+Usage: python benchmarks/bench_metrics.py [repeat]
+"""
+import gc
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dumbo import main  # noqa: E402
+from dumbo_core.metrics import disable_metrics, enable_metrics  # noqa: E402
+
+# données Python (bind_data) : le rendu est mesuré sans le parsing d'un fichier data
+DATA = {"titre": "Titre", "lignes": [f"ligne {i}" for i in range(300)],
+        "gens": [{"nom": f"nom {i}", "age": i % 90} for i in range(20000)]}
+TEMPLATE = "<h1>{{ print titre; }}</h1>\n" * 50 + "{{ for l in lignes do print '<td>'.l.'</td>'; endfor; }}" \
+           "{{ for p in gens where p.age >= 89 do print p.nom; endfor; }}"
+
+
+def render():
+    main(DATA, TEMPLATE)
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    render()  # chargement des grammaires hors mesure
+
+    # les deux modes sont alternés pour que le bruit de la machine les touche de la même façon
+    disabled = enabled = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        disable_metrics()
+        disabled = min(disabled, timeit.timeit(render, number=1))
+        gc.collect()
+        enable_metrics()
+        enabled = min(enabled, timeit.timeit(render, number=1))
+    disable_metrics()
+
+    print(f"metrics disabled : {disabled * 1000:.2f} ms")
+    print(f"metrics enabled  : {enabled * 1000:.2f} ms ({(enabled / disabled - 1) * 100:+.1f} %)")
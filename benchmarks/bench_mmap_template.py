@@ -0,0 +1,49 @@
+"""
+Benchmark of the peak memory (RSS) when rendering a large, mostly static template, with and without --mmap.
+
+Usage: python benchmarks/bench_mmap_template.py [size in MB]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def build(directory, size_mb):
+    data_path = os.path.join(directory, "data.dumbo")
+    with open(data_path, "w") as f:
+        f.write("{{ titre := 'Titre'; }}")
+
+    template_path = os.path.join(directory, "template.dumbo")
+    line = "<p>" + "texte statique " * 6 + "</p>\n"
+    chunk = line * (1024 * 1024 // len(line))
+    with open(template_path, "w") as f:
+        for _ in range(size_mb):
+            f.write("<h1>{{ print titre; }}</h1>\n")
+            f.write(chunk)
+    return data_path, template_path
+
+
+def run(data_path, template_path, *flags):
+    # chaque mode tourne dans son propre processus pour mesurer son pic de mémoire
+    code = "import resource, runpy, sys; sys.argv = sys.argv[1:]; " \
+           "sys.stdout = open(__import__('os').devnull, 'w'); " \
+           "runpy.run_path(sys.argv[0], run_name='__main__'); " \
+           "sys.stderr.write(str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))"
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code, os.path.join(ROOT, "dumbo.py"), data_path, template_path,
+                             *flags], capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, int(result.stderr.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.TemporaryDirectory() as directory:
+        data_path, template_path = build(directory, size_mb)
+        print(f"template: {os.path.getsize(template_path) / 2 ** 20:.1f} MB")
+        for flags in [(), ("--mmap",)]:
+            elapsed, max_rss = run(data_path, template_path, *flags)
+            print(f"{' '.join(flags) or 'default':8}: {elapsed:.2f} s, max RSS {max_rss / 1024:.1f} MB")
@@ -0,0 +1,82 @@
+"""
+Benchmark of the output pipeline: rendered bytes written per second to a sink, plain, minified, compressed with gzip
+while rendering, and through the previous approach (render the whole document, minify it, then compress it).
+
+The rendering itself dominates the time: the streamed pipeline is mostly about memory, so the peak of the memory
+allocated during each case is measured too (tracemalloc, separate run).
+
+Usage: python benchmarks/bench_output.py [number of rows]
+"""
+import gc
+import gzip
+import os
+import re
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _util import best  # noqa: E402
+from dumbo import load_data  # noqa: E402
+from dumbo_core.dumbo_transformers import parse_inline  # noqa: E402
+from dumbo_core.output import CompressedSink  # noqa: E402
+
+ROW = "    <tr>\n        <td class=\"c\">  ligne  </td>\n        <td>{{ print t; }}</td>\n    </tr>\n"
+
+
+class NullSink:
+    """A binary sink counting the bytes written to it."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+def streamed(template, symbol_table, minify=False, compression=None):
+    sink = null = NullSink()
+    if compression is not None:
+        sink = CompressedSink(null, compression)
+    parse_inline(template, symbol_table.copy(), minify=minify, sink=sink)
+    if compression is not None:
+        sink.close()
+    return null.size
+
+
+def buffered(template, symbol_table):
+    # l'approche précédente : tout le document en mémoire, puis minifié, puis compressé
+    output = parse_inline(template, symbol_table.copy())
+    return len(gzip.compress(re.sub(r"\s{2,}", " ", output).encode("utf-8"), 6))
+
+
+def peak_memory(function):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    template = "<table>\n" + ROW * rows + "</table>\n"
+    symbol_table = load_data("{{ t := 'valeur'; }}", None)
+    rendered = len(parse_inline(template, symbol_table.copy()).encode("utf-8"))
+
+    print(f"{rows} rows, {rendered / 1e6:.1f} MB rendered")
+    cases = [
+        ("string", lambda: len(parse_inline(template, symbol_table.copy()))),
+        ("streamed", lambda: streamed(template, symbol_table)),
+        ("minify", lambda: streamed(template, symbol_table, minify=True)),
+        ("gzip", lambda: streamed(template, symbol_table, compression="gzip")),
+        ("minify + gzip", lambda: streamed(template, symbol_table, minify=True, compression="gzip")),
+        ("buffered pipeline", lambda: buffered(template, symbol_table)),
+    ]
+    for name, function in cases:
+        written = function()
+        duration = best(function)
+        print(f"{name:18} {duration * 1000:8.1f} ms  {rendered / duration / 1e6:6.1f} MB/s rendered  "
+              f"{written / 1e6:5.2f} MB written  peak {peak_memory(function) / 1e6:6.1f} MB")
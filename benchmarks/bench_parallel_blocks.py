@@ -0,0 +1,55 @@
+"""
+Benchmark of the parallel rendering of independent dumbo blocs.
+
+Both runs use the same pipeline (the template is compiled once, as main() does with jobs > 1): sequentially (no
+executor), then with the independent blocs sent to a pool of worker processes. The grammar, the data file and the
+pool are warmed up first, so only the rendering is measured.
+
+Usage: python benchmarks/bench_parallel_blocks.py [jobs]
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _util import best  # noqa: E402
+from dumbo import load_data  # noqa: E402
+from dumbo_core.dumbo_transformers import compile_template  # noqa: E402
+
+BLOCS = 8
+ROWS = 300
+CELLS = 20
+
+
+def build():
+    items = ", ".join(f"'ligne {i}'" for i in range(ROWS))
+    data = f"{{{{ lignes := ({items}); titre := 'Tableau'; }}}}"
+    cells = " ".join("print '<td>'.titre.'</td><td>'.l.'</td>';" for _ in range(CELLS))
+    bloc = f"{{{{ for l in lignes do print '<tr>'; {cells} print '</tr>'; endfor; }}}}"
+    template = "<table>\n" + "\n".join(bloc for _ in range(BLOCS)) + "\n</table>\n"
+    return data, template
+
+
+def render(template, symbol_table, executor):
+    return template.render(symbol_table, executor=executor)
+
+
+if __name__ == "__main__":
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    data, template = build()
+    symbol_table = load_data(data, None, lazy=False)
+    template = compile_template(template, symbol_table)
+
+    with ProcessPoolExecutor(jobs) as executor:
+        # les processus du pool sont démarrés et ont importé dumbo_core avant la mesure
+        sequential_out = render(template, symbol_table, None)
+        assert render(template, symbol_table, executor) == sequential_out, \
+            "parallel output differs from the sequential one"
+
+        sequential_time = best(lambda: render(template, symbol_table, None))
+        parallel_time = best(lambda: render(template, symbol_table, executor))
+
+    print(f"{BLOCS} blocs x {ROWS} rows x {CELLS} cells, {os.cpu_count()} CPU(s)")
+    print(f"sequential : {sequential_time:.3f} s")
+    print(f"{jobs} jobs     : {parallel_time:.3f} s (x{sequential_time / parallel_time:.2f})")
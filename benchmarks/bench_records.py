@@ -0,0 +1,54 @@
+"""
+Benchmark of the records: memory of a list of records stored by column (RecordList) compared with one Record, or one
+dictionary of Variable, per record, and time of a loop reading two fields of each record.
+
+Usage: python benchmarks/bench_records.py [number of records]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _util import best  # noqa: E402
+from dumbo import load_data  # noqa: E402
+from dumbo_core.dumbo_transformers import parse_inline  # noqa: E402
+from dumbo_core.symbol_table import INT, STRING, Record, RecordList, Variable, record_layout  # noqa: E402
+
+FIELDS_TEMPLATE = "{{ for p in gens do print p.nom.' '.p.age.' '; endfor; }}"
+# même boucle sur une liste de chaînes : le coût du parcours seul
+LIST_TEMPLATE = "{{ for p in noms do print p.' '.p.' '; endfor; }}"
+
+
+def allocated(function):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = function()  # noqa: F841 (gardé en vie pendant la mesure)
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    names = [f"nom{i}" for i in range(count)]
+    layout = record_layout(("nom", "age"))
+
+    print(f"{count} records (nom, age)")
+    cases = [
+        ("dict of Variable", lambda: [{"nom": Variable("nom", STRING, n), "age": Variable("age", INT, i)}
+                                      for i, n in enumerate(names)]),
+        ("Record", lambda: [Record(layout, (n, i)) for i, n in enumerate(names)]),
+        ("RecordList", lambda: RecordList(layout, [list(names), list(range(count))])),
+    ]
+    for name, function in cases:
+        print(f"{name:18} {allocated(function) / count:6.1f} bytes per record")
+
+    data = "{{ gens := (" + ", ".join(f"(nom: '{n}', age: {i})" for i, n in enumerate(names)) + "); noms := (" \
+           + ", ".join(f"'{n}'" for n in names) + "); }}"
+    symbol_table = load_data(data, None)
+    for name, template in [("loop on strings", LIST_TEMPLATE), ("loop on records", FIELDS_TEMPLATE)]:
+        duration = best(lambda: parse_inline(template, symbol_table.copy()))
+        print(f"{name:18} {duration * 1000:8.1f} ms  {duration / count * 1e9:6.0f} ns per record")
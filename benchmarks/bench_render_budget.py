@@ -0,0 +1,46 @@
+"""
+Benchmark of the overhead of a render budget whose limits are enabled but not hit.
+
+Usage: python benchmarks/bench_render_budget.py [repeat]
+"""
+import gc
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dumbo import main  # noqa: E402
+from dumbo_core.intermediate_code_interpreter import RenderBudget  # noqa: E402
+
+ROWS = 300
+PRINTS = 50
+
+DATA = "{{ lignes := (" + ", ".join(f"'ligne {i}'" for i in range(ROWS)) + "); }}"
+TEMPLATE = "{{ for l in lignes do " + "print '<td>'.l.'</td>'; " * PRINTS + "endfor; }}"
+
+
+def without_budget():
+    main(DATA, TEMPLATE)
+
+
+def with_budget():
+    main(DATA, TEMPLATE, budget=RenderBudget(max_instructions=10 ** 9, max_loop_iterations=10 ** 9,
+                                             max_output_size=10 ** 12, timeout=3600))
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    without_budget()  # chargement des grammaires hors mesure
+
+    # les deux versions sont alternées pour que le bruit de la machine les touche de la même façon
+    reference = limited = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        reference = min(reference, timeit.timeit(without_budget, number=1))
+        gc.collect()
+        limited = min(limited, timeit.timeit(with_budget, number=1))
+
+    print(f"{ROWS * (PRINTS + 1)} instructions per render")
+    print(f"no budget      : {reference * 1000:.1f} ms")
+    print(f"budget, no hit : {limited * 1000:.1f} ms ({(limited / reference - 1) * 100:+.1f} %)")
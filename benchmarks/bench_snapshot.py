@@ -0,0 +1,46 @@
+"""
+Benchmark of the data file snapshots (compile-data): time to load a large data file written in Dumbo (executed
+eagerly, or lazily) and its snapshot, and time until every variable has been read.
+
+Usage: python benchmarks/bench_snapshot.py [number of list elements]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _util import best  # noqa: E402
+from dumbo import load_data  # noqa: E402
+from dumbo_core.snapshot import compile_data  # noqa: E402
+
+
+def data_file(count):
+    # des variables simples, une grande liste de chaînes, une liste d'entiers et une liste d'enregistrements
+    scalars = " ".join(f"v{i} := 'valeur {i}';" for i in range(1000))
+    strings = ", ".join(f"'nom{i}'" for i in range(count))
+    integers = ", ".join(str(i) for i in range(count))
+    records = ", ".join(f"(nom: 'nom{i}', age: {i % 90})" for i in range(count // 10))
+    return f"{{{{ {scalars} noms := ({strings}); ages := ({integers}); gens := ({records}); }}}}"
+
+
+def read_all(symbol_table):
+    for name in list(symbol_table.get_localScope()):
+        symbol_table.get(name).get_value()
+    return symbol_table
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    text = data_file(count)
+    snapshot = compile_data(text)
+
+    print(f"{count} list elements: data file {len(text) / 1e6:.1f} MB, snapshot {len(snapshot) / 1e6:.1f} MB")
+    cases = [
+        ("eager", lambda: load_data(text, None, lazy=False)),
+        ("lazy", lambda: load_data(text, None)),
+        ("lazy, all read", lambda: read_all(load_data(text, None))),
+        ("snapshot", lambda: load_data(snapshot, None)),
+        ("snapshot, all read", lambda: read_all(load_data(snapshot, None))),
+    ]
+    for name, function in cases:
+        print(f"{name:20} {best(function, repeat=3) * 1000:10.2f} ms")
@@ -0,0 +1,47 @@
+"""
+Benchmark of the spool workers: throughput (jobs per second) with 1, 2 and 4 worker processes.
+
+The throughput can only scale with the number of workers if the machine has enough cores (or if the workers run on
+several nodes sharing the spool directory).
+
+Usage: python benchmarks/bench_spool_workers.py [number of jobs]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dumbo_core.spool import submit_job  # noqa: E402
+
+DUMBO = os.path.join(os.path.dirname(__file__), "..", "dumbo.py")
+
+
+def run(directory, jobs, workers):
+    spool = os.path.join(directory, f"spool{workers}")
+    for i in range(jobs):
+        submit_job(spool, os.path.join(directory, "page.dumbo"), os.path.join(directory, "data.dumbo"),
+                   os.path.join(directory, f"out{workers}", f"page{i}.html"))
+
+    start = time.perf_counter()
+    processes = [subprocess.Popen([sys.executable, DUMBO, "worker", spool, "--exit-when-empty"])
+                 for _ in range(workers)]
+    for process in processes:
+        process.wait()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print(f"{os.cpu_count()} CPU(s), {jobs} jobs")
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "data.dumbo"), "w") as f:
+            f.write("{{ lignes := (" + ", ".join(f"'ligne {i}'" for i in range(200)) + "); }}")
+        with open(os.path.join(directory, "page.dumbo"), "w") as f:
+            f.write("<ul>{{ for l in lignes do print '<li>'.l.'</li>'; endfor; }}</ul>\n")
+
+        for workers in (1, 2, 4):
+            elapsed = run(directory, jobs, workers)
+            print(f"{workers} worker(s): {elapsed:.2f} s, {jobs / elapsed:.0f} jobs/s")
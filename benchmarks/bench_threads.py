@@ -0,0 +1,54 @@
+"""
+Benchmark of concurrent renderings: renderings per second of one compiled template shared by 1 to 32 threads.
+
+With the GIL, the threads take turns and the throughput stays flat. On a free-threaded build of CPython (3.13t and
+later, run with PYTHON_GIL=0), the renderings run in parallel and the throughput should grow with the number of
+threads, up to the number of cores.
+
+Usage: python benchmarks/bench_threads.py [renderings per thread count]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dumbo import load_data  # noqa: E402
+from dumbo_core.dumbo_transformers import compile_template  # noqa: E402
+
+DATA = "{{ titre := 'Liste'; lignes := (" + ", ".join(f"'ligne {i}'" for i in range(300)) + "); }}"
+TEMPLATE = "<h1>{{ print titre; }}</h1><ul>{{ for l in lignes do print '<li>'.l.'</li>'; endfor; }}</ul>\n"
+
+
+def run(template, symbol_table, threads, renderings):
+    per_thread = renderings // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def render():
+        barrier.wait()
+        for _ in range(per_thread):
+            template.render(symbol_table)
+
+    workers = [threading.Thread(target=render) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    renderings = int(sys.argv[1]) if len(sys.argv) > 1 else 640
+    gil = sys._is_gil_enabled() if hasattr(sys, "_is_gil_enabled") else True
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}, {os.cpu_count()} CPU(s)")
+
+    symbol_table = load_data(DATA, None)
+    template = compile_template(TEMPLATE, symbol_table)
+    base = None
+    for threads in (1, 2, 4, 8, 16, 32):
+        throughput = run(template, symbol_table, threads, renderings)
+        base = base or throughput
+        print(f"{threads:2} thread(s): {throughput:8.0f} renderings/s ({throughput / base:.2f}x)")
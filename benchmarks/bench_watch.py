@@ -0,0 +1,61 @@
+"""
+Benchmark of the watch mode: latency of the rebuild of one page in a site of many pages, with the changes notified
+by the system (inotify, Linux only) and with the signature of every file polled.
+
+Usage: python benchmarks/bench_watch.py [number of pages]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dumbo import get_parser  # noqa: E402
+from dumbo_core.watch import Watcher  # noqa: E402
+
+
+def build(directory, pages):
+    data_path = os.path.join(directory, "data.dumbo")
+    with open(data_path, "w") as f:
+        f.write("{{ titre := 'Site'; menu := ('Accueil', 'Blog', 'Contact'); }}")
+
+    template_dir = os.path.join(directory, "templates")
+    os.makedirs(template_dir)
+    with open(os.path.join(template_dir, "_header.dumbo"), "w") as f:
+        f.write("<h1>{{ print titre; }}</h1><ul>{{ for m in menu do print '<li>'.m.'</li>'; endfor; }}</ul>\n")
+    for i in range(pages):
+        with open(os.path.join(template_dir, f"page{i}.dumbo"), "w") as f:
+            f.write(f"<html>{{{{ include '_header.dumbo'; }}}}<p>page {i}</p></html>\n")
+    return data_path, template_dir
+
+
+def measure(pages, notify):
+    latencies = []
+    with tempfile.TemporaryDirectory() as directory:
+        data_path, template_dir = build(directory, pages)
+        watcher = Watcher(get_parser(), data_path, template_dir, os.path.join(directory, "out"),
+                          log=lambda message: None, notify=notify)
+
+        start = time.perf_counter()
+        watcher.build()
+        build_time = time.perf_counter() - start
+
+        for i in range(20):
+            with open(os.path.join(template_dir, f"page{i}.dumbo"), "a") as f:
+                f.write(" ")
+            start = time.perf_counter()
+            assert len(watcher.poll()) == 1
+            latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    return build_time, latencies[len(latencies) // 2], latencies[-1]
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    measure(10, True)  # la grammaire est chargée avant la mesure
+    for notify in (True, False):
+        build_time, median, worst = measure(pages, notify)
+        print(f"{'notified' if notify else 'polled'}: initial build of {pages} pages: {build_time:.2f} s")
+        print(f"  one page changed (poll + render): median {median * 1000:.1f} ms, max {worst * 1000:.1f} ms")
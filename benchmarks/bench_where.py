@@ -0,0 +1,37 @@
+"""
+Benchmark of the 'where' and 'limit' clauses of the loops on a list of records: the first matches of a large list,
+all its matches, and a loop over the whole list (what a selection costs when every element goes through the loop
+body).
+
+Usage: python benchmarks/bench_where.py [number of records]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _util import best  # noqa: E402
+from dumbo_core.dumbo_transformers import compile_template  # noqa: E402
+from dumbo_core.symbol_table import LIST, RecordList, SymbolTable, Variable, record_layout  # noqa: E402
+
+# un enregistrement sur 10 correspond au filtre
+TEMPLATES = [
+    ("first 20 matches", "{{ for p in gens where p.groupe = 3 limit 20 do print p.nom.' '; endfor; }}"),
+    ("all matches", "{{ for p in gens where p.groupe = 3 do print p.nom.' '; endfor; }}"),
+    ("two conditions", "{{ for p in gens where p.groupe = 3 and p.age >= 0 do print p.nom.' '; endfor; }}"),
+    ("full loop", "{{ for p in gens do print p.nom.' '; endfor; }}"),
+]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    records = RecordList(record_layout(("nom", "age", "groupe")),
+                         [[f"nom{i}" for i in range(count)], list(range(count)), [i % 10 for i in range(count)]])
+    symbol_table = SymbolTable()
+    symbol_table.add_variable(Variable("gens", LIST, records))
+
+    print(f"{count} records, 1 in 10 matches")
+    for name, text in TEMPLATES:
+        template = compile_template(text, symbol_table)
+        duration = best(lambda: template.render(symbol_table))
+        print(f"{name:18} {duration * 1000:9.2f} ms  {duration / count * 1e9:6.0f} ns per record")
@@ -1,33 +1,140 @@
-import argparse
 import os
 import sys
 
-import dumbo_core.dumbo_transformers as dt
-from lark import Lark
+# les modules lourds (lark, dumbo_core, multiprocessing) ne sont importés qu'au moment du rendu :
+# les erreurs de la ligne de commande (codes de sortie 1, 2 et 3) doivent rester instantanées
+_lark_parser = None
 
 
-def main(data_file, template_file):
-    lark_parser = Lark.open("dumbo_core/dumbo.lark", parser='lalr', rel_to=__file__)
+def get_parser():
+    # la grammaire n'est chargée qu'une seule fois par processus
+    global _lark_parser
+    if _lark_parser is None:
+        import time
+        from dumbo_core.metrics import get_metrics
+        from lark import Lark
 
+        start = time.perf_counter()
+        _lark_parser = Lark.open("dumbo_core/dumbo.lark", parser='lalr', rel_to=__file__)
+        if get_metrics() is not None:
+            get_metrics().observe("dumbo_grammar_load_seconds", time.perf_counter() - start)
+    return _lark_parser
+
+
+def load_data(data_file, loader, budget=None, lazy=True):
+    from collections.abc import Mapping
+    import dumbo_core.dumbo_transformers as dt
+    from dumbo_core.bindings import bind_data
+    from dumbo_core.lazy_data import load_lazy
+    from dumbo_core.snapshot import is_snapshot, load_snapshot
+
+    if isinstance(data_file, Mapping):
+        # données Python (dict) : aucun fichier data à parser, chaque valeur est convertie à sa première lecture
+        return bind_data(data_file)
+    if is_snapshot(data_file):
+        # fichier data déjà exécuté (compile-data) : les valeurs sont décodées à la demande
+        return load_snapshot(data_file)
+
+    if lazy:
+        # chaque variable n'est évaluée que lorsque le template la lit pour la première fois
+        global_symbol_table = load_lazy(data_file, budget=budget)
+        if global_symbol_table is not None:
+            return global_symbol_table
+
+    # le fichier data est exécuté pendant son parsing, sans construire d'arbre
     global_symbol_table = dt.SymbolTable()
+    dt.parse_inline(data_file, global_symbol_table, loader=loader, budget=budget, name="<data>")
+
+    return global_symbol_table
+
+
+def main(data_file, template_file, template_dir=".", jobs=1, budget=None, template_name="<template>",
+         autoescape=False, minify=False, sink=None):
+    import dumbo_core.dumbo_transformers as dt
+    from dumbo_core.metrics import get_metrics
+    from dumbo_core.template_loader import TemplateLoader
+
+    if get_metrics() is not None and jobs <= 1:
+        # avec jobs > 1, le rendu est compté par CompiledTemplate.render
+        get_metrics().inc("dumbo_renders_total", template=template_name)
+
+    lark_parser = get_parser()
+    # les partials inclus sont résolus par rapport au dossier du template
+    loader = TemplateLoader(lark_parser, template_dir)
 
-    data_tree = lark_parser.parse(data_file)
-    data_tree_parser = dt.DumboBlocTransformer(global_symbol_table, dt.IntermediateCodeInterpreter())
-    data_tree_parser.transform(data_tree)
+    # le budget (dt.RenderBudget) couvre le fichier data et le template
+    global_symbol_table = load_data(data_file, loader, budget=budget)
 
-    template_tree = lark_parser.parse(template_file)
-    template_tree_parser = dt.DumboTemplateTransformer(global_symbol_table)
-    out = template_tree_parser.transform(template_tree)
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # le template est compilé sans arbre, puis les blocs indépendants sont exécutés par les autres processus
+        template = dt.compile_template(template_file, global_symbol_table, loader=loader, name=template_name,
+                                       minify=minify)
+        with ProcessPoolExecutor(jobs) as executor:
+            out = template.render(global_symbol_table, budget=budget, autoescape=autoescape, executor=executor)
+        if sink is None:
+            return out
+        sink.write(out.encode("utf-8"))
+        return ""
+
+    # autoescape : les valeurs affichées par le template sont échappées (HTML), sauf avec 'print raw'
+    # sink : la sortie y est écrite au fur et à mesure du parsing, sans être gardée en mémoire
+    out = dt.parse_inline(template_file, global_symbol_table, loader=loader, budget=budget, name=template_name,
+                          autoescape=autoescape, minify=minify, sink=sink)
     return out
 
 
-if __name__ == "__main__":
+def main_mapped(data_file, template_path, sink, budget=None, autoescape=False, minify=False):
+    from dumbo_core.mapped_template import render_mapped
+    from dumbo_core.metrics import get_metrics
+    from dumbo_core.template_loader import TemplateLoader
+
+    if get_metrics() is not None:
+        get_metrics().inc("dumbo_renders_total", template=template_path)
+
+    # le template est mappé en mémoire et le texte littéral est écrit directement dans sink
+    lark_parser = get_parser()
+    loader = TemplateLoader(lark_parser, os.path.dirname(template_path))
+
+    global_symbol_table = load_data(data_file, loader, budget=budget)
+
+    render_mapped(template_path, global_symbol_table, sink, loader=loader, budget=budget, autoescape=autoescape,
+                  minify=minify)
+
+
+def render_command(argv):
+    import argparse
+
     parser = argparse.ArgumentParser(description="Generate a file from a template and data.")
     parser.add_argument("data_file", help="The path to the data file")
     parser.add_argument("template_file", help="The path to the model file")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose mode")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of processes used to render the independent blocs (default: 1)")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Memory-map the template and stream the output (for large, mostly static templates)")
+    parser.add_argument("--autoescape", action="store_true",
+                        help="Escape the HTML special characters of every printed value ('print raw x;' disables it)")
+    parser.add_argument("--minify", action="store_true",
+                        help="Collapse the whitespaces of the literal text of the template (except in <pre>, "
+                             "<textarea>, <script> and <style>)")
+    compression = parser.add_mutually_exclusive_group()
+    compression.add_argument("--gzip", dest="compression", action="store_const", const="gzip",
+                             help="Compress the output with gzip while it is rendered")
+    compression.add_argument("--zlib", dest="compression", action="store_const", const="zlib",
+                             help="Compress the output with zlib while it is rendered")
+    parser.add_argument("--compress-level", type=int, default=6, choices=range(10), metavar="0-9",
+                        help="Compression level of --gzip and --zlib (default: 6)")
+    parser.add_argument("--max-instructions", type=int, help="Maximum number of executed instructions")
+    parser.add_argument("--max-loop-iterations", type=int, help="Maximum number of loop iterations")
+    parser.add_argument("--max-output", type=int, help="Maximum number of characters printed by the dumbo blocs")
+    parser.add_argument("--timeout", type=float, help="Maximum rendering time in seconds")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="Write the metrics of the rendering to PATH (JSON if it ends with .json, "
+                             "Prometheus text format otherwise)")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Vérifier si les fichiers spécifiés existent (lien symbolique non valide ici)
     if not os.path.isfile(args.template_file) and not os.path.isfile(args.data_file):
@@ -41,20 +148,191 @@ if __name__ == "__main__":
         print(f"Error: the template file '{args.template_file}' does not exist.", file=sys.stderr)
         sys.exit(1)
 
-    with open(args.data_file, "r") as f:
-        data = f.read()
+    from dumbo_core.snapshot import read_data_file
 
-    with open(args.template_file, "r") as f:
-        template = f.read()
+    # un fichier data écrit en Dumbo (str) ou son snapshot compilé par compile-data (bytes)
+    data = read_data_file(args.data_file)
 
+    # une sortie compressée est binaire : les messages vont sur la sortie d'erreur
+    info = sys.stderr if args.compression else sys.stdout
     if args.verbose:
-        print("Welcome to Dumbo Template Engine!\n")
-        print(f"Data File: {args.data_file}")
-        print(f"Template File: {args.template_file}")
+        print("Welcome to Dumbo Template Engine!\n", file=info)
+        print(f"Data File: {args.data_file}", file=info)
+        print(f"Template File: {args.template_file}", file=info)
+
+    from dumbo_core.intermediate_code_interpreter import BudgetExceededError, RenderBudget
+
+    metrics = None
+    if args.metrics:
+        from dumbo_core.metrics import enable_metrics
+        metrics = enable_metrics()
+
+    budget = None
+    if any(limit is not None for limit in (args.max_instructions, args.max_loop_iterations, args.max_output,
+                                           args.timeout)):
+        budget = RenderBudget(max_instructions=args.max_instructions, max_loop_iterations=args.max_loop_iterations,
+                              max_output_size=args.max_output, timeout=args.timeout)
 
-    output = main(data, template)
+    sink = None
+    try:
+        if args.mmap or args.compression:
+            if args.verbose:
+                print("\n######## OUTPUT ########\n", file=info)
+            sys.stdout.flush()
+            sink = sys.stdout.buffer
+            if args.compression:
+                from dumbo_core.output import CompressedSink
+
+                # la sortie est compressée au fur et à mesure, en une seule passe
+                sink = CompressedSink(sink, args.compression, level=args.compress_level)
+
+            if args.mmap:
+                main_mapped(data, args.template_file, sink, budget=budget, autoescape=args.autoescape,
+                            minify=args.minify)
+            else:
+                with open(args.template_file, "r") as f:
+                    template = f.read()
+                main(data, template, template_dir=os.path.dirname(args.template_file), jobs=args.jobs, budget=budget,
+                     template_name=args.template_file, autoescape=args.autoescape, minify=args.minify, sink=sink)
+            sink.write(b"\n")
+            return
+
+        with open(args.template_file, "r") as f:
+            template = f.read()
+
+        output = main(data, template, template_dir=os.path.dirname(args.template_file), jobs=args.jobs,
+                      budget=budget, template_name=args.template_file, autoescape=args.autoescape,
+                      minify=args.minify)
+    except BudgetExceededError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(4)
+    finally:
+        if args.compression and sink is not None:
+            sink.close()
+        if metrics is not None:
+            metrics.write(args.metrics)
 
     if args.verbose:
         print("\n######## OUTPUT ########\n")
 
     print(output)
+
+
+def compile_data_command(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="dumbo.py compile-data",
+                                     description="Execute a data file once and write the snapshot of its variables.")
+    parser.add_argument("data_file", help="The path to the data file")
+    parser.add_argument("-o", "--output", help="The path of the snapshot (default: <data_file>.bin)")
+
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.data_file):
+        print(f"Error: the data file '{args.data_file}' does not exist.", file=sys.stderr)
+        sys.exit(2)
+
+    from dumbo_core.snapshot import compile_data
+    from dumbo_core.template_loader import TemplateLoader
+
+    with open(args.data_file, "r") as f:
+        data = f.read()
+    snapshot = compile_data(data, loader=TemplateLoader(get_parser(), os.path.dirname(args.data_file)),
+                            name=args.data_file)
+
+    output = args.output or args.data_file + ".bin"
+    with open(output, "wb") as f:
+        f.write(snapshot)
+
+
+def watch_command(argv):
+    import argparse
+    from dumbo_core.watch import Watcher
+
+    parser = argparse.ArgumentParser(prog="dumbo.py watch",
+                                     description="Keep the pages of a site rendered while their sources change.")
+    parser.add_argument("data_file", help="The path to the data file")
+    parser.add_argument("template_dir", help="The directory of the page templates ('_*.dumbo' files are partials)")
+    parser.add_argument("output_dir", help="The directory where the pages are written")
+    parser.add_argument("--ext", default=".html", help="The extension of the rendered pages (default: .html)")
+    parser.add_argument("--interval", type=float, default=0.2, help="Time between two polls in seconds")
+    parser.add_argument("--once", action="store_true", help="Render every page once and exit")
+
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.data_file):
+        print(f"Error: the data file '{args.data_file}' does not exist.", file=sys.stderr)
+        sys.exit(2)
+    if not os.path.isdir(args.template_dir):
+        print(f"Error: the template directory '{args.template_dir}' does not exist.", file=sys.stderr)
+        sys.exit(1)
+
+    watcher = Watcher(get_parser(), args.data_file, args.template_dir, args.output_dir, extension=args.ext)
+    if args.once:
+        watcher.build()
+        return
+
+    try:
+        watcher.run(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def submit_command(argv):
+    import argparse
+    from dumbo_core.spool import submit_job
+
+    parser = argparse.ArgumentParser(prog="dumbo.py submit", description="Add a render job to a spool directory.")
+    parser.add_argument("spool_dir", help="The spool directory shared by the workers")
+    parser.add_argument("data_file", help="The path to the data file")
+    parser.add_argument("template_file", help="The path to the model file")
+    parser.add_argument("output_file", help="The path where the output is written")
+
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.template_file):
+        print(f"Error: the template file '{args.template_file}' does not exist.", file=sys.stderr)
+        sys.exit(1)
+    if not os.path.isfile(args.data_file):
+        print(f"Error: the data file '{args.data_file}' does not exist.", file=sys.stderr)
+        sys.exit(2)
+
+    print(submit_job(args.spool_dir, args.template_file, args.data_file, args.output_file)["id"])
+
+
+def worker_command(argv):
+    import argparse
+    from dumbo_core.spool import SpoolWorker
+
+    parser = argparse.ArgumentParser(prog="dumbo.py worker",
+                                     description="Render the jobs of a spool directory (several workers can share it).")
+    parser.add_argument("spool_dir", help="The spool directory shared by the workers")
+    parser.add_argument("--id", help="The identifier of the worker (default: <hostname>-<pid>)")
+    parser.add_argument("--interval", type=float, default=0.5, help="Time between two polls in seconds")
+    parser.add_argument("--exit-when-empty", action="store_true", help="Exit as soon as there is no pending job")
+    parser.add_argument("--lease", type=float, default=300.0,
+                        help="Time after which a claimed job is put back in pending, in seconds (default: 300)")
+
+    args = parser.parse_args(argv)
+
+    worker = SpoolWorker(args.spool_dir, get_parser(), worker_id=args.id, lease=args.lease)
+    try:
+        worker.run(args.interval, exit_when_empty=args.exit_when_empty)
+    except KeyboardInterrupt:
+        pass
+
+
+# sous-commandes : python dumbo.py <commande> ...
+COMMANDS = {
+    "compile-data": compile_data_command,
+    "watch": watch_command,
+    "submit": submit_command,
+    "worker": worker_command,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+    else:
+        render_command(sys.argv[1:])
@@ -0,0 +1,361 @@
+# encoding: utf-8
+import time
+from collections.abc import Mapping
+from itertools import repeat
+
+from dumbo_core.bindings import BoundVariable, dumbo_value
+from dumbo_core.escaping import escape_html
+from dumbo_core.intermediate_code_interpreter import AExpression, IntermediateCodeInterpreter, Printing
+from dumbo_core.metrics import get_metrics
+from dumbo_core.symbol_table import *
+
+
+def render_batch(template, columns, symbol_table=None, loader=None, autoescape=False, chunk_size=1024,
+                 name="<template>"):
+    """
+    Renders one template for many records given by column, in a single pass.
+
+    The blocs which only print constants, columns and fields of columns are evaluated column-wise: each printed
+    value is converted for a whole chunk of records at once, and the outputs are assembled from the literal text with
+    one join per record. The other blocs (loops, conditions, assignments, includes) are executed record by record,
+    each record in its own scope. The outputs are the same as rendering the template once per record.
+
+    Parameters:
+    ----------
+    template : CompiledTemplate | str
+        The template, compiled or not (it is then compiled with the global scope and the first record).
+    columns : Mapping
+        The variable names as keys and the sequences of their values, one per record, as values (see bind_data() for
+        the Python values accepted).
+    symbol_table : SymbolTable, optional
+        The global scope shared by every record (filled by a data file or bind_data()).
+    loader : TemplateLoader, optional
+        The loader used to resolve 'include' expressions when the template is compiled.
+    autoescape : bool
+        whether to escape the HTML special characters of the printed values or not.
+    chunk_size : int
+        The number of records evaluated together (the memory used depends on it, not on the number of records).
+    name : str
+        The name of the template in the metrics.
+
+    Returns:
+    -------
+    iterator
+        The output of each record, in order.
+    """
+    if _record_count(columns) == 0:
+        return iter(())
+    plan = BatchPlan(template, columns, symbol_table=symbol_table, loader=loader, autoescape=autoescape, name=name)
+    return plan.render(columns, chunk_size=chunk_size)
+
+
+def write_batch(template, columns, paths, symbol_table=None, loader=None, autoescape=False, chunk_size=1024,
+                name="<template>"):
+    """
+    Renders one template for many records given by column and writes each output (UTF-8) to its own file.
+
+    Parameters:
+    ----------
+    template : CompiledTemplate | str
+        The template, compiled or not.
+    columns : Mapping
+        The variable names as keys and the sequences of their values, one per record, as values.
+    paths : sequence
+        The path of the file of each record.
+    symbol_table, loader, autoescape, chunk_size, name
+        See render_batch().
+
+    Returns:
+    -------
+    int
+        The number of files written.
+    """
+    if len(paths) != _record_count(columns):
+        raise ValueError(f"{len(paths)} paths for {_record_count(columns)} records")
+    count = 0
+    for path, output in zip(paths, render_batch(template, columns, symbol_table=symbol_table, loader=loader,
+                                                autoescape=autoescape, chunk_size=chunk_size, name=name)):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(output)
+        count += 1
+    return count
+
+
+def _record_count(columns):
+    """Returns the number of records of a batch (ValueError if the columns don't have the same length)."""
+    if not isinstance(columns, Mapping):
+        raise TypeError(f"columns must be a mapping, not {type(columns).__name__}")
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("the columns of a batch must have the same length")
+    return lengths.pop() if lengths else 0
+
+
+class ColumnPiece:
+    """
+    A class used to represent a value printed by a bloc evaluated column-wise: a column, or a field of a column.
+
+    Attributes:
+    ----------
+    column : str
+        The name of the column.
+    fields : list
+        The names of the fields read (a.b.c), empty to print the column itself.
+    escape : bool
+        whether the value is escaped or not.
+    bloc : IntermediateCodeInterpreter
+        A bloc printing the value alone, executed for the records whose value isn't a record while fields remain
+        (the names are then concatenated, see IntermediateCodeInterpreter.execute()).
+    """
+
+    def __init__(self, column, fields, escape, bloc):
+        self.column = column
+        self.fields = fields
+        self.escape = escape
+        self.bloc = bloc
+
+    def evaluate(self, values, scopes):
+        """
+        Returns the printed strings of a chunk of records.
+
+        Parameters:
+        ----------
+        values : list
+            The Dumbo values of the column for each record of the chunk.
+        scopes : callable
+            Returns the scopes of the records of the chunk (only called if a record needs its scope).
+        """
+        if self.fields:
+            texts = []
+            for index, value in enumerate(values):
+                for field_name in self.fields:
+                    if not isinstance(value, (Record, RecordRow)):
+                        # pas un enregistrement : les noms restants sont des variables concaténées
+                        value = None
+                        break
+                    value = value.get_field(field_name)
+                if value is None:
+                    texts.append(self.bloc.execute(SymbolTable(scopes()[index])))
+                elif self.escape:
+                    texts.append(escape_html(str(value)))
+                else:
+                    texts.append(value if isinstance(value, str) else str(value))
+            return texts
+
+        if self.escape:
+            return [escape_html(str(value)) for value in values]
+        return [value if isinstance(value, str) else str(value) for value in values]
+
+
+class BatchPlan:
+    """
+    A class used to represent how a compiled template is rendered for a batch of records given by column.
+
+    The compiled template is cut into segments, in order: literal strings (the literal text and the constant values
+    printed, evaluated once and merged), ColumnPiece objects, and the blocs executed record by record.
+
+    Attributes:
+    ----------
+    template : CompiledTemplate
+        The compiled template.
+    names : list
+        The names of the columns.
+    global_scope : SymbolTable
+        A copy of the global scope shared by every record.
+    autoescape : bool
+        whether to escape the printed values or not.
+    segments : list
+        str, ColumnPiece or IntermediateCodeInterpreter, in the order of the template.
+    name : str
+        The name of the template in the metrics.
+
+    Methods:
+    -------
+    render(columns, chunk_size=1024)
+        Returns an iterator of the outputs of the records.
+    """
+
+    def __init__(self, template, columns, symbol_table=None, loader=None, autoescape=False, name="<template>"):
+        self.names = list(columns)
+        self.global_scope = symbol_table.copy() if symbol_table is not None else SymbolTable()
+        self.autoescape = autoescape
+        self.name = name
+
+        if isinstance(template, str):
+            from dumbo_core.dumbo_transformers import compile_template
+
+            # les noms lus par le template sont vérifiés à la compilation : le premier enregistrement les déclare
+            scope = self.global_scope.copy()
+            if _record_count(columns) > 0:
+                for column_name, column in columns.items():
+                    scope.add_variable(BoundVariable(column_name, column[0]))
+            template = compile_template(template, scope, loader=loader, name=name)
+        self.template = template
+
+        # un nom assigné par le template a une valeur propre à chaque enregistrement
+        assigned = set()
+        for part in template.parts:
+            if not isinstance(part, str):
+                assigned.update(task.get_content().get_name() for task in part.stack
+                                if task.get_type() == AExpression.VAR)
+
+        self.segments = []
+        record_scoped = False
+        for part in template.parts:
+            if isinstance(part, str):
+                self._append(part)
+                continue
+            pieces = None if record_scoped else self._column_pieces(part, assigned)
+            if pieces is None:
+                self.segments.append(part)
+                # un partial peut assigner n'importe quelle variable : la suite est rendue enregistrement par
+                # enregistrement
+                record_scoped = record_scoped or any(task.get_type() == AExpression.INCLUDE for task in part.stack)
+            else:
+                for piece in pieces:
+                    self._append(piece)
+
+    def _append(self, segment):
+        # les chaînes consécutives sont fusionnées
+        if isinstance(segment, str) and self.segments and isinstance(self.segments[-1], str):
+            self.segments[-1] += segment
+        elif segment != "":
+            self.segments.append(segment)
+
+    def _column_pieces(self, bloc, assigned):
+        """
+        Returns the pieces printed by a bloc which only prints (str or ColumnPiece), or None if the bloc must be
+        executed record by record.
+        """
+        pieces = []
+        for task in bloc.stack:
+            if task.get_type() != AExpression.PRINT:
+                return None
+            escape = self.autoescape if task.escape is None else task.escape
+            to_print = task.get_content()
+            items = to_print.get_value() if to_print.get_type() == STRING_CONCAT else [to_print]
+            for item in items:
+                piece = self._column_piece(item, escape, assigned)
+                if piece is None:
+                    return None
+                pieces.append(piece)
+        return pieces
+
+    def _column_piece(self, item, escape, assigned):
+        """Returns the piece printing an item of a 'print' (str or ColumnPiece), None if it can't be evaluated once."""
+        bloc = IntermediateCodeInterpreter()
+        bloc.add_instr(Printing(item, escape))
+
+        reference = None
+        fields = []
+        if item.get_type() == REF:
+            reference = item.get_value()
+        elif item.get_type() == BUILTIN and item.get_value()[0] == "field":
+            base, *names = item.get_value()[1]
+            reference = base.get_value()
+            fields = [field_name.get_value() for field_name in names]
+
+        if reference in self.names and reference not in assigned:
+            return ColumnPiece(reference, fields, escape, bloc)
+        names = _references(item)
+        if names & assigned or any(column_name in names for column_name in self.names):
+            return None
+        # la valeur ne dépend d'aucun enregistrement : elle est évaluée une seule fois
+        return bloc.execute(SymbolTable(self.global_scope), autoescape=escape)
+
+    def render(self, columns, chunk_size=1024):
+        """
+        Returns an iterator of the outputs of the records.
+
+        Parameters:
+        ----------
+        columns : Mapping
+            The names of the columns (the ones of the plan) as keys and their values as values.
+        chunk_size : int
+            The number of records evaluated together.
+        """
+        count = _record_count(columns)
+        if set(columns) != set(self.names):
+            raise NameError(f"the columns of the batch ({', '.join(columns)}) are not the ones of the plan "
+                            f"({', '.join(self.names)})")
+        return self._render_chunks(columns, count, chunk_size)
+
+    def _render_chunks(self, columns, count, chunk_size):
+        for start in range(0, count, chunk_size):
+            yield from self._render_chunk(columns, start, min(start + chunk_size, count))
+
+    def _render_chunk(self, columns, start, stop):
+        metrics = get_metrics()
+        clock = time.perf_counter()
+
+        size = stop - start
+        chunk = {column_name: [dumbo_value(value) for value in columns[column_name][start:stop]]
+                 for column_name in self.names}
+        scopes = _RecordScopes(self.global_scope, chunk, size)
+
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                parts.append(repeat(segment, size))
+            elif isinstance(segment, ColumnPiece):
+                parts.append(segment.evaluate(chunk[segment.column], scopes))
+            else:
+                parts.append([segment.execute(SymbolTable(scope), autoescape=self.autoescape) for scope in scopes()])
+
+        outputs = map("".join, zip(*parts)) if parts else repeat("", size)
+        if metrics is not None:
+            outputs = list(outputs)
+            metrics.inc("dumbo_renders_total", size, template=self.name)
+            metrics.observe("dumbo_stage_seconds", time.perf_counter() - clock, stage="execute", template=self.name)
+        return outputs
+
+    def __repr__(self):
+        return f"BatchPlan({self.template.name}, columns: {', '.join(self.names)}, {len(self.segments)} segments)"
+
+
+class _RecordScopes:
+    """
+    The global scopes of the records of a chunk, created the first time a bloc executed record by record needs them:
+    a copy of the shared global scope holding the values of the record, where its assignments are written.
+    """
+
+    def __init__(self, global_scope, chunk, size):
+        self._global_scope = global_scope
+        self._chunk = chunk
+        self._size = size
+        self._scopes = None
+
+    def __call__(self):
+        if self._scopes is None:
+            self._scopes = []
+            for index in range(self._size):
+                scope = self._global_scope.copy()
+                for column_name, values in self._chunk.items():
+                    variable = value_variable(values[index])
+                    scope.add_variable(Variable(column_name, variable.get_type(), variable.get_value()))
+                self._scopes.append(scope)
+        return self._scopes
+
+
+def _references(item):
+    """Returns the names of the variables read by an item of a 'print'."""
+    if item.get_type() == REF:
+        return {item.get_value()}
+    if item.get_type() == BUILTIN:
+        names = set()
+        for argument in item.get_value()[1]:
+            if argument is not None:
+                names |= _references(argument)
+        if item.get_value()[0] == "field":
+            # les noms qui suivent un champ qui n'est pas un enregistrement sont des variables
+            names |= {argument.get_value() for argument in item.get_value()[1][1:]}
+        return names
+    if item.get_type() == MATH_OP:
+        left, _, right = item.get_value()
+        return _references(left) | _references(right)
+    if item.get_type() == STRING_CONCAT:
+        names = set()
+        for part in item.get_value():
+            names |= _references(part)
+        return names
+    return set()
@@ -0,0 +1,139 @@
+# encoding: utf-8
+from collections.abc import Mapping
+
+from dumbo_core.symbol_table import *
+
+# valeurs gardées telles quelles dans une colonne, un enregistrement ou une liste
+_SCALARS = (str, int, float, bool)
+
+
+def bind_data(data):
+    """
+    Builds a global symbol table from Python data, without writing nor parsing a data file.
+
+    Each value is only converted the first time the template reads it, and the sequences are never copied: their
+    elements are wrapped into variables while they are read (see ValueList).
+
+    Parameters:
+    ----------
+    data : Mapping
+        The variable names as keys and their values as values: str, int, float, bool, range, a mapping (a record),
+        a sequence (a list; a list of mappings is stored by column, see RecordList) or a Variable.
+
+    Returns:
+    -------
+    SymbolTable
+        The global symbol table.
+    """
+    if not isinstance(data, Mapping):
+        raise TypeError(f"data must be a mapping, not {type(data).__name__}")
+    for name in data:
+        if not isinstance(name, str):
+            raise TypeError(f"variable names must be str, not {type(name).__name__}")
+
+    symbol_table = SymbolTable()
+    symbol_table._table = {name: value if isinstance(value, Variable) else BoundVariable(name, value)
+                           for name, value in data.items()}
+    return symbol_table
+
+
+def dumbo_value(value):
+    """
+    Returns the Dumbo value of a Python value, as stored in a record or a list.
+
+    Parameters:
+    ----------
+    value : Any
+        str, int, float, bool, range, a mapping or a sequence.
+    """
+    if isinstance(value, _SCALARS) or isinstance(value, (range, Record, RecordRow, RecordList, ValueList)):
+        return value
+    if isinstance(value, Mapping):
+        layout = record_layout(value)
+        return Record(layout, [dumbo_value(item) for item in value.values()])
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, Mapping) for item in value):
+            return _record_list(value)
+        return ValueList(value)
+    raise TypeError(f"Can't bind {type(value).__name__} to a Dumbo value")
+
+
+def _record_list(rows):
+    # une colonne par champ (l'union des champs des lignes), None pour un champ absent d'une ligne
+    fields = dict.fromkeys(rows[0])
+    for row in rows:
+        if len(row) != len(fields) or any(name not in fields for name in row):
+            fields.update(dict.fromkeys(row))
+    layout = record_layout(fields)
+    columns = []
+    for name in layout:
+        column = [row.get(name) for row in rows]
+        for index, value in enumerate(column):
+            if value is not None and not isinstance(value, _SCALARS):
+                column[index] = dumbo_value(value)
+        columns.append(column)
+    return RecordList(layout, columns)
+
+
+class BoundVariable(LazyVariable):
+    """
+    A class used to represent a variable bound to a Python value, which is converted the first time it is read.
+    Inherits from the LazyVariable class.
+
+    Specific Attributes:
+    -------------------
+    _bound : Any
+        The Python value.
+    """
+
+    def __init__(self, name, value):
+        super(BoundVariable, self).__init__(name)
+        self._bound = value
+
+    def _load(self):
+        variable = value_variable(dumbo_value(self._bound))
+        self._set(variable.get_type(), variable.get_value())
+
+    def _describe(self):
+        return f"<bound: {type(self._bound).__name__}>"
+
+
+class ValueList:
+    """
+    A class used to represent a Dumbo list as a view on a Python sequence.
+
+    The sequence is not copied: each element is converted and wrapped into an anonymous variable when it is read.
+
+    Attributes:
+    ----------
+    values : Sequence
+        The Python values.
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ValueList(self.values[index])
+        return value_variable(dumbo_value(self.values[index]))
+
+    def __iter__(self):
+        for value in self.values:
+            yield value_variable(dumbo_value(value))
+
+    def __eq__(self, o):
+        if isinstance(o, (list, ValueList)):
+            return list(self) == list(o)
+        return NotImplemented
+
+    def __str__(self):
+        return "(" + ", ".join(str(item) for item in self) + ")"
+
+    def __repr__(self):
+        return f"ValueList({len(self)} values)"
@@ -1,6 +1,48 @@
 # encoding: utf-8
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+
 from dumbo_core.intermediate_code_interpreter import *
-from lark import Transformer
+from dumbo_core.metrics import get_metrics
+from dumbo_core.output import WhitespaceMinifier
+from lark import Lark, Transformer, Tree
+
+# parsers libres de chaque thread : le transformer appliqué pendant le parsing garde l'état du parsing en cours
+_inline_parsers = threading.local()
+# parser qui ne construit rien (vérification de la syntaxe), partagé par tous les threads
+_syntax_parser = None
+
+
+def _execute_bloc(bloc, variables, DEBUG=False, budget=None, autoescape=False):
+    """
+    Executes an independent compiled dumbo bloc from a snapshot of the variables it reads. (in a worker process)
+
+    Parameters:
+    ----------
+    bloc : IntermediateCodeInterpreter
+        The compiled dumbo bloc.
+    variables : bytes
+        The pickled Variable objects read by the bloc, as they were when the bloc was reached in the template.
+    DEBUG : bool
+        whether to print debug information or not.
+    budget : RenderBudget, optional
+        The share of the budget of the rendering given to the bloc (see RenderBudget.share()).
+    autoescape : bool
+        whether to escape the printed values or not.
+
+    Returns:
+    -------
+    tuple
+        The output of the bloc and its budget, whose counters are merged back into the budget of the rendering.
+    """
+    global_symbol_table = SymbolTable()
+    for variable in pickle.loads(variables):
+        global_symbol_table.add_variable(variable)
+
+    output = bloc.execute(SymbolTable(global_symbol_table), DEBUG=DEBUG, budget=budget, autoescape=autoescape)
+    return output, budget
 
 
 class DumboBlocTransformer(Transformer):
@@ -15,6 +57,19 @@ class DumboBlocTransformer(Transformer):
         Reference to the higher level of the symbol table. (Root Node or global Symbol Table)
     intermediate_code_interpreter : IntermediateCodeInterpreter
         The interpreter of the intermediate code used to fill its stack.
+    loader : TemplateLoader, optional
+        The loader used to resolve 'include' expressions. (None if includes are not allowed)
+    budget : RenderBudget, optional
+        The limits of the rendering.
+    autoescape : bool
+        whether to escape the printed values or not ('print escape' and 'print raw' override it).
+    minify : bool
+        whether the included partials collapse the whitespaces of their literal text or not.
+    lenient : bool
+        whether an unknown name is read at execution instead of raising NameError (partials, compiled before the
+        scope they are included in is known).
+    validated : set, optional
+        The paths of the partials whose include closure was already checked by this parsing.
 
     Debugging attributes:
     --------------------
@@ -24,7 +79,8 @@ class DumboBlocTransformer(Transformer):
         Keeps track the index of the node. (only for DEBUG purpose)
     """
 
-    def __init__(self, symbol_table, intermediate_code_interpreter, DEBUG=False, *args, **kwargs):
+    def __init__(self, symbol_table, intermediate_code_interpreter, DEBUG=False, loader=None, budget=None,
+                 autoescape=False, minify=False, *args, **kwargs):
         super(DumboBlocTransformer, self).__init__(*args, **kwargs)
         self._output_buffer = ""
         self.current_scope = symbol_table
@@ -32,6 +88,12 @@ class DumboBlocTransformer(Transformer):
         while self.global_symbol_table.parent is not None:
             self.global_symbol_table = self.global_symbol_table.parent
         self.inter = intermediate_code_interpreter
+        self.loader = loader
+        self.budget = budget
+        self.autoescape = autoescape
+        self.minify = minify
+        self.lenient = False
+        self.validated = None
 
         # only for debug purpose
         self.DEBUG = DEBUG
@@ -63,6 +125,9 @@ class DumboBlocTransformer(Transformer):
 
         return Variable("__ANON__", MATH_OP, [v1, op, v2])
 
+    def arithmetic_operand(self, items):
+        return items[0]
+
     def string_list_interior(self, items):
         if self.DEBUG:
             print("string_list_interior", self.counter)
@@ -81,6 +146,64 @@ class DumboBlocTransformer(Transformer):
         var = Variable("__ANON__", LIST, items[0])
         return var
 
+    def integer_list(self, items):
+        if self.DEBUG:
+            print("integer_list", self.counter)
+            self.counter += 1
+
+        return Variable("__ANON__", LIST, items)
+
+    @staticmethod
+    def _reference(var):
+        """Returns a reference to a named variable (resolved at execution), or the anonymous variable itself."""
+        if var.get_type() is None:
+            raise NameError(f"name '{var.get_name()}' is not defined")
+        if var.get_name() != "__ANON__":
+            return Variable("__ANON__", REF, var.get_name())
+        return var
+
+    def list_expression(self, items):
+        return self._reference(items[0])
+
+    def slice_expression(self, items):
+        if self.DEBUG:
+            print("slice_expression", self.counter)
+            self.counter += 1
+
+        # les bornes absentes valent None, comme en Python
+        return Variable("__ANON__", BUILTIN, ("slice", [self._reference(items[0]), items[1], items[2]]))
+
+    def slice_index(self, items):
+        return self._reference(items[0])
+
+    def range_expression(self, items):
+        if self.DEBUG:
+            print("range_expression", self.counter)
+            self.counter += 1
+
+        return Variable("__ANON__", BUILTIN, ("range", items))
+
+    def join_expression(self, items):
+        if self.DEBUG:
+            print("join_expression", self.counter)
+            self.counter += 1
+
+        return Variable("__ANON__", BUILTIN, ("join", [items[0], self._reference(items[1])]))
+
+    def len_expression(self, items):
+        if self.DEBUG:
+            print("len_expression", self.counter)
+            self.counter += 1
+
+        return Variable("__ANON__", BUILTIN, ("len", items))
+
+    def sum_expression(self, items):
+        if self.DEBUG:
+            print("sum_expression", self.counter)
+            self.counter += 1
+
+        return Variable("__ANON__", BUILTIN, ("sum", items))
+
     def string(self, items):
         if self.DEBUG:
             print("string", self.counter)
@@ -90,13 +213,45 @@ class DumboBlocTransformer(Transformer):
         var = Variable("__ANON__", STRING, result)
         return var
 
+    def record_field(self, items):
+        # le nom du champ n'est pas une variable : seul son nom compte
+        return items[0].get_name(), items[1].get_value()
+
+    def record(self, items):
+        if self.DEBUG:
+            print("record", self.counter)
+            self.counter += 1
+
+        layout = record_layout(name for name, _ in items)
+        return Variable("__ANON__", RECORD, Record(layout, [value for _, value in items]))
+
+    def record_list(self, items):
+        if self.DEBUG:
+            print("record_list", self.counter)
+            self.counter += 1
+
+        # les enregistrements sont rangés par colonne : une liste de valeurs par champ
+        return Variable("__ANON__", LIST, RecordList.from_records([item.get_value() for item in items]))
+
+    def field_expression(self, items):
+        if self.DEBUG:
+            print("field_expression", self.counter)
+            self.counter += 1
+
+        base, *fields = items[0].split(".")
+        if base not in self.current_scope and not self.lenient:
+            raise NameError(f"name '{base}' is not defined")
+        # les champs sont lus à l'exécution : la variable peut changer de valeur (variable de boucle par exemple)
+        return Variable("__ANON__", BUILTIN, ("field", [Variable("__ANON__", REF, base)]
+                                              + [Variable("__ANON__", STRING, field) for field in fields]))
+
     def dumbo_bloc(self, items):
         # on ne passe ici que pour le parsing du fichier data
         if self.DEBUG:
             print("dumbo_bloc", self.counter)
             self.counter += 1
 
-        return self.inter.execute(self.current_scope)
+        return self.inter.execute(self.current_scope, budget=self.budget, autoescape=self.autoescape)
 
     def print_expression(self, items):
         if self.DEBUG:
@@ -104,10 +259,14 @@ class DumboBlocTransformer(Transformer):
             self.counter += 1
 
         # self._output_buffer += str(items[0].get()) + "\n"
-        var = items[0]
-        if items[0].get_name() != "__ANON__":
+        escape = None
+        if len(items) > 1:
+            # 'print escape' ou 'print raw'
+            escape = items[0].type == "ESCAPE"
+        var = items[-1]
+        if var.get_name() != "__ANON__":
             var = Variable("__ANON__", REF, var.get_name())
-        self.inter.add_instr(Printing(var))
+        self.inter.add_instr(Printing(var, escape))
         return None
 
     def for_loop_expression(self, items):
@@ -118,7 +277,8 @@ class DumboBlocTransformer(Transformer):
         index_and_var_name, expression_list = items
         index, loop_var = index_and_var_name
 
-        self.inter.add_instr(EndFor((index, loop_var.get_name())))
+        # une boucle sur un itérable vide saute directement après son 'end for'
+        self.inter.stack[index - 1].end = self.inter.add_instr(EndFor((index, loop_var.get_name())))
 
         # on sort du scope
         self.current_scope = self.current_scope.parent
@@ -130,7 +290,51 @@ class DumboBlocTransformer(Transformer):
             print("for_loop_clause", self.counter)
             self.counter += 1
 
+        # 'where' et 'limit' sont facultatifs (None si absents)
+        (index, loop_var), condition, limit = items
+        loop = self.inter.stack[index - 1]
+        loop.condition = condition
+        loop.limit = limit
+
+        return index, loop_var
+
+    def where_clause(self, items):
+        return items[0]
+
+    def filter_condition(self, items):
+        if len(items) == 1:
+            return items[0]
+        return Variable("__ANON__", CONDITION, [items[0], "or", items[1]])
+
+    def filter_conjunction(self, items):
+        if len(items) == 1:
+            return items[0]
+        return Variable("__ANON__", CONDITION, [items[0], "and", items[1]])
+
+    def filter_comparison(self, items):
+        if self.DEBUG:
+            print("filter_comparison", self.counter)
+            self.counter += 1
+
+        # la variable de boucle est déjà dans le scope : elle est relue pour chaque élément
+        left, comparison_operator, right = items
+        return Variable("__ANON__", CONDITION, [left, str(comparison_operator), right])
+
+    def filter_operand(self, items):
+        return self._reference(items[0])
+
+    def limit_clause(self, items):
+        return items[0]
+
+    def for_loop_head(self, items):
+        if self.DEBUG:
+            print("for_loop_head", self.counter)
+            self.counter += 1
+
         loop_var, iterable = items
+        if iterable.get_name() != "__ANON__":
+            # l'itérable est relu à l'exécution : le code compilé ne garde aucune variable de la table
+            iterable = Variable("__ANON__", REF, iterable.get_name())
 
         # initialisation de la variable de la boucle
         loop_var = Iterable(loop_var.get_name(), FOR_LIST, [Variable(None, None, None)])
@@ -179,6 +383,9 @@ class DumboBlocTransformer(Transformer):
 
         if items[0] in self.current_scope:
             return self.current_scope.get(items[0])
+        if self.lenient:
+            # le nom sera lu dans le scope de l'exécution
+            return Variable(items[0], REF, items[0])
 
         return Variable(items[0], None, None)
 
@@ -214,6 +421,20 @@ class DumboBlocTransformer(Transformer):
 
         return None  # pas besoin de retourner quoi que ce soit, l'expression est finie
 
+    def include_expression(self, items):
+        if self.DEBUG:
+            print("include_expression", self.counter)
+            self.counter += 1
+
+        if self.loader is None:
+            raise NameError(f"can't include '{items[0].get_value()}': no template loader available")
+
+        # le partial est déjà compilé et mis en cache, on l'insère par référence
+        partial = self.loader.load(items[0].get_value(), _validated=self.validated)
+        self.inter.add_instr(Include(partial, minify=self.minify))
+
+        return None
+
     def signed_decimal_integer(self, items):
         if self.DEBUG:
             print("signed_decimal_integer", self.counter)
@@ -330,6 +551,14 @@ class DumboTemplateTransformer(Transformer):
     ----------
     current_scope : SymbolTable
         Keep tracks of the scope during the tree parsing.
+    loader : TemplateLoader, optional
+        The loader used to resolve 'include' expressions. (None if includes are not allowed)
+    budget : RenderBudget, optional
+        The limits of the rendering.
+    autoescape : bool
+        whether to escape the printed values or not ('print escape' and 'print raw' override it).
+    minifier : WhitespaceMinifier, optional
+        The minifier of the literal text. (None to keep it as is)
 
     Debugging attributes:
     --------------------
@@ -339,9 +568,14 @@ class DumboTemplateTransformer(Transformer):
         Keeps track the index of the node. (only for DEBUG purpose)
     """
 
-    def __init__(self, symbol_table, DEBUG=False, *args, **kwargs):
+    def __init__(self, symbol_table, DEBUG=False, loader=None, budget=None, autoescape=False, minify=False, *args,
+                 **kwargs):
         super(DumboTemplateTransformer, self).__init__(*args, **kwargs)
         self.current_scope = symbol_table
+        self.loader = loader
+        self.budget = budget
+        self.autoescape = autoescape
+        self.minifier = WhitespaceMinifier() if minify else None
 
         # only for debug purpose
         self.DEBUG = DEBUG
@@ -352,18 +586,23 @@ class DumboTemplateTransformer(Transformer):
             print("start", self.counter)
             self.counter += 1
 
-        return items[0]
+        if not items:
+            # template vide (un partial peut l'être)
+            return ""
+        # les morceaux sont dans l'ordre inverse (voir programme)
+        return "".join(reversed(items[0]))
 
     def programme(self, items):
         if self.DEBUG:
             print("programme", self.counter)
             self.counter += 1
 
-        # concat les items pour avoir la sortie
-        if items:
-            return "".join(items)
-
-        return ""
+        # la règle est récursive à droite : la suite du programme est réduite avant son premier élément.
+        # on ajoute donc les morceaux de la sortie à la fin d'une seule liste, dans l'ordre inverse,
+        # et la concaténation n'est faite qu'une fois (dans start)
+        parts = items[1] if len(items) > 1 else []
+        parts.append(items[0])
+        return parts
 
     def txt(self, items):
         if self.DEBUG:
@@ -371,6 +610,9 @@ class DumboTemplateTransformer(Transformer):
             self.counter += 1
 
         # texte à retranscrire
+        if self.minifier is not None:
+            # le texte est minifié au moment de la compilation, pas à chaque affichage
+            return self.minifier.minify(items[0].value)
         return items[0].value  # retourner le texte à afficher
 
     def dumbo_bloc(self, items):
@@ -378,15 +620,460 @@ class DumboTemplateTransformer(Transformer):
             print("dumbo_bloc", self.counter)
             self.counter += 1
 
+        if not items:
+            # bloc vide
+            return ""
+
         # dumbo bloc à parser
+        # le scope du bloc n'est pas enregistré dans le scope courant, qui peut être partagé par d'autres rendus
         new_scope = SymbolTable(self.current_scope)
-        self.current_scope.add_subscope(new_scope)
         intermediate_code_interpreter = IntermediateCodeInterpreter()
-        dumbo_bloc_content = DumboBlocTransformer(new_scope, intermediate_code_interpreter, DEBUG=self.DEBUG)
+        dumbo_bloc_content = DumboBlocTransformer(new_scope, intermediate_code_interpreter, DEBUG=self.DEBUG,
+                                                  loader=self.loader, budget=self.budget,
+                                                  minify=self.minifier is not None)
         dumbo_bloc_content.transform(items[0])
 
-        result = intermediate_code_interpreter.execute(new_scope, DEBUG=self.DEBUG)
+        return intermediate_code_interpreter.execute(new_scope, DEBUG=self.DEBUG, budget=self.budget,
+                                                     autoescape=self.autoescape)
+
+
+class DumboInlineTransformer(DumboBlocTransformer):
+    """
+    A class used to lower a data file or a template into intermediate code while it is being parsed.
+
+    It is given to the LALR parser, which calls it at each reduction: the dumbo blocs are executed as soon as they
+    are parsed and no parse tree is built. It is reset before each parsing, see parse_inline() and
+    compile_template() (which keeps the compiled blocs instead of executing them).
+
+    The literal text and the output of the blocs are reduced in the order of the document, so they can be written
+    to a sink as soon as they are produced instead of being kept until the end of the parsing.
+
+    Specific Attributes:
+    -------------------
+    bloc_scope : SymbolTable
+        The scope of the dumbo bloc being parsed, child of the global symbol table.
+    execute_time : float, optional
+        The time spent executing the dumbo blocs, in seconds. (None when the metrics are disabled)
+    compiling : bool
+        whether the dumbo blocs are kept compiled (True) or executed (False).
+    minifier : WhitespaceMinifier, optional
+        The minifier of the literal text. (None to keep it as is)
+    sink : binary file-like object, optional
+        Where the output is written while it is produced. (None to return it at the end of the parsing)
+    output_bytes : int
+        The number of bytes written to the sink.
+    """
+
+    def __init__(self, DEBUG=False, *args, **kwargs):
+        super(DumboInlineTransformer, self).__init__(SymbolTable(), IntermediateCodeInterpreter(), DEBUG, None,
+                                                     *args, **kwargs)
+        self.bloc_scope = None
+        self.execute_time = None
+        self.compiling = False
+        self.minifier = None
+        self.sink = None
+        self.output_bytes = 0
+
+    def reset(self, symbol_table, loader=None, DEBUG=False, budget=None, timed=False, autoescape=False,
+              compiling=False, minify=False, sink=None, lenient=False, validated=None):
+        """
+        Prepares the transformer for a new parsing.
+
+        Parameters:
+        ----------
+        symbol_table : SymbolTable
+            The scope in which the dumbo blocs are executed.
+        loader : TemplateLoader, optional
+            The loader used to resolve 'include' expressions.
+        DEBUG : bool
+            whether to print debug information or not.
+        budget : RenderBudget, optional
+            The limits of the rendering.
+        timed : bool
+            whether to measure the time spent executing the dumbo blocs or not.
+        autoescape : bool
+            whether to escape the printed values or not.
+        compiling : bool
+            whether to keep the dumbo blocs compiled instead of executing them.
+        minify : bool
+            whether to collapse the whitespaces of the literal text or not.
+        sink : binary file-like object, optional
+            Where the output is written (UTF-8) while it is produced.
+        lenient : bool
+            whether the unknown names are read at execution instead of raising NameError.
+        validated : set, optional
+            The paths of the partials already checked by the parsing including this one (a new set otherwise).
+        """
+        self.global_symbol_table = symbol_table
+        while self.global_symbol_table.parent is not None:
+            self.global_symbol_table = self.global_symbol_table.parent
+        self.parent_scope = symbol_table
+        self.loader = loader
+        self.budget = budget
+        self.execute_time = 0.0 if timed else None
+        self.autoescape = autoescape
+        self.compiling = compiling
+        self.minify = minify
+        self.minifier = WhitespaceMinifier() if minify else None
+        self.sink = sink
+        self.output_bytes = 0
+        self.lenient = lenient
+        # chaque partial n'est vérifié qu'une fois par parsing, quel que soit le nombre de ses includes
+        self.validated = set() if validated is None else validated
+        self.DEBUG = DEBUG
+        self.counter = 0
+        self._open_bloc()
+
+    def _open_bloc(self):
+        """Creates the scope and the interpreter of the next dumbo bloc."""
+        self.bloc_scope = SymbolTable(self.parent_scope)
+        self.current_scope = self.bloc_scope
+        self.inter = IntermediateCodeInterpreter()
+
+    def expressions_list(self, items):
+        # les instructions sont déjà dans la pile de l'interpréteur
+        return None
+
+    def _emit(self, text):
+        """Writes a piece of the output to the sink, if there is one."""
+        if self.sink is None:
+            return text
+        data = text.encode("utf-8")
+        self.sink.write(data)
+        self.output_bytes += len(data)
+        return ""
+
+    programme = DumboTemplateTransformer.programme
+
+    def txt(self, items):
+        return self._emit(DumboTemplateTransformer.txt(self, items))
+
+    def start(self, items):
+        if self.compiling:
+            # les morceaux sont dans l'ordre inverse (voir programme)
+            return tuple(reversed(items[0])) if items else ()
+        return DumboTemplateTransformer.start(self, items)
+
+    def dumbo_bloc(self, items):
+        if self.DEBUG:
+            print("dumbo_bloc", self.counter)
+            self.counter += 1
+
+        if self.compiling:
+            compiled_bloc = self.inter
+            self._open_bloc()
+            return compiled_bloc
 
-        self.current_scope.remove_scope(self.current_scope.get_subscope())
+        if self.execute_time is None:
+            result = self.inter.execute(self.bloc_scope, DEBUG=self.DEBUG, budget=self.budget,
+                                        autoescape=self.autoescape)
+        else:
+            start = time.perf_counter()
+            result = self.inter.execute(self.bloc_scope, DEBUG=self.DEBUG, budget=self.budget,
+                                        autoescape=self.autoescape)
+            self.execute_time += time.perf_counter() - start
+
+        self._open_bloc()
+
+        return self._emit(result)
+
+
+class _SyntaxChecker(Transformer):
+    """Reduces every rule to the same empty tree: the parser only checks the syntax, without building anything."""
+
+    # les règles inlinées (_règle) sont aplaties par Lark, qui lit les enfants de leur réduction
+    EMPTY = Tree("syntax", [])
+
+    def __default__(self, data, children, meta):
+        return _SyntaxChecker.EMPTY
+
+
+def check_syntax(text):
+    """
+    Checks the syntax of a data file or a template, without lowering nor executing it.
+
+    Parameters:
+    ----------
+    text : str
+        The content to check.
+
+    Raises:
+    ------
+    lark.exceptions.UnexpectedInput
+        If the content is not valid, as the parsing would.
+    """
+    global _syntax_parser
+    if _syntax_parser is None:
+        # le transformer n'a pas d'état : le parser peut servir à plusieurs threads à la fois
+        _syntax_parser = Lark.open("dumbo.lark", parser='lalr', rel_to=__file__, transformer=_SyntaxChecker())
+    _syntax_parser.parse(text)
+
+
+@contextmanager
+def _inline_parser(metrics):
+    """
+    Lends a parser of the current thread, whose transformer lowers the code while it is parsed.
+
+    A parser is never used by two parsings at once: a data variable lowered on demand (see dumbo_core.lazy_data) is
+    parsed while the template reading it is still being parsed, so a nested parsing gets another parser.
+    """
+    idle = getattr(_inline_parsers, "idle", None)
+    if idle is None:
+        idle = _inline_parsers.idle = []
+
+    if idle:
+        parser = idle.pop()
+    else:
+        start = time.perf_counter()
+        parser = Lark.open("dumbo.lark", parser='lalr', rel_to=__file__, transformer=DumboInlineTransformer())
+        if metrics is not None:
+            metrics.observe("dumbo_grammar_load_seconds", time.perf_counter() - start)
+    try:
+        yield parser
+    finally:
+        idle.append(parser)
+
+
+def parse_inline(text, symbol_table, loader=None, DEBUG=False, budget=None, name="<template>", autoescape=False,
+                 minify=False, sink=None):
+    """
+    Parses a data file or a template and executes its dumbo blocs during the parsing.
+
+    When the metrics are enabled (see dumbo_core.metrics), the time spent parsing and lowering, the time spent
+    executing, the executed instructions and the emitted bytes are recorded with the label template=name.
+
+    Parameters:
+    ----------
+    text : str
+        The content of the data file or of the template.
+    symbol_table : SymbolTable
+        The scope in which the dumbo blocs are executed (the global symbol table most of the time).
+    loader : TemplateLoader, optional
+        The loader used to resolve 'include' expressions.
+    DEBUG : bool
+        whether to print debug information or not.
+    budget : RenderBudget, optional
+        The limits of the rendering.
+    name : str
+        The name of the data file or of the template in the metrics.
+    autoescape : bool
+        whether to escape the HTML special characters of the printed values or not.
+    minify : bool
+        whether to collapse the insignificant whitespaces of the literal text or not (see WhitespaceMinifier).
+    sink : binary file-like object, optional
+        Where the output is written (UTF-8) while the template is parsed, instead of being returned.
+
+    Returns:
+    -------
+    str
+        The output of the template. (empty if it was written to sink)
+
+    Raises:
+    ------
+    BudgetExceededError
+        If the budget is exceeded.
+    """
+    metrics = get_metrics()
+    if metrics is not None and budget is None:
+        # un budget sans limite sert à compter les instructions exécutées
+        budget = RenderBudget()
+    instructions = budget.instructions if budget is not None else 0
+
+    with _inline_parser(metrics) as parser:
+        transformer = parser.options.transformer
+        transformer.reset(symbol_table, loader=loader, DEBUG=DEBUG, budget=budget, timed=metrics is not None,
+                          autoescape=autoescape, minify=minify, sink=sink)
+        start = time.perf_counter()
+        result = parser.parse(text)
+        execute_time = transformer.execute_time
+        output_bytes = transformer.output_bytes
+
+    if metrics is not None:
+        total_time = time.perf_counter() - start
+        metrics.observe("dumbo_stage_seconds", total_time - execute_time, stage="parse_lower", template=name)
+        metrics.observe("dumbo_stage_seconds", execute_time, stage="execute", template=name)
+        metrics.inc("dumbo_instructions_total", budget.instructions - instructions, template=name)
+        if sink is None:
+            output_bytes = len(result.encode("utf-8"))
+        metrics.inc("dumbo_output_bytes_total", output_bytes, template=name)
+
+    return result
+
+
+class CompiledTemplate:
+    """
+    A class used to represent a template compiled once and rendered many times, possibly from several threads at once.
+
+    A compiled template is never modified by a rendering: the literal text is kept as strings and each dumbo bloc as
+    the instruction stack of an IntermediateCodeInterpreter, whose execution state is local. Everything that changes
+    during a rendering lives in its RenderContext, starting with a private copy of the global scope: the assignments
+    of a rendering are never seen by the symbol table it was given, nor by the other renderings.
 
+    Attributes:
+    ----------
+    parts : tuple
+        The literal strings and the compiled dumbo blocs (IntermediateCodeInterpreter), in the order of the template.
+    name : str
+        The name of the template in the metrics.
+
+    Methods:
+    -------
+    render(symbol_table, DEBUG=False, budget=None, autoescape=False, executor=None)
+        Renders the template with the given global scope.
+    """
+
+    def __init__(self, parts, name="<template>"):
+        self.parts = parts
+        self.name = name
+
+    def render(self, symbol_table, DEBUG=False, budget=None, autoescape=False, executor=None):
+        """
+        Renders the template with the given global scope (which is not modified).
+
+        With an executor, the independent dumbo blocs are executed by its worker processes, from a snapshot of the
+        variables they read: the output is the same as the sequential one.
+
+        Parameters:
+        ----------
+        symbol_table : SymbolTable
+            The global symbol table, filled by the data file.
+        DEBUG : bool
+            whether to print debug information or not.
+        budget : RenderBudget, optional
+            The limits of the rendering. (a budget can't be shared by concurrent renderings)
+        autoescape : bool
+            whether to escape the HTML special characters of the printed values or not.
+        executor : concurrent.futures.Executor, optional
+            The executor on which the independent dumbo blocs are executed. (None to execute everything
+            sequentially)
+
+        Raises:
+        ------
+        BudgetExceededError
+            If the budget is exceeded (the independent blocs get a share of what remains, and the resources they
+            used are counted when their output is collected: the limits apply to the whole rendering).
+        """
+        metrics = get_metrics()
+        start = time.perf_counter()
+
+        context = RenderContext(symbol_table, DEBUG=DEBUG, budget=budget, autoescape=autoescape)
+        output = []
+        for part in self.parts:
+            if isinstance(part, str):
+                output.append(part)
+            elif executor is not None and self._is_independent(part):
+                # le bloc ne modifie aucune variable : il est exécuté à part avec les valeurs actuelles de ce qu'il
+                # lit (copiées tout de suite : les blocs suivants peuvent les modifier avant l'envoi au processus)
+                variables = pickle.dumps(self._snapshot(part, context.symbol_table))
+                share = budget.share() if budget is not None else None
+                output.append(executor.submit(_execute_bloc, part, variables, DEBUG, share, autoescape))
+            else:
+                output.append(context.execute(part))
+
+        for index, part in enumerate(output):
+            if not isinstance(part, str):
+                output[index], share = part.result()
+                if share is not None:
+                    # les ressources utilisées par le bloc comptent dans le budget du rendu entier
+                    budget.merge(share)
+        result = "".join(output)
+
+        if metrics is not None:
+            metrics.inc("dumbo_renders_total", template=self.name)
+            metrics.observe("dumbo_stage_seconds", time.perf_counter() - start, stage="execute", template=self.name)
         return result
+
+    @staticmethod
+    def _is_independent(bloc):
+        """
+        Checks if a compiled dumbo bloc can be executed concurrently with the others.
+
+        A bloc is independent if it writes no variable (its loop variables are local) and includes no partial, so
+        no other bloc depends on it. Only the blocs containing a loop are worth sending to another process.
+        """
+        types = {task.get_type() for task in bloc.stack}
+        return AExpression.FOR in types and AExpression.VAR not in types and AExpression.INCLUDE not in types
+
+    @staticmethod
+    def _snapshot(bloc, symbol_table):
+        """
+        Returns the variables read by a compiled dumbo bloc, including the ones they reference, in their current state.
+        """
+        to_visit = []
+        values = [task.get_content() for task in bloc.stack if task.get_type() != AExpression.ENDFOR]
+        values += [(task.condition, task.limit) for task in bloc.stack if task.get_type() == AExpression.FOR]
+        while values:
+            value = values.pop()
+            if isinstance(value, Variable):
+                if value.get_type() == REF:
+                    to_visit.append(value.get_value())
+                    continue
+                if value.get_type() == BUILTIN and value.get_value()[0] == "field":
+                    # a.b : a est un enregistrement, ou a et b sont concaténées
+                    to_visit += [field.get_value() for field in value.get_value()[1][1:]]
+                values.append(value.get_value())
+            elif isinstance(value, (list, tuple)):
+                values += value
+
+        snapshot = {}
+        while to_visit:
+            name = to_visit.pop()
+            if name in snapshot or name not in symbol_table:
+                # déjà copiée, ou variable de boucle (locale au bloc)
+                continue
+            variable = symbol_table.get(name)
+            snapshot[name] = variable
+
+            if variable.get_type() == REF:
+                to_visit.append(variable.get_value())
+            elif variable.get_type() == STRING_CONCAT:
+                to_visit += [item.get_value() for item in variable.get_value() if item.get_type() == REF]
+
+        return list(snapshot.values())
+
+    def __repr__(self):
+        return f"CompiledTemplate({self.name}, {len(self.parts)} parts)"
+
+
+def compile_template(text, symbol_table, loader=None, name="<template>", minify=False, _lenient=False,
+                     _validated=None):
+    """
+    Compiles a template without executing it.
+
+    Parameters:
+    ----------
+    text : str
+        The content of the template.
+    symbol_table : SymbolTable
+        The global scope the template will be rendered with: the names it reads are checked at compile time. It is
+        not modified (the compiler works on a copy).
+    loader : TemplateLoader, optional
+        The loader used to resolve 'include' expressions.
+    name : str
+        The name of the template in the metrics.
+    minify : bool
+        whether to collapse the insignificant whitespaces of the literal text or not (see WhitespaceMinifier).
+
+    Returns:
+    -------
+    CompiledTemplate
+        The compiled template.
+    """
+    metrics = get_metrics()
+    with _inline_parser(metrics) as parser:
+        parser.options.transformer.reset(symbol_table.copy(), loader=loader, compiling=True, minify=minify,
+                                         lenient=_lenient, validated=_validated)
+        start = time.perf_counter()
+        parts = parser.parse(text)
+
+    if metrics is not None:
+        metrics.observe("dumbo_stage_seconds", time.perf_counter() - start, stage="parse_lower", template=name)
+
+    # les textes consécutifs sont fusionnés
+    merged = []
+    for part in parts:
+        if isinstance(part, str) and merged and isinstance(merged[-1], str):
+            merged[-1] += part
+        else:
+            merged.append(part)
+    return CompiledTemplate(tuple(merged), name)
@@ -0,0 +1,55 @@
+# encoding: utf-8
+from dumbo_core.symbol_table import Iterable
+
+# table de traduction des caractères spéciaux HTML (utilisable avec str.translate)
+HTML_ESCAPE_TABLE = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    "\"": "&quot;",
+    "'": "&#x27;",
+})
+
+# str.translate passe par un chemin lent quand un caractère devient plusieurs : une suite de str.replace
+# (écrits en C, '&' en premier) est 3 à 5 fois plus rapide sur CPython pour le même résultat
+_HTML_REPLACEMENTS = tuple((chr(character), entity) for character, entity in HTML_ESCAPE_TABLE.items())
+
+
+def escape_html(text):
+    """Returns the text with the HTML special characters (& < > \" ') replaced by entities."""
+    for character, entity in _HTML_REPLACEMENTS:
+        if character in text:
+            text = text.replace(character, entity)
+    return text
+
+
+def escaped_items(list_variable):
+    """
+    Returns the escaped string of every element of a list variable.
+
+    The result is cached on the variable: a loop printing its elements escapes each of them once, even when the list
+    comes from a data file rendered with many templates. The cache is tied to the list object, so it is recomputed
+    if the variable gets another list.
+    """
+    cached = list_variable._escaped
+    if cached is None or cached[0] is not list_variable.get_value():
+        items = list_variable.get_value()
+        cached = list_variable._escaped = (items, [escape_html(str(item)) for item in items])
+    return cached[1]
+
+
+def escape_variable(variable):
+    """
+    Returns the escaped string of a variable.
+
+    A loop variable uses the escaped elements of the list it iterates (see escaped_items), any other variable
+    caches its own escaped value.
+    """
+    if isinstance(variable, Iterable) and variable.source is not None:
+        return escaped_items(variable.source)[variable.index]
+
+    cached = variable._escaped
+    if cached is None or cached[0] is not variable.get_value():
+        value = variable.get_value()
+        cached = variable._escaped = (value, escape_html(str(value)))
+    return cached[1]
@@ -1,34 +1,251 @@
+import operator
+import time
+from itertools import islice
+
+from dumbo_core.escaping import escape_variable
 from dumbo_core.symbol_table import *
 
 
+# opérateurs de comparaison des filtres 'where'
+COMPARISONS = {
+    "<": operator.lt,
+    ">": operator.gt,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+
+class BudgetExceededError(Exception):
+    """
+    Exception raised when a rendering exceeds one of the limits of its RenderBudget.
+
+    Attributes:
+    ----------
+    limit : str
+        The name of the exceeded limit ('max_instructions', 'max_loop_iterations', 'max_output_size' or 'timeout').
+    value : int | float
+        The value of the limit.
+    """
+
+    def __init__(self, limit, value):
+        self.limit = limit
+        self.value = value
+        super(BudgetExceededError, self).__init__(f"render budget exceeded: {limit} = {value}")
+
+
+class RenderBudget:
+    """
+    A class used to limit the resources used by one rendering (data file and template, partials included).
+
+    The counters are shared by all the dumbo blocs of the rendering. The clock starts when the budget is created and
+    is only read every CHECK_INTERVAL instructions, so that an enabled budget costs a few integer comparisons per
+    instruction.
+
+    Attributes:
+    ----------
+    max_instructions : int, optional
+        The maximum number of executed instructions.
+    max_loop_iterations : int, optional
+        The maximum number of loop iterations.
+    max_output_size : int, optional
+        The maximum number of characters printed by the dumbo blocs.
+    timeout : float, optional
+        The maximum duration of the rendering, in seconds.
+    instructions : int
+        The number of executed instructions.
+    loop_iterations : int
+        The number of loop iterations.
+    output_size : int
+        The number of printed characters.
+    next_check : int
+        The number of instructions after which check() must be called.
+    limited : bool
+        whether the budget has a limit or only counts the resources used (the metrics use such a budget).
+
+    Methods:
+    -------
+    check()
+        Checks the instruction count and the clock.
+    add_instructions(count)
+        Counts instructions executed at once.
+    add_output(size)
+        Counts printed characters.
+    check_output_size(size)
+        Checks that a string of the given size could still be printed.
+    add_loop_iteration()
+        Counts a loop iteration.
+    share()
+        Returns the budget of a part of the rendering executed concurrently (in another process).
+    merge(part)
+        Counts the resources used by a part of the rendering executed concurrently.
+    """
+
+    CHECK_INTERVAL = 1024
+
+    def __init__(self, max_instructions=None, max_loop_iterations=None, max_output_size=None, timeout=None):
+        self.max_instructions = max_instructions
+        self.max_loop_iterations = max_loop_iterations
+        self.max_output_size = max_output_size
+        self.timeout = timeout
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.limited = not (max_instructions is None and max_loop_iterations is None and max_output_size is None
+                            and timeout is None)
+
+        self.instructions = 0
+        self.loop_iterations = 0
+        self.output_size = 0
+        self.next_check = 0
+        self._schedule_check()
+
+    def check(self):
+        """
+        Checks the instruction count and the clock, then computes when the next check must happen.
+
+        Raises:
+        ------
+        BudgetExceededError
+            If the rendering executed too many instructions or took too long.
+        """
+        if self.max_instructions is not None and self.instructions > self.max_instructions:
+            raise BudgetExceededError("max_instructions", self.max_instructions)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceededError("timeout", self.timeout)
+
+        self._schedule_check()
+
+    def _schedule_check(self):
+        """Computes the number of instructions after which check() must be called."""
+        self.next_check = self.instructions + RenderBudget.CHECK_INTERVAL
+        if self.max_instructions is not None:
+            self.next_check = min(self.next_check, self.max_instructions + 1)
+
+    def add_instructions(self, count):
+        """Counts instructions executed at once (the items consumed by a native function)."""
+        self.instructions += count
+        if self.instructions >= self.next_check:
+            self.check()
+
+    def add_output(self, size):
+        """Counts printed characters."""
+        self.output_size += size
+        if self.max_output_size is not None and self.output_size > self.max_output_size:
+            raise BudgetExceededError("max_output_size", self.max_output_size)
+
+    def check_output_size(self, size):
+        """Checks that a string of the given size could still be printed (it isn't counted)."""
+        if self.max_output_size is not None and self.output_size + size > self.max_output_size:
+            raise BudgetExceededError("max_output_size", self.max_output_size)
+
+    def add_loop_iteration(self):
+        """Counts a loop iteration."""
+        self.loop_iterations += 1
+        if self.max_loop_iterations is not None and self.loop_iterations > self.max_loop_iterations:
+            raise BudgetExceededError("max_loop_iterations", self.max_loop_iterations)
+
+    def share(self):
+        """
+        Returns the budget of a part of the rendering executed concurrently (in another process): its counters start
+        at 0, its limits are what remains of this budget and its clock is the same. Once the part is done, its
+        counters must be added back with merge().
+        """
+        def remaining(limit, used):
+            return None if limit is None else max(limit - used, 0)
+
+        part = RenderBudget(remaining(self.max_instructions, self.instructions),
+                            remaining(self.max_loop_iterations, self.loop_iterations),
+                            remaining(self.max_output_size, self.output_size))
+        part.timeout = self.timeout
+        part.deadline = self.deadline
+        part.limited = self.limited
+        return part
+
+    def merge(self, part):
+        """
+        Counts the resources used by a part of the rendering executed concurrently (see share()).
+
+        Raises:
+        ------
+        BudgetExceededError
+            If the rendering, this part included, exceeded one of the limits.
+        """
+        self.instructions += part.instructions
+        if self.max_loop_iterations is not None and self.loop_iterations + part.loop_iterations > \
+                self.max_loop_iterations:
+            raise BudgetExceededError("max_loop_iterations", self.max_loop_iterations)
+        self.loop_iterations += part.loop_iterations
+        self.add_output(part.output_size)
+        self.check()
+
+
+class RenderContext:
+    """
+    A class used to hold the state of one rendering of a compiled template.
+
+    Attributes:
+    ----------
+    symbol_table : SymbolTable
+        A private copy of the global scope: the assignments of the rendering are written there.
+    DEBUG : bool
+        whether to print debug information or not.
+    budget : RenderBudget, optional
+        The limits of the rendering.
+    autoescape : bool
+        whether to escape the printed values or not.
+
+    Methods:
+    -------
+    execute(bloc)
+        Executes a compiled dumbo bloc in a new scope of the rendering.
+    """
+
+    def __init__(self, symbol_table, DEBUG=False, budget=None, autoescape=False):
+        self.symbol_table = symbol_table.copy()
+        self.DEBUG = DEBUG
+        self.budget = budget
+        self.autoescape = autoescape
+
+    def execute(self, bloc):
+        """
+        Executes a compiled dumbo bloc in a new scope of the rendering.
+
+        Parameters:
+        ----------
+        bloc : IntermediateCodeInterpreter
+            The compiled dumbo bloc.
+
+        Returns:
+        -------
+        str
+            The output of the bloc.
+        """
+        return bloc.execute(SymbolTable(self.symbol_table), DEBUG=self.DEBUG, budget=self.budget,
+                            autoescape=self.autoescape)
+
+
 class IntermediateCodeInterpreter:
     """
     A class used to represent an intermediate code interpreter.
 
+    The stack is never modified once compiled: the state of an execution (current instruction, scopes, running
+    loops and output) is local to execute(), so one stack can be executed by several threads at once.
+
     Attributes:
     ----------
-    index : int
-        the index of the current instruction.
-    symbolTable : SymbolTable
-        the symbol table of the interpreter.
     stack : list
         the stack of the interpreter.
-    _output_buffer : str
-        the output buffer of the interpreter.
 
     Methods:
     -------
     add_instr(instr)
         Adds an instruction to the stack.
-    execute(symbolTable, DEBUG=False)
+    execute(symbolTable, DEBUG=False, budget=None, autoescape=False)
         Executes the instructions in the stack.
     """
 
     def __init__(self):
-        self.index = 0
-        self.symbolTable = None
         self.stack = []
-        self._output_buffer = ""
 
     def add_instr(self, instr):
         """
@@ -40,10 +257,9 @@ class IntermediateCodeInterpreter:
             the instruction to add.
         """
         self.stack.append(instr)
-        self.index += 1
-        return self.index
+        return len(self.stack)
 
-    def execute(self, symbolTable, DEBUG=False):
+    def execute(self, symbolTable, DEBUG=False, budget=None, autoescape=False):
         """
         Executes the instructions in the stack.
 
@@ -53,9 +269,20 @@ class IntermediateCodeInterpreter:
             the symbol table of the interpreter.
         DEBUG : bool
             whether to print debug information or not.
+        budget : RenderBudget, optional
+            the limits of the rendering.
+        autoescape : bool
+            whether to escape the HTML special characters of the printed values or not ('print escape' and
+            'print raw' override it).
+
+        Raises:
+        ------
+        BudgetExceededError
+            If the budget is exceeded.
         """
+        # tout l'état de l'exécution est local : la même pile peut être exécutée par plusieurs threads à la fois
         globalSymbolTable = symbolTable
-        self.symbolTable = globalSymbolTable
+        scope = globalSymbolTable
         while globalSymbolTable.parent:
             globalSymbolTable = globalSymbolTable.parent
 
@@ -77,13 +304,26 @@ class IntermediateCodeInterpreter:
             _v1 = v1
             _v2 = v2
             while _v1.get_type() == REF:
-                _v1 = self.symbolTable.get(result_v1)
+                _v1 = scope.get(result_v1)
+                result_v1 = _v1.get_value()
+            if _v1.get_type() == FOR_LIST:
+                # variable de boucle : son élément courant
+                _v1 = result_v1
+                result_v1 = _v1.get_value()
+            if _v1.get_type() == BUILTIN:
+                _v1 = call(_v1)
                 result_v1 = _v1.get_value()
             if v1.get_type() == MATH_OP:
                 result_v1 = resolve(*result_v1)
 
             while _v2.get_type() == REF:
-                _v2 = self.symbolTable.get(result_v2)
+                _v2 = scope.get(result_v2)
+                result_v2 = _v2.get_value()
+            if _v2.get_type() == FOR_LIST:
+                _v2 = result_v2
+                result_v2 = _v2.get_value()
+            if _v2.get_type() == BUILTIN:
+                _v2 = call(_v2)
                 result_v2 = _v2.get_value()
             if _v2.get_type() == MATH_OP:
                 result_v2 = resolve(*result_v2)
@@ -102,16 +342,225 @@ class IntermediateCodeInterpreter:
             # elif op == "/":
             return result_v1 / result_v2
 
+        def field(base, names):
+            """
+            Reads the field a.b.c of a record, one name after the other.
+
+            The names are fields as long as the value read is a record: the names left (all of them if a is not a
+            record) are variables concatenated to it, which is what a.b.c meant before records.
+
+            Parameters:
+            ----------
+            base : Variable
+                the variable a.
+            names : list
+                the names b, c...
+
+            Returns:
+            -------
+            Variable
+                an anonymous variable holding the value of the field (or the concatenation).
+            """
+            if base.get_type() == FOR_LIST:
+                base = base.get_value()
+            value = base.get_value()
+            position = 0
+            if base.get_type() == RECORD:
+                while position < len(names) and isinstance(value, (Record, RecordRow)):
+                    value = value.get_field(names[position])
+                    position += 1
+                if position == len(names):
+                    return value_variable(value)
+
+            parts = [str(value)]
+            for name in names[position:]:
+                item = scope.get(name)
+                while item.get_type() == REF:
+                    item = scope.get(item.get_value())
+                parts.append(str(item.get_value()))
+            return Variable("__ANON__", STRING, "".join(parts))
+
+        def evaluate(operand):
+            """Returns the Python value of an operand of a 'where' clause (a loop variable is its current element)."""
+            while operand.get_type() == REF:
+                operand = scope.get(operand.get_value())
+            if operand.get_type() == FOR_LIST:
+                operand = operand.get_value()
+            if operand.get_type() == BUILTIN:
+                operand = call(operand)
+            if operand.get_type() == MATH_OP:
+                return resolve(*operand.get_value())
+            return operand.get_value()
+
+        def test(condition):
+            """
+            Evaluates the CONDITION variable of a 'where' clause in the current scope.
+
+            Parameters:
+            ----------
+            condition : Variable
+                a CONDITION variable, whose value is [operand, operator, operand] ('and' and 'or' combine two
+                CONDITION variables).
+            """
+            left, comparison_operator, right = condition.get_value()
+            if comparison_operator == "and":
+                return test(left) and test(right)
+            if comparison_operator == "or":
+                return test(left) or test(right)
+            return COMPARISONS[comparison_operator](evaluate(left), evaluate(right))
+
+        def matching(loop_var, elements, condition):
+            """
+            Yields the elements of a loop for which the condition of its 'where' clause is true.
+
+            The condition is evaluated in the scope of the loop, where loop_var holds the element being tested.
+            """
+            for element in elements:
+                if budget is not None:
+                    # un élément filtré compte comme une instruction (délai et nombre d'instructions)
+                    budget.instructions += 1
+                    if budget.instructions >= budget.next_check:
+                        budget.check()
+                loop_var._current = element
+                if test(condition):
+                    yield element
+
+        def limit(variable):
+            """Returns the value of the 'limit' clause of a loop."""
+            while variable.get_type() == REF:
+                variable = scope.get(variable.get_value())
+            if variable.get_type() != INT:
+                raise TypeError(f"Can't convert {variable.get_type()} to {INT}")
+            if variable.get_value() < 0:
+                raise ValueError(f"limit must be positive, not {variable.get_value()}")
+            return variable.get_value()
+
+        def chunks(items):
+            """
+            Yields the items consumed by a native function by slices of RenderBudget.CHECK_INTERVAL items, each slice
+            being counted as that many instructions before it is used: the limits are checked while the function runs.
+            """
+            if budget is None:
+                yield items
+                return
+            for start in range(0, len(items), RenderBudget.CHECK_INTERVAL):
+                chunk = items[start:start + RenderBudget.CHECK_INTERVAL]
+                budget.add_instructions(len(chunk))
+                yield chunk
+
+        def call(builtin):
+            """
+            Evaluates a native function (len, join, sum, slice, range or field) on the current values of its arguments.
+
+            The function runs as a single Python operation on the list, without any loop instruction.
+
+            Parameters:
+            ----------
+            builtin : Variable
+                a BUILTIN variable, whose value is (function name, arguments).
+
+            Returns:
+            -------
+            Variable
+                an anonymous variable holding the result.
+            """
+            name, arguments = builtin.get_value()
+            values = []
+            for argument in arguments:
+                while argument is not None and argument.get_type() == REF:
+                    argument = scope.get(argument.get_value())
+                if argument is not None and argument.get_type() == BUILTIN:
+                    argument = call(argument)
+                values.append(argument)
+
+            if name == "range":
+                start, stop = values
+                if start.get_type() != INT or stop.get_type() != INT:
+                    raise TypeError(f"range() expects two {INT}")
+                return Variable("__ANON__", RANGE, range(start.get_value(), stop.get_value()))
+
+            if name == "field":
+                return field(values[0], [value.get_value() for value in values[1:]])
+
+            iterable = values[0]
+            if name == "len" and iterable.get_type() == STRING:
+                return Variable("__ANON__", INT, len(iterable.get_value()))
+            if iterable.get_type() != LIST and iterable.get_type() != RANGE:
+                raise TypeError(f"{name}() expects a {LIST}, not {iterable.get_type()}")
+            items = iterable.get_value()
+
+            if name == "len":
+                return Variable("__ANON__", INT, len(items))
+            elif name == "sum":
+                if iterable.get_type() == RANGE:
+                    # somme d'une suite arithmétique : calculée sans parcourir le range
+                    return Variable("__ANON__", INT, (items[0] + items[-1]) * len(items) // 2 if items else 0)
+                total = 0
+                for chunk in chunks(items):
+                    if any(item.get_type() != INT for item in chunk):
+                        raise TypeError(f"sum() expects a list of {INT}")
+                    total += sum(item.get_value() for item in chunk)
+                return Variable("__ANON__", INT, total)
+            elif name == "join":
+                separator = values[1]
+                if separator.get_type() == STRING_CONCAT:
+                    parts = []
+                    for item in separator.get_value():
+                        while item.get_type() == REF:
+                            item = scope.get(item.get_value())
+                        if item.get_type() == BUILTIN:
+                            item = call(item)
+                        parts.append(str(item.get_value()))
+                    separator = "".join(parts)
+                else:
+                    separator = str(separator.get_value())
+
+                if budget is None:
+                    return Variable("__ANON__", STRING, separator.join(map(str, items)))
+                # le résultat ne doit pas dépasser ce qui reste à afficher : sa taille minimale (les séparateurs, et
+                # un chiffre par entier d'un range) est vérifiée avant de le construire, puis sa taille réelle
+                size = len(separator) * max(len(items) - 1, 0) + (len(items) if iterable.get_type() == RANGE else 0)
+                budget.check_output_size(size)
+                parts = []
+                size = 0
+                for chunk in chunks(items):
+                    parts.append(separator.join(map(str, chunk)))
+                    size += len(parts[-1]) + len(separator)
+                    budget.check_output_size(size - len(separator))
+                return Variable("__ANON__", STRING, separator.join(parts))
+
+            # name == "slice"
+            bounds = []
+            for bound in values[1:]:
+                if bound is not None and bound.get_type() != INT:
+                    raise TypeError(f"Can't convert {bound.get_type()} to {INT}")
+                bounds.append(None if bound is None else bound.get_value())
+            # une tranche d'un range est encore un range (sans copie), celle d'une liste est une copie dont chaque
+            # élément compte comme une instruction
+            items = items[bounds[0]:bounds[1]]
+            if budget is not None and iterable.get_type() == LIST:
+                budget.add_instructions(len(items))
+            return Variable("__ANON__", iterable.get_type(), items)
+
         if DEBUG:
             print("DEBUG MODE IS ON\n")
             print("STACK CONTENT:")
             for task in self.stack:
                 print("\t" + str(task))
 
-        self.index = 0
+        index = 0
+        # les morceaux de la sortie sont concaténés une seule fois à la fin (+= sur un attribut est quadratique)
+        output = []
+        # variables des boucles en cours, la dernière est celle de la boucle la plus imbriquée
+        loops = []
+
+        while index < len(self.stack):
+            task = self.stack[index]
 
-        while self.index < len(self.stack):
-            task = self.stack[self.index]
+            if budget is not None:
+                budget.instructions += 1
+                if budget.instructions >= budget.next_check:
+                    budget.check()
 
             if DEBUG:
                 print("\nDEBUG:", task)
@@ -121,31 +570,39 @@ class IntermediateCodeInterpreter:
                     print("DEBUG: PRINT STATEMENT")
                 # afficher du contenu
                 to_print = task.get_content()
+                escape = autoescape if task.escape is None else task.escape
                 # si la variable à afficher n'est pas anonyme, elle est dans la table des symboles
                 # donc il est possible que sa valeur ait été modifiée entre temps → on récupère la bonne valeur
                 if to_print.get_name() != "__ANON__":
-                    to_print = self.symbolTable.get(to_print.get_name())
+                    to_print = scope.get(to_print.get_name())
 
                 if to_print.get_type() == STRING_CONCAT:
                     to_add = ""
                     for item in to_print.get_value():
                         while item.get_type() == REF:
-                            item = self.symbolTable.get(item.get_value())
+                            item = scope.get(item.get_value())
+                        if item.get_type() == BUILTIN:
+                            item = call(item)
 
-                        to_add += str(item.get_value())
-                    self._output_buffer += to_add
+                        to_add += escape_variable(item) if escape else str(item.get_value())
                 elif to_print.get_type() == MATH_OP:
                     to_print_content = to_print.get_value()
-                    self._output_buffer += str(resolve(*to_print_content))
+                    to_add = str(resolve(*to_print_content))
                 else:
                     while to_print.get_type() == REF:
-                        to_print = self.symbolTable.get(to_print.get_value())
+                        to_print = scope.get(to_print.get_value())
+                    if to_print.get_type() == BUILTIN:
+                        to_print = call(to_print)
 
-                    self._output_buffer += str(to_print.get_value())
+                    to_add = escape_variable(to_print) if escape else str(to_print.get_value())
 
-                # self._output_buffer += "\n"
+                if budget is not None:
+                    budget.add_output(len(to_add))
+                output.append(to_add)
 
-                self.index += 1
+                # output_buffer += "\n"
+
+                index += 1
 
             elif task.get_type() == AExpression.VAR:
                 if DEBUG:
@@ -158,65 +615,101 @@ class IntermediateCodeInterpreter:
                     variable_content = variable.get_value()
                     result = resolve(*variable_content)
                     variable = Variable(variable.get_name(), INT, result)
+                elif variable.get_type() == BUILTIN:
+                    # la fonction native est évaluée une fois, la variable garde son résultat
+                    result = call(variable)
+                    variable = Variable(variable.get_name(), result.get_type(), result.get_value())
                 # print(repr(variable))
                 # ajout d'une variable dans la mémoire si elle n'y est pas encore
 
-                # if variable.get_name() in self.symbolTable:
+                # if variable.get_name() in scope:
                 #     #la variable existe déjà
-                #     if variable.get_name() in self.symbolTable.get_scope():
+                #     if variable.get_name() in scope.get_scope():
                 #         #la variable existe au niveau local
-                #         self.symbolTable.change_value(variable.get_name(), variable)
+                #         scope.change_value(variable.get_name(), variable)
                 #     else:
                 #         #la variable existe au niveau global donc on crée une nouvelle variable locale du même nom
-                #         self.symbolTable.add_content(variable)
+                #         scope.add_content(variable)
                 # else:
                 #     #la vari
 
-                self.symbolTable.change_value(variable.get_name(), variable)
+                if variable.get_name() in scope:
+                    scope.change_value(variable.get_name(), variable)
+                else:
+                    # nouvelle variable : elle est globale (le template a pu être compilé avec une autre table)
+                    globalSymbolTable.add_variable(variable)
 
-                self.index += 1
+                index += 1
 
             elif task.get_type() == AExpression.FOR:
                 if DEBUG:
                     print("DEBUG: BEGINNING FOR LOOP")
 
-                # on récupère le subscope
-                self.symbolTable = self.symbolTable.get_subscope()
-
-                # ajouter la loop variable dans ce scope ou check s'il n'existe pas déjà une variable de ce nom
                 loop_var, iterable_var = task.get_content()
                 # check si l'itérable est bien itérable
                 while iterable_var.get_type() == REF:
-                    iterable_var = self.symbolTable.get(iterable_var.get_value())
-                if iterable_var.get_type() != LIST:
+                    iterable_var = scope.get(iterable_var.get_value())
+                if iterable_var.get_type() == BUILTIN:
+                    iterable_var = call(iterable_var)
+                if iterable_var.get_type() == LIST:
+                    new_loop_var = Iterable(loop_var.get_name(), FOR_LIST, iterable_var.get_value(),
+                                            source=iterable_var)
+                elif iterable_var.get_type() == RANGE:
+                    # les entiers sont produits un par un : la mémoire utilisée ne dépend pas de la taille
+                    new_loop_var = Iterable(loop_var.get_name(), FOR_LIST, map(_integer, iterable_var.get_value()))
+                else:
                     raise NameError(f"{iterable_var.get_name()} ({iterable_var.get_type()}) not iterable")
 
-                new_loop_var = Iterable(loop_var.get_name(), FOR_LIST, iterable_var.get_value())
-
-                self.symbolTable.change_value(loop_var.get_name(), new_loop_var)
-
-                self.index += 1
+                # la variable de boucle est locale : un nouveau scope à chaque exécution de la boucle
+                scope = SymbolTable(scope)
+                scope.add_variable(new_loop_var)
+
+                if task.condition is not None:
+                    # les éléments sont filtrés pendant le parcours, sans exécuter d'instruction pour les autres
+                    # (avec des limites, chaque élément testé est compté : pas de filtre natif ; un budget qui ne
+                    # fait que compter ne compte pas les éléments écartés par le filtre natif)
+                    filtered = None
+                    if budget is None or not budget.limited:
+                        filtered = _native_filter(task.condition, loop_var.get_name(), new_loop_var._value)
+                    if filtered is None:
+                        filtered = matching(new_loop_var, new_loop_var._value, task.condition)
+                    new_loop_var._value = filtered
+                    # les indices ne sont plus ceux de la liste (cache des éléments échappés)
+                    new_loop_var.source = None
+                if task.limit is not None:
+                    # le parcours s'arrête au dernier élément demandé, le reste de l'itérable n'est jamais lu
+                    new_loop_var._value = islice(new_loop_var._value, limit(task.limit))
+
+                if not new_loop_var.start():
+                    # itérable vide : on saute le corps de la boucle
+                    scope = scope.parent
+                    index = task.end
+                    continue
+
+                loops.append(new_loop_var)
+
+                index += 1
 
             elif task.get_type() == AExpression.ENDFOR:
                 if DEBUG:
                     print("DEBUG: ENDING FOR LOOP OR JUMP")
                 # deal with scopes
-                index, loop_var_name = task.get_content()
-                loop_var = self.symbolTable.get(loop_var_name)
-                if loop_var.get_next_value() != Iterable.EOL:
+                jump, loop_var_name = task.get_content()
+                if loops[-1].advance():
                     # On n'a pas encore parcouru toute la liste donc on retourne au début de la boucle
                     if DEBUG:
                         print("DEBUG: JUMP")
-                    loop_var.increment_index()
-                    self.index = index
+                    if budget is not None:
+                        budget.add_loop_iteration()
+                    index = jump
                 else:
                     # on regarde les instructions suivantes
                     if DEBUG:
                         print("DEBUG: ENDING FOR LOOP")
-                    self.index += 1
-                    # on sort du subscope donc on peut le supprimer
-                    self.symbolTable = self.symbolTable.parent
-                    self.symbolTable.remove_scope(self.symbolTable.get_subscope())
+                    index += 1
+                    # on sort du scope de la boucle
+                    loops.pop()
+                    scope = scope.parent
 
             elif task.get_type() == AExpression.IF:
                 if DEBUG:
@@ -224,16 +717,114 @@ class IntermediateCodeInterpreter:
 
                 comparison = task.get_content()
                 if not comparison.get_value():
-                    self.index += 1
-                    while self.stack[self.index].get_type() != AExpression.ENDIF:
-                        self.index += 1
+                    index += 1
+                    while self.stack[index].get_type() != AExpression.ENDIF:
+                        index += 1
 
-                self.index += 1
+                index += 1
 
             elif task.get_type() == AExpression.ENDIF:
-                self.index += 1
+                index += 1
+
+            elif task.get_type() == AExpression.INCLUDE:
+                if DEBUG:
+                    print("DEBUG: INCLUDE")
+                # le partial est rendu dans le scope courant pour avoir accès aux variables de boucle
+                partial = task.get_content()
+                output.append(partial.render(scope, DEBUG=DEBUG, budget=budget, autoescape=autoescape,
+                                             minify=task.minify))
+
+                index += 1
+
+        return "".join(output)
+
 
-        return self._output_buffer
+def _integer(value):
+    """Returns an anonymous integer variable (element of a range)."""
+    return Variable("__ANON__", INT, value)
+
+
+def _native_filter(condition, loop_name, elements):
+    """
+    Returns the elements of a loop for which the condition of its 'where' clause is true, filtered by a Python
+    predicate (builtin filter), or None if the condition reads something else than constants, the loop variable and
+    the fields of the records it iterates.
+
+    On a RecordList, the predicate reads the columns: a record is only created for the matching elements.
+
+    Parameters:
+    ----------
+    condition : Variable
+        The CONDITION variable of the 'where' clause.
+    loop_name : str
+        The name of the loop variable.
+    elements : iterable
+        The elements of the loop (a list of Variable, a RecordList or the integers of a range).
+    """
+    table = elements if isinstance(elements, RecordList) else None
+    predicate = _predicate(condition, loop_name, table)
+    if predicate is None:
+        return None
+    if table is not None:
+        return map(table.__getitem__, filter(predicate, range(len(table))))
+    return filter(predicate, elements)
+
+
+def _predicate(condition, loop_name, table):
+    """Returns the Python predicate of a CONDITION variable (see _native_filter), None if there is none."""
+    left, comparison_operator, right = condition.get_value()
+    if comparison_operator in ("and", "or"):
+        left, right = _predicate(left, loop_name, table), _predicate(right, loop_name, table)
+        if left is None or right is None:
+            return None
+        if comparison_operator == "and":
+            return lambda element: left(element) and right(element)
+        return lambda element: left(element) or right(element)
+
+    compare = COMPARISONS[comparison_operator]
+    left, right = _getter(left, loop_name, table), _getter(right, loop_name, table)
+    if left is None or right is None:
+        return None
+    # une constante est lue une fois, pas à chaque élément
+    if not callable(left) and not callable(right):
+        result = compare(left[0], right[0])
+        return lambda element: result
+    if not callable(right):
+        constant = right[0]
+        return lambda element: compare(left(element), constant)
+    if not callable(left):
+        constant = left[0]
+        return lambda element: compare(constant, right(element))
+    return lambda element: compare(left(element), right(element))
+
+
+def _getter(operand, loop_name, table):
+    """
+    Returns how a predicate reads an operand: (value,) for a constant, a function of the element (or of its index in
+    a RecordList) for the loop variable or one of its fields, None otherwise.
+    """
+    if operand.get_name() == "__ANON__" and operand.get_type() in (INT, STRING):
+        return (operand.get_value(),)
+    if operand.get_type() == REF and operand.get_value() == loop_name and table is None:
+        return Variable.get_value
+
+    if operand.get_type() != BUILTIN or table is None:
+        return None
+    name, arguments = operand.get_value()
+    if name != "field" or len(arguments) != 2 or arguments[0].get_value() != loop_name:
+        return None
+    if arguments[1].get_value() not in table.layout:
+        return None
+    column = table.columns[table.layout[arguments[1].get_value()]]
+    field_name = arguments[1].get_value()
+
+    def read(index):
+        value = column[index]
+        if value is None:
+            raise NameError(f"record has no field '{field_name}'")
+        return value
+
+    return read
 
 
 class AExpression:
@@ -257,6 +848,7 @@ class AExpression:
     JUMP = "JUMP"
     IF = "IF"
     ENDIF = "ENDIF"
+    INCLUDE = "INCLUDE"
 
     def __init__(self, etype, content):
         self._etype = etype
@@ -275,10 +867,16 @@ class AExpression:
 class Printing(AExpression):
     """
     A class used to represent a 'printing' expression. Inherits from the AExpression abstract class.
+
+    Specific Attributes:
+    -------------------
+    escape : bool, optional
+        True for 'print escape', False for 'print raw', None to follow the autoescape option of the rendering.
     """
 
-    def __init__(self, content):
+    def __init__(self, content, escape=None):
         super(Printing, self).__init__(AExpression.PRINT, content)  # on stocke une variable
+        self.escape = escape
 
 
 class VariableAssignment(AExpression):
@@ -293,10 +891,22 @@ class VariableAssignment(AExpression):
 class ForLoop(AExpression):
     """
     A class used to represent a 'for loop' expression. Inherits from the AExpression abstract class.
+
+    Specific Attributes:
+    -------------------
+    end : int
+        The index of the instruction following the matching 'end for' (where an empty loop jumps).
+    condition : Variable, optional
+        The CONDITION variable of the 'where' clause: the elements for which it is false are skipped.
+    limit : Variable, optional
+        The maximum number of iterations ('limit' clause), an integer or a reference to one.
     """
 
-    def __init__(self, content):
+    def __init__(self, content, condition=None, limit=None):
         super(ForLoop, self).__init__(AExpression.FOR, content)  # on stocke une variable et un itérable (tuple)
+        self.end = None
+        self.condition = condition
+        self.limit = limit
 
     def __repr__(self):
         return f"{self._etype}: LOOP VARIABLE = {self.content[0].get_name()}"
@@ -342,3 +952,21 @@ class EndIf(AExpression):
 
     def __repr__(self):
         return f"{self._etype}"
+
+
+class Include(AExpression):
+    """
+    A class used to represent an 'include' expression. Inherits from the AExpression abstract class.
+
+    Specific Attributes:
+    -------------------
+    minify : bool
+        whether the partial collapses the whitespaces of its literal text or not.
+    """
+
+    def __init__(self, content, minify=False):
+        super(Include, self).__init__(AExpression.INCLUDE, content)  # partial déjà compilé (Partial)
+        self.minify = minify
+
+    def __repr__(self):
+        return f"{self._etype}: {self.content.path}"
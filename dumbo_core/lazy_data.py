@@ -0,0 +1,279 @@
+# encoding: utf-8
+import re
+
+from dumbo_core.dumbo_transformers import check_syntax, parse_inline
+from dumbo_core.symbol_table import LazyVariable, SymbolTable
+
+# une assignation 'nom := expression;' : l'expression ne contient ni ';' ni '}}' hors des chaînes de caractères
+_ASSIGNMENT = re.compile(r"\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*:=(?:[^;'}]|'[^'\n]*'|}(?!}))*;")
+_BLOC_END = re.compile(r"\s*}}")
+
+# mots du langage (dumbo.lark) : les autres noms sont des noms de variables
+_KEYWORDS = {"and", "do", "endfor", "endif", "false", "for", "if", "in", "limit", "or", "print", "true", "where",
+             "include", "range", "join", "len", "sum", "escape", "raw"}
+# une chaîne de caractères, un nom ou un entier
+_LEXEME = re.compile(r"'[^'\n]*'|[a-zA-Z_][a-zA-Z0-9_]*|[1-9][0-9]*|\s+")
+
+
+def scan_assignments(text):
+    """
+    Splits a data file into its assignments, without parsing them.
+
+    Parameters:
+    ----------
+    text : str
+        The content of the data file.
+
+    Returns:
+    -------
+    list
+        (name, statement) pairs in the order of the file, or None if the file contains anything else than
+        assignments in its dumbo blocs (a loop, a print, ... or a syntax error).
+    """
+    assignments = []
+    position = 0
+    while True:
+        # le texte hors des blocs n'assigne aucune variable
+        position = text.find("{{", position)
+        if position == -1:
+            return assignments
+        position += 2
+
+        match = _ASSIGNMENT.match(text, position)
+        while match is not None:
+            assignments.append((match.group(1), match.group(0)))
+            position = match.end()
+            match = _ASSIGNMENT.match(text, position)
+
+        match = _BLOC_END.match(text, position)
+        if match is None:
+            return None
+        position = match.end()
+
+
+def _syntax_shape(statement):
+    """
+    Returns the shape of an assignment: its literals and variable names are replaced by lexemes of the same kind.
+
+    Two assignments with the same shape produce the same tokens, up to their values: they are both valid or both
+    invalid, so only one of them has to be parsed. Returns None if a quote doesn't start a string (the assignment
+    must then be parsed).
+    """
+    def shape(match):
+        lexeme = match.group()
+        if lexeme[0] == "'":
+            return "''"
+        if lexeme[0].isspace():
+            return " "
+        if lexeme[0].isdigit():
+            return "1"
+        return lexeme if lexeme in _KEYWORDS else "x"
+
+    result = _LEXEME.sub(shape, statement)
+    if "'" in result.replace("''", ""):
+        return None
+    return result
+
+
+class _Pending(Exception):
+    """Raised when an assignment reads a variable which hasn't been evaluated yet."""
+
+    def __init__(self, variable):
+        self.variable = variable
+        super(_Pending, self).__init__(variable.get_name())
+
+
+class DataFile:
+    """
+    A class used to represent a data file whose assignments are lowered and executed on demand.
+
+    Attributes:
+    ----------
+    versions : dict
+        A dictionary with variable names as keys and the last DeferredVariable assigning them as values (the previous
+        assignments of the same name are chained by DeferredVariable.previous).
+    budget : RenderBudget, optional
+        The limits of the rendering, which also cover the assignments evaluated on demand.
+    name : str
+        The name of the data file in the metrics.
+
+    Methods:
+    -------
+    version(name, position)
+        Returns the assignment of a variable which is in effect at a position of the file.
+    symbol_table()
+        Returns a global symbol table holding the deferred variables.
+    """
+
+    def __init__(self, assignments, budget=None, name="<data>"):
+        self.versions = {}
+        self.budget = budget
+        self.name = name
+        for position, (variable_name, statement) in enumerate(assignments):
+            self.versions[variable_name] = DeferredVariable(variable_name, statement, position, self,
+                                                            previous=self.versions.get(variable_name))
+
+    def version(self, name, position):
+        """
+        Returns the assignment of a variable which is in effect at a position of the file.
+
+        Parameters:
+        ----------
+        name : str
+            The variable name.
+        position : int
+            The position of an assignment in the file.
+
+        Returns:
+        -------
+        DeferredVariable
+            The last assignment of the variable before the position, None if there is none.
+        """
+        variable = self.versions.get(name)
+        while variable is not None and variable.position >= position:
+            variable = variable.previous
+        return variable
+
+    def symbol_table(self):
+        """Returns a global symbol table holding the deferred variables (as if the file had been executed)."""
+        symbol_table = SymbolTable()
+        symbol_table._table = dict(self.versions)
+        return symbol_table
+
+
+class DeferredVariable(LazyVariable):
+    """
+    A class used to represent a variable of a data file which is evaluated the first time it is read. Inherits from
+    the LazyVariable class.
+
+    Its assignment is lowered into a VariableAssignment instruction and executed when its type or its value is first
+    read, then the result is kept. The assignment sees the variables as they were at its position in the file, so
+    the result is the same as if the whole file had been executed in order.
+
+    Specific Attributes:
+    -------------------
+    statement : str
+        The source of the assignment ('name := expression;').
+    position : int
+        The position of the assignment in the file.
+    previous : DeferredVariable, optional
+        The previous assignment of the same name.
+    _data_file : DataFile
+        The data file of the assignment.
+
+    Specific Methods:
+    ----------------
+    evaluate()
+        Executes the assignment, and the ones it reads before.
+    """
+
+    def __init__(self, name, statement, position, data_file, previous=None):
+        super(DeferredVariable, self).__init__(name)
+        self.statement = statement
+        self.position = position
+        self.previous = previous
+        self._data_file = data_file
+
+    def _load(self):
+        self.evaluate()
+
+    def evaluate(self):
+        """
+        Executes the assignment, and the ones it reads before.
+
+        The assignments are executed one after the other from an explicit stack rather than recursively: a chain of
+        assignments can be as long as the file.
+        """
+        pending = [self]
+        while pending:
+            variable = pending[-1]
+            if variable._loaded:
+                pending.pop()
+                continue
+            try:
+                variable._execute()
+            except _Pending as e:
+                # la variable lue est assignée plus haut dans le fichier : elle est évaluée d'abord
+                pending.append(e.variable)
+
+    def _execute(self):
+        """Lowers and executes the assignment in the state of the file at its position."""
+        scope = _DataScope(self._data_file, self.position)
+        parse_inline("{{" + self.statement + "}}", scope, budget=self._data_file.budget, name=self._data_file.name)
+
+        result = scope.get(self._name)
+        self._set(result.get_type(), result.get_value())
+
+    def _describe(self):
+        return f"<deferred: {self.statement.strip()}>"
+
+
+class _DataScope(SymbolTable):
+    """
+    The global scope seen by an assignment of a data file: the variables assigned before it, and its own result.
+
+    A variable which hasn't been evaluated yet interrupts the lowering (see DeferredVariable.evaluate()).
+    """
+
+    def __init__(self, data_file, position):
+        super(_DataScope, self).__init__()
+        self._data_file = data_file
+        self._position = position
+
+    def get(self, k):
+        if k in self._table:
+            return self._table[k]
+        variable = self._data_file.version(k, self._position)
+        if variable is None:
+            raise NameError(f"'{k}' not in symbol table")
+        if not variable._loaded:
+            raise _Pending(variable)
+        return variable
+
+    def change_value(self, k, new_variable):
+        # le résultat de l'assignation reste dans ce scope, même si la variable était déjà assignée
+        self._table[k] = new_variable
+
+    def __contains__(self, o):
+        return o in self._table or self._data_file.version(o, self._position) is not None
+
+
+def load_lazy(text, budget=None, name="<data>"):
+    """
+    Loads a data file without executing it: each variable is evaluated the first time it is read.
+
+    The syntax of every assignment is checked when the file is loaded, so an invalid assignment raises the same error
+    as in an eager execution, even if it is never read.
+
+    Parameters:
+    ----------
+    text : str
+        The content of the data file.
+    budget : RenderBudget, optional
+        The limits of the rendering.
+    name : str
+        The name of the data file in the metrics.
+
+    Returns:
+    -------
+    SymbolTable
+        The global symbol table, or None if the file contains anything else than assignments (it must then be
+        executed as a whole, see parse_inline()).
+
+    Raises:
+    ------
+    lark.exceptions.UnexpectedInput
+        If the data file is not valid.
+    """
+    assignments = scan_assignments(text)
+    if assignments is None:
+        return None
+    # seule l'évaluation est différée : la syntaxe est vérifiée tout de suite, sans rien construire
+    # (une seule assignation de chaque forme est parsée : vérifier v1 := 'a'; suffit pour v2 := 'b';)
+    checked = set()
+    for _, statement in assignments:
+        shape = _syntax_shape(statement)
+        if shape is None or shape not in checked:
+            check_syntax("{{" + statement + "}}")
+            checked.add(shape)
+    return DataFile(assignments, budget=budget, name=name).symbol_table()
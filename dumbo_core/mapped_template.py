@@ -0,0 +1,124 @@
+# encoding: utf-8
+import mmap
+
+from dumbo_core.dumbo_transformers import parse_inline
+from dumbo_core.metrics import get_metrics
+from dumbo_core.output import WhitespaceMinifier
+
+TXT = "TXT"
+BLOC = "BLOC"
+
+_WHITESPACES = b" \t\f\r\n"
+
+
+def iter_segments(buffer):
+    """
+    Splits a template into literal text and dumbo blocs without copying it.
+
+    The literal text follows the rules of the grammar: whitespaces right after a bloc (or at the beginning of the
+    template) are ignored when they start with a new line, as the 'txt' terminal can't start with one.
+
+    Parameters:
+    ----------
+    buffer : bytes-like
+        The content of the template (a mmap object for example).
+
+    Returns:
+    -------
+    generator
+        (TXT | BLOC, offset, length) spans, in the order of the document.
+    """
+    size = len(buffer)
+    position = 0
+    while position < size:
+        bloc_start = buffer.find(b"{{", position)
+        txt_end = size if bloc_start == -1 else bloc_start
+
+        txt_start = position
+        if buffer[txt_start] == ord("\n"):
+            while txt_start < txt_end and buffer[txt_start] in _WHITESPACES:
+                txt_start += 1
+        if txt_start < txt_end:
+            yield TXT, txt_start, txt_end - txt_start
+
+        if bloc_start == -1:
+            break
+
+        position = _find_bloc_end(buffer, bloc_start + 2)
+        yield BLOC, bloc_start, position - bloc_start
+
+
+def _find_bloc_end(buffer, position):
+    """Returns the offset following the '}}' closing a dumbo bloc, ignoring the ones inside strings."""
+    size = len(buffer)
+    while True:
+        closing = buffer.find(b"}}", position)
+        quote = buffer.find(b"'", position)
+        if closing == -1:
+            # bloc non fermé, le parser signalera l'erreur
+            return size
+        if quote == -1 or closing < quote:
+            return closing + 2
+
+        # on saute la chaîne de caractères
+        string_end = buffer.find(b"'", quote + 1)
+        if string_end == -1:
+            return size
+        position = string_end + 1
+
+
+def render_mapped(template_path, symbol_table, sink, loader=None, encoding="utf-8", DEBUG=False, budget=None,
+                  autoescape=False, minify=False):
+    """
+    Renders a template file memory-mapped, writing the output to a binary sink.
+
+    The literal text is never copied: it is written from the mapped file to the sink (unless it is minified). Only
+    the dumbo blocs are decoded and parsed (and executed while being parsed), one at a time.
+
+    Parameters:
+    ----------
+    template_path : str
+        The path of the template file.
+    symbol_table : SymbolTable
+        The global symbol table, filled by the data file.
+    sink : binary file-like object
+        Where the output is written.
+    loader : TemplateLoader, optional
+        The loader used to resolve 'include' expressions.
+    encoding : str
+        The encoding of the template file and of the output.
+    DEBUG : bool
+        whether to print debug information or not.
+    budget : RenderBudget, optional
+        The limits of the rendering.
+    autoescape : bool
+        whether to escape the printed values or not.
+    minify : bool
+        whether to collapse the insignificant whitespaces of the literal text or not (see WhitespaceMinifier).
+    """
+    with open(template_path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # fichier vide, il ne peut pas être mappé
+            return
+
+    metrics = get_metrics()
+    minifier = WhitespaceMinifier() if minify else None
+    with mapped, memoryview(mapped) as view:
+        for kind, offset, length in iter_segments(mapped):
+            if kind == TXT:
+                if minifier is not None:
+                    text = minifier.minify(str(view[offset:offset + length], encoding)).encode(encoding)
+                    sink.write(text)
+                    length = len(text)
+                else:
+                    sink.write(view[offset:offset + length])
+                if metrics is not None:
+                    metrics.inc("dumbo_output_bytes_total", length, template=template_path)
+                continue
+
+            bloc = str(view[offset:offset + length], encoding)
+            output = parse_inline(bloc, symbol_table, loader=loader, DEBUG=DEBUG, budget=budget, name=template_path,
+                                  autoescape=autoescape, minify=minify)
+            sink.write(output.encode(encoding))
@@ -0,0 +1,201 @@
+# encoding: utf-8
+import json
+import os
+import threading
+import time
+
+# bornes (en secondes) des histogrammes de latence
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# description des métriques exportées, key: nom, value: (type, aide)
+METRICS = {
+    "dumbo_grammar_load_seconds": ("histogram", "Time spent loading the Lark grammar."),
+    "dumbo_stage_seconds": ("histogram", "Time spent in each stage of the pipeline, per template "
+                                         "(parse_lower: inline parsing and lowering, parse: parse tree, "
+                                         "execute: execution of the dumbo blocs, partials included)."),
+    "dumbo_renders_total": ("counter", "Number of rendered templates."),
+    "dumbo_instructions_total": ("counter", "Number of executed intermediate code instructions."),
+    "dumbo_output_bytes_total": ("counter", "Number of bytes emitted (UTF-8)."),
+    "dumbo_cache_hits_total": ("counter", "Number of cache hits."),
+    "dumbo_cache_misses_total": ("counter", "Number of cache misses."),
+}
+
+# registre global, None tant que les métriques ne sont pas activées
+_registry = None
+
+
+class MetricsRegistry:
+    """
+    A class used to collect the counters and the latency histograms of the rendering pipeline.
+
+    The values are kept in memory and exported to files: a Prometheus text-format file (for the textfile collector
+    of the node exporter, for example) or a JSON snapshot. Nothing is sent on the network.
+
+    Attributes:
+    ----------
+    buckets : tuple
+        The upper bounds of the histogram buckets, in seconds.
+    _counters : dict
+        key: (name, labels), value: the value of the counter.
+    _histograms : dict
+        key: (name, labels), value: [bucket counts, sum, count].
+
+    Methods:
+    -------
+    inc(name, value=1, **labels)
+        Increments a counter.
+    observe(name, seconds, **labels)
+        Adds a latency to a histogram.
+    time(name, **labels)
+        Context manager adding the duration of its body to a histogram.
+    snapshot()
+        Returns the current values as a dictionary.
+    to_prometheus()
+        Returns the current values in the Prometheus text format.
+    write(path)
+        Writes the current values to a file (JSON if its extension is '.json', Prometheus text format otherwise).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Increments a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Adds a latency (in seconds) to a histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def time(self, name, **labels):
+        """Context manager adding the duration of its body to a histogram."""
+        return _Timer(self, name, labels)
+
+    def snapshot(self):
+        """
+        Returns the current values as a dictionary (used for the JSON export).
+
+        The buckets of the histograms are cumulative, as in the Prometheus format.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(buckets), total, count))
+                                for key, (buckets, total, count) in self._histograms.items())
+
+        result = {"timestamp": time.time(), "counters": {}, "histograms": {}}
+        for (name, labels), value in counters:
+            result["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+        for (name, labels), (buckets, total, count) in histograms:
+            cumulative = []
+            running = 0
+            for bound, bucket in zip(self.buckets, buckets):
+                running += bucket
+                cumulative.append([bound, running])
+            result["histograms"].setdefault(name, []).append({"labels": dict(labels), "buckets": cumulative,
+                                                              "sum": total, "count": count})
+        return result
+
+    def to_prometheus(self):
+        """Returns the current values in the Prometheus text format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name in sorted(set(snapshot["counters"]) | set(snapshot["histograms"])):
+            metric_type, description = METRICS.get(name, ("counter" if name in snapshot["counters"] else "histogram",
+                                                          name))
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for sample in snapshot["counters"].get(name, []):
+                lines.append(f"{name}{_format_labels(sample['labels'])} {sample['value']}")
+            for sample in snapshot["histograms"].get(name, []):
+                for bound, count in sample["buckets"]:
+                    lines.append(f"{name}_bucket{_format_labels(sample['labels'], le=repr(bound))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(sample['labels'], le='+Inf')} {sample['count']}")
+                lines.append(f"{name}_sum{_format_labels(sample['labels'])} {sample['sum']}")
+                lines.append(f"{name}_count{_format_labels(sample['labels'])} {sample['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Writes the current values to a file, atomically (the file is never read half-written).
+
+        Parameters:
+        ----------
+        path : str
+            The path of the file. A '.json' file gets a JSON snapshot, any other one the Prometheus text format.
+        """
+        if path.endswith(".json"):
+            content = json.dumps(self.snapshot(), indent=2)
+        else:
+            content = self.to_prometheus()
+
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as f:
+            f.write(content)
+        os.replace(temporary_path, path)
+
+
+class _Timer:
+    """Context manager used by MetricsRegistry.time()."""
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _format_labels(labels, **extra_labels):
+    labels = dict(labels, **extra_labels)
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def enable_metrics(registry=None):
+    """
+    Enables the collection of the metrics and returns the registry used.
+
+    Parameters:
+    ----------
+    registry : MetricsRegistry, optional
+        The registry to use (a new one by default).
+    """
+    global _registry
+    _registry = registry if registry is not None else MetricsRegistry()
+    return _registry
+
+
+def disable_metrics():
+    """Disables the collection of the metrics."""
+    global _registry
+    _registry = None
+
+
+def get_metrics():
+    """Returns the registry collecting the metrics, or None if they are disabled."""
+    return _registry
@@ -0,0 +1,135 @@
+# encoding: utf-8
+import re
+import sys
+import zlib
+
+# éléments HTML dont le contenu est affiché (ou exécuté) tel quel : leurs espaces sont significatifs
+_RAW_ELEMENT = re.compile(r"<(/?)(pre|textarea|script|style)\b", re.IGNORECASE)
+_WHITESPACES = re.compile(r"\s{2,}|[\t\r\f\v]")
+
+# format de compression → paramètre wbits de zlib (en-tête et somme de contrôle)
+COMPRESSIONS = {
+    "zlib": 15,
+    "gzip": 31,
+}
+
+
+def log_to_stderr(message):
+    """Writes a message of a long-running command (watch, worker) to the standard error."""
+    print(message, file=sys.stderr)
+
+
+def _collapse(match):
+    # un retour à la ligne est gardé : il peut séparer deux instructions d'un attribut on* par exemple
+    return "\n" if "\n" in match.group() else " "
+
+
+class WhitespaceMinifier:
+    """
+    A class used to collapse the insignificant whitespaces of the literal text of a template.
+
+    A run of whitespaces is replaced by a single space, or a single new line if it contains one, which doesn't change
+    how HTML is displayed. The content of the <pre>, <textarea>, <script> and <style> elements is kept as is. The
+    literal segments must be given in the order of the document: an element can start in one and end in another.
+
+    Attributes:
+    ----------
+    raw_element : str, optional
+        The name of the element whose content is being kept as is, None outside of these elements.
+
+    Methods:
+    -------
+    minify(text)
+        Returns the minified text of a literal segment.
+    """
+
+    def __init__(self):
+        self.raw_element = None
+
+    def minify(self, text):
+        """
+        Returns the minified text of a literal segment.
+
+        Parameters:
+        ----------
+        text : str
+            The next literal segment of the template.
+        """
+        parts = []
+        position = 0
+        for match in _RAW_ELEMENT.finditer(text):
+            closing, element = match.group(1), match.group(2).lower()
+            if self.raw_element is None and not closing:
+                parts.append(_WHITESPACES.sub(_collapse, text[position:match.start()]))
+                position = match.start()
+                self.raw_element = element
+            elif closing and element == self.raw_element:
+                parts.append(text[position:match.start()])
+                position = match.start()
+                self.raw_element = None
+
+        rest = text[position:]
+        parts.append(rest if self.raw_element is not None else _WHITESPACES.sub(_collapse, rest))
+        return "".join(parts)
+
+
+class CompressedSink:
+    """
+    A class used to compress an output while it is written, before passing it to another binary sink.
+
+    The data goes through a zlib compressor in a single pass: only the compressor's window is kept in memory,
+    whatever the size of the output.
+
+    Attributes:
+    ----------
+    sink : binary file-like object
+        Where the compressed output is written.
+    compression : str
+        The format of the compressed output ('gzip' or 'zlib').
+    bytes_in : int
+        The number of bytes written before the compression.
+    bytes_out : int
+        The number of compressed bytes written to the sink.
+
+    Methods:
+    -------
+    write(data)
+        Compresses data and writes what the compressor produced.
+    close()
+        Writes the end of the compressed output. (the sink is not closed)
+    """
+
+    def __init__(self, sink, compression="gzip", level=6):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"unknown compression '{compression}' (expected one of {', '.join(COMPRESSIONS)})")
+        self.sink = sink
+        self.compression = compression
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, COMPRESSIONS[compression])
+
+    def write(self, data):
+        """Compresses data (bytes-like) and writes what the compressor produced to the sink."""
+        self.bytes_in += len(data)
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self.bytes_out += len(compressed)
+            self.sink.write(compressed)
+        return len(data)
+
+    def close(self):
+        """Writes the end of the compressed output (the sink is not closed)."""
+        if self._compressor is None:
+            return
+        compressed = self._compressor.flush()
+        self._compressor = None
+        self.bytes_out += len(compressed)
+        self.sink.write(compressed)
+        if hasattr(self.sink, "flush"):
+            self.sink.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
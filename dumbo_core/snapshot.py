@@ -0,0 +1,382 @@
+# encoding: utf-8
+import struct
+import sys
+from array import array
+
+from dumbo_core.symbol_table import *
+
+# en-tête d'un snapshot : signature, version du format, nombre de variables
+MAGIC = b"DUMBOBIN"
+VERSION = 1
+_HEADER = struct.Struct("<8sHI")
+# entrée de l'index : type, position et taille de la valeur (le nom la précède)
+_ENTRY = struct.Struct("<BQQ")
+_LENGTH = struct.Struct("<I")
+_INTEGER = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_RANGE = struct.Struct("<qqq")
+_PACKED_STRINGS = struct.Struct("<II")
+
+# types des variables, dans l'ordre de leur code (ne jamais en retirer ni en réordonner : le format est versionné)
+TYPES = [INT, FLOAT, STRING, STRING_CONCAT, MATH_OP, LIST, FOR_LIST, REF, BOOL, RANGE, BUILTIN, RECORD, CONDITION]
+_TYPE_CODES = {vtype: code for code, vtype in enumerate(TYPES)}
+
+# séparateur des chaînes d'une liste (une liste dont une chaîne le contient est écrite élément par élément)
+_SEPARATOR = "\x00"
+
+
+class SnapshotError(ValueError):
+    """Exception raised when a file is not a snapshot, or a snapshot of another version of the format."""
+
+
+def is_snapshot(data):
+    """Checks if the content of a data file is a snapshot (see compile_data())."""
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def read_data_file(path):
+    """
+    Returns the content of a data file: bytes for a snapshot, str for a data file written in Dumbo.
+
+    Parameters:
+    ----------
+    path : str
+        The path of the data file.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            return MAGIC + f.read()
+    with open(path, "r") as f:
+        return f.read()
+
+
+def compile_data(text, loader=None, budget=None, name="<data>"):
+    """
+    Executes a data file and returns the snapshot of its global symbol table.
+
+    Parameters:
+    ----------
+    text : str
+        The content of the data file.
+    loader : TemplateLoader, optional
+        The loader used to resolve the 'include' expressions of the data file.
+    budget : RenderBudget, optional
+        The limits of the execution.
+    name : str
+        The name of the data file in the metrics.
+
+    Returns:
+    -------
+    bytes
+        The snapshot (see dump_snapshot()).
+    """
+    from dumbo_core.dumbo_transformers import parse_inline
+
+    symbol_table = SymbolTable()
+    parse_inline(text, symbol_table, loader=loader, budget=budget, name=name)
+    return dump_snapshot(symbol_table)
+
+
+def dump_snapshot(symbol_table):
+    """
+    Returns the binary snapshot of the variables of a global symbol table.
+
+    The snapshot starts with a header (MAGIC, VERSION, number of variables) and an index giving the name, the type
+    and the position of the value of each variable. The values follow: each one can be decoded without the others.
+
+    Parameters:
+    ----------
+    symbol_table : SymbolTable
+        The global symbol table.
+    """
+    index = []
+    values = bytearray()
+    for name, variable in symbol_table._table.items():
+        start = len(values)
+        _write(values, variable.get_value())
+        encoded_name = name.encode("utf-8")
+        index.append(_LENGTH.pack(len(encoded_name)) + encoded_name
+                     + _ENTRY.pack(_TYPE_CODES[variable.get_type()], start, len(values) - start))
+
+    return _HEADER.pack(MAGIC, VERSION, len(index)) + b"".join(index) + bytes(values)
+
+
+def load_snapshot(data):
+    """
+    Loads a snapshot: only the index is read, the value of each variable is decoded the first time it is read.
+
+    Parameters:
+    ----------
+    data : bytes
+        The snapshot (see dump_snapshot()).
+
+    Returns:
+    -------
+    SymbolTable
+        The global symbol table.
+
+    Raises:
+    ------
+    SnapshotError
+        If data is not a snapshot, or a snapshot of another version of the format.
+    """
+    if not is_snapshot(data):
+        raise SnapshotError("not a dumbo data snapshot")
+    _, version, count = _HEADER.unpack_from(data)
+    if version != VERSION:
+        raise SnapshotError(f"unsupported snapshot version {version} (expected {VERSION}), compile the data file again")
+
+    view = memoryview(data)
+    entries = []
+    position = _HEADER.size
+    for _ in range(count):
+        (length,) = _LENGTH.unpack_from(data, position)
+        position += _LENGTH.size
+        name = str(view[position:position + length], "utf-8")
+        position += length
+        code, start, size = _ENTRY.unpack_from(data, position)
+        position += _ENTRY.size
+        entries.append((name, code, start, size))
+
+    symbol_table = SymbolTable()
+    for name, code, start, size in entries:
+        symbol_table.add_variable(SnapshotVariable(name, TYPES[code], view[position + start:position + start + size]))
+    return symbol_table
+
+
+class SnapshotVariable(LazyVariable):
+    """
+    A class used to represent a variable of a snapshot, whose value is decoded the first time it is read. Inherits
+    from the LazyVariable class.
+
+    Its type is known without decoding it.
+
+    Specific Attributes:
+    -------------------
+    _encoded : memoryview
+        The encoded value, None once it has been decoded.
+    """
+
+    def __init__(self, name, vtype, encoded):
+        super(SnapshotVariable, self).__init__(name, vtype)
+        self._encoded = encoded
+
+    def get_type(self):
+        return self._vtype
+
+    def _load(self):
+        encoded = self._encoded
+        if encoded is not None:
+            # un autre thread peut la décoder en même temps : au pire, elle est décodée deux fois
+            self._set(self._vtype, _read(encoded, 0)[0])
+            self._encoded = None
+
+    def _describe(self):
+        return f"<snapshot: {len(self._encoded)} bytes> ({self._vtype})"
+
+
+# codes des valeurs encodées
+_NONE, _TRUE, _FALSE, _INT, _BIG_INT, _FLOAT_VALUE, _STR, _LIST, _TUPLE, _RANGE_VALUE = range(10)
+_ANON_VARIABLE, _VARIABLE, _RECORD, _RECORD_LIST, _STRINGS, _INTEGERS = range(10, 16)
+# listes de variables anonymes d'un même type, encodées comme _STRINGS et _INTEGERS
+_STRING_VARIABLES, _INTEGER_VARIABLES = range(16, 18)
+
+
+def _write_str(out, text):
+    encoded = text.encode("utf-8")
+    out += _LENGTH.pack(len(encoded))
+    out += encoded
+
+
+def _read_str(data, position):
+    (length,) = _LENGTH.unpack_from(data, position)
+    position += _LENGTH.size
+    return str(data[position:position + length], "utf-8"), position + length
+
+
+def _packed(values):
+    """
+    Returns the packed encoding (without its code) of a list of strings or of integers: the strings are joined in a
+    single string and the integers form an array, so that the list is decoded by a single operation.
+
+    Returns:
+    -------
+    tuple
+        (_STRINGS or _INTEGERS, encoding), or None if the list can't be packed.
+    """
+    if not values:
+        return None
+    if all(type(value) is str for value in values):
+        joined = _SEPARATOR.join(values)
+        if joined.count(_SEPARATOR) == len(values) - 1:
+            encoded = joined.encode("utf-8")
+            return _STRINGS, _PACKED_STRINGS.pack(len(values), len(encoded)) + encoded
+    elif all(type(value) is int and -2 ** 63 <= value < 2 ** 63 for value in values):
+        integers = array("q", values)
+        if sys.byteorder == "big":
+            # le tableau est dans l'ordre de la machine : il est écrit en petit-boutiste, comme les en-têtes
+            integers.byteswap()
+        return _INTEGERS, _LENGTH.pack(len(values)) + integers.tobytes()
+    return None
+
+
+def _packed_variables(items):
+    """Returns the packed encoding of a list of anonymous STRING or INT variables (see _packed()), None otherwise."""
+    if not items or not all(type(item) is Variable and item.get_name() == "__ANON__" for item in items):
+        return None
+    vtype = items[0].get_type()
+    if vtype not in (STRING, INT) or not all(item.get_type() == vtype for item in items):
+        return None
+    packed = _packed([item.get_value() for item in items])
+    if packed is None:
+        return None
+    return _STRING_VARIABLES if packed[0] == _STRINGS else _INTEGER_VARIABLES, packed[1]
+
+
+def _write(out, value):
+    """Appends the encoding of a value (of a variable, of a field or of an element) to out."""
+    if value is None:
+        out.append(_NONE)
+    elif value is True or value is False:
+        out.append(_TRUE if value else _FALSE)
+    elif isinstance(value, int):
+        if -2 ** 63 <= value < 2 ** 63:
+            out.append(_INT)
+            out += _INTEGER.pack(value)
+        else:
+            out.append(_BIG_INT)
+            _write_str(out, str(value))
+    elif isinstance(value, float):
+        out.append(_FLOAT_VALUE)
+        out += _FLOAT.pack(value)
+    elif isinstance(value, str):
+        out.append(_STR)
+        _write_str(out, value)
+    elif isinstance(value, Variable):
+        # une liste de variables est décodée en une seule opération (voir _packed())
+        if value.get_name() == "__ANON__":
+            out.append(_ANON_VARIABLE)
+        else:
+            out.append(_VARIABLE)
+            _write_str(out, value.get_name())
+        out.append(_TYPE_CODES[value.get_type()])
+        _write(out, value.get_value())
+    elif isinstance(value, list):
+        packed = _packed_variables(value) or _packed(value)
+        if packed is not None:
+            out.append(packed[0])
+            out += packed[1]
+            return
+        out.append(_LIST)
+        out += _LENGTH.pack(len(value))
+        for item in value:
+            _write(out, item)
+    elif isinstance(value, tuple):
+        out.append(_TUPLE)
+        out += _LENGTH.pack(len(value))
+        for item in value:
+            _write(out, item)
+    elif isinstance(value, range):
+        out.append(_RANGE_VALUE)
+        out += _RANGE.pack(value.start, value.stop, value.step)
+    elif isinstance(value, (Record, RecordRow)):
+        fields = value._fields()
+        out.append(_RECORD)
+        out += _LENGTH.pack(len(fields))
+        for name, field in fields.items():
+            _write_str(out, name)
+            _write(out, field)
+    elif isinstance(value, RecordList):
+        out.append(_RECORD_LIST)
+        out += _LENGTH.pack(len(value.layout))
+        for name, column in zip(value.layout, value.columns):
+            _write_str(out, name)
+            _write(out, column)
+    else:
+        raise TypeError(f"Can't write {type(value).__name__} in a snapshot")
+
+
+def _read(data, position):
+    """Decodes the value at a position of data, returns it with the position of the next value."""
+    code = data[position]
+    position += 1
+    if code == _NONE:
+        return None, position
+    if code == _TRUE or code == _FALSE:
+        return code == _TRUE, position
+    if code == _INT:
+        return _INTEGER.unpack_from(data, position)[0], position + _INTEGER.size
+    if code == _BIG_INT:
+        text, position = _read_str(data, position)
+        return int(text), position
+    if code == _FLOAT_VALUE:
+        return _FLOAT.unpack_from(data, position)[0], position + _FLOAT.size
+    if code == _STR:
+        return _read_str(data, position)
+    if code == _ANON_VARIABLE or code == _VARIABLE:
+        name = "__ANON__"
+        if code == _VARIABLE:
+            name, position = _read_str(data, position)
+        vtype = TYPES[data[position]]
+        value, position = _read(data, position + 1)
+        return Variable(name, vtype, value), position
+    if code == _LIST:
+        (length,) = _LENGTH.unpack_from(data, position)
+        position += _LENGTH.size
+        items = []
+        for _ in range(length):
+            item, position = _read(data, position)
+            items.append(item)
+        return items, position
+    if code == _TUPLE:
+        (length,) = _LENGTH.unpack_from(data, position)
+        position += _LENGTH.size
+        items = []
+        for _ in range(length):
+            item, position = _read(data, position)
+            items.append(item)
+        return tuple(items), position
+    if code == _RANGE_VALUE:
+        return range(*_RANGE.unpack_from(data, position)), position + _RANGE.size
+    if code == _RECORD:
+        (length,) = _LENGTH.unpack_from(data, position)
+        position += _LENGTH.size
+        names, values = [], []
+        for _ in range(length):
+            name, position = _read_str(data, position)
+            value, position = _read(data, position)
+            names.append(name)
+            values.append(value)
+        return Record(record_layout(names), values), position
+    if code == _RECORD_LIST:
+        (length,) = _LENGTH.unpack_from(data, position)
+        position += _LENGTH.size
+        names, columns = [], []
+        for _ in range(length):
+            name, position = _read_str(data, position)
+            column, position = _read(data, position)
+            names.append(name)
+            columns.append(column)
+        return RecordList(record_layout(names), columns), position
+    if code == _STRINGS or code == _STRING_VARIABLES:
+        count, size = _PACKED_STRINGS.unpack_from(data, position)
+        position += _PACKED_STRINGS.size
+        values = str(data[position:position + size], "utf-8").split(_SEPARATOR)
+        position += size
+    elif code == _INTEGERS or code == _INTEGER_VARIABLES:
+        (count,) = _LENGTH.unpack_from(data, position)
+        position += _LENGTH.size
+        integers = array("q")
+        integers.frombytes(data[position:position + integers.itemsize * count])
+        if sys.byteorder == "big":
+            integers.byteswap()
+        values = integers.tolist()
+        position += integers.itemsize * count
+    else:
+        raise SnapshotError(f"corrupted snapshot (unknown value code {code})")
+
+    if code == _STRING_VARIABLES:
+        return [Variable("__ANON__", STRING, value) for value in values], position
+    if code == _INTEGER_VARIABLES:
+        return [Variable("__ANON__", INT, value) for value in values], position
+    return values, position
@@ -0,0 +1,322 @@
+# encoding: utf-8
+import hashlib
+import io
+import json
+import os
+import socket
+import time
+import uuid
+
+from dumbo_core.dumbo_transformers import SymbolTable, parse_inline
+from dumbo_core.lazy_data import load_lazy
+from dumbo_core.output import log_to_stderr
+from dumbo_core.snapshot import is_snapshot, load_snapshot
+from dumbo_core.template_loader import TemplateLoader
+
+# sous-dossiers du spool
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+TMP = "tmp"
+
+
+def file_sha256(path):
+    """Returns the SHA-256 hash of the content of a file (hexadecimal)."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _read_source(path, sha256, kind):
+    """
+    Returns the content of a source of a job (bytes), checking that it is the one hashed by submit_job().
+
+    Raises:
+    ------
+    ValueError
+        If the file changed since the job was submitted.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    if hashlib.sha256(content).hexdigest() != sha256:
+        raise ValueError(f"the {kind} '{path}' changed since the job was submitted")
+    return content
+
+
+def _decode(content):
+    """Decodes the content of a source as open(path, "r") does (default encoding, universal newlines)."""
+    return io.TextIOWrapper(io.BytesIO(content)).read()
+
+
+def _write_json(directory, name, content, spool_dir):
+    """Writes a JSON file atomically: it is written in the tmp directory of the spool, then renamed."""
+    temporary_path = os.path.join(spool_dir, TMP, f"{name}.{uuid.uuid4().hex}")
+    with open(temporary_path, "w") as f:
+        json.dump(content, f, indent=2)
+    os.replace(temporary_path, os.path.join(directory, name))
+
+
+def init_spool(spool_dir):
+    """Creates the sub-directories of a spool directory if needed."""
+    for directory in (PENDING, CLAIMED, DONE, FAILED, TMP):
+        os.makedirs(os.path.join(spool_dir, directory), exist_ok=True)
+
+
+def submit_job(spool_dir, template_path, data_path, output_path):
+    """
+    Adds a render job to a spool directory.
+
+    The paths are made absolute, so the nodes sharing the spool must see the files at the same paths. The hashes of
+    the template and of the data file are recorded: a worker refuses the job if the files changed since.
+
+    Returns:
+    -------
+    dict
+        The job, as written in the 'pending' directory.
+    """
+    init_spool(spool_dir)
+    job = {
+        # le préfixe temporel garde les jobs dans l'ordre de soumission
+        "id": f"{time.time_ns():020d}-{uuid.uuid4().hex[:12]}",
+        "template": os.path.abspath(template_path),
+        "data": os.path.abspath(data_path),
+        "output": os.path.abspath(output_path),
+        "template_sha256": file_sha256(template_path),
+        "data_sha256": file_sha256(data_path),
+        "submitted_at": time.time(),
+    }
+    _write_json(os.path.join(spool_dir, PENDING), f"{job['id']}.json", job, spool_dir)
+    return job
+
+
+class SpoolWorker:
+    """
+    A class used to render the jobs of a spool directory shared by several workers (possibly on several nodes).
+
+    A job is claimed by renaming its file from 'pending' to 'claimed': the rename is atomic, so exactly one worker
+    gets each job. Once rendered, the output is written atomically and the job, with its timing record, is moved to
+    'done' (or 'failed'). The compiled templates and the evaluated data files (Dumbo or snapshot) are kept in memory,
+    keyed by the hash of their content, so a worker gets faster as it renders jobs sharing the same sources.
+
+    A claim is a lease: a job claimed for longer than 'lease' seconds is considered abandoned by a worker which
+    stopped, and the next worker looking for jobs puts it back in 'pending' (or in 'failed' once it was abandoned
+    max_attempts times). The lease must be longer than the longest job, and the clocks of the nodes sharing the spool
+    must agree.
+
+    Attributes:
+    ----------
+    spool_dir : str
+        The spool directory.
+    worker_id : str
+        The identifier of the worker, written in the timing records.
+    templates : dict
+        key: SHA-256 of a template, value: the compiled template (Partial), compiled again when one of the partials
+        it includes changes.
+    data : dict
+        key: SHA-256 of a data file, value: the global symbol table it produces.
+    lease : float
+        The time after which a claimed job is considered abandoned, in seconds.
+    max_attempts : int
+        The number of times a job can be abandoned before it fails.
+
+    Methods:
+    -------
+    claim()
+        Claims the oldest pending job.
+    recover()
+        Puts back in 'pending' the jobs whose lease expired.
+    process(job)
+        Renders a job and returns its timing record.
+    run(poll_interval=0.5, exit_when_empty=False)
+        Claims and renders jobs until stopped.
+    """
+
+    def __init__(self, spool_dir, parser, worker_id=None, log=log_to_stderr, lease=300.0, max_attempts=3):
+        self.spool_dir = spool_dir
+        self.parser = parser
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.log = log
+        self.templates = {}
+        self.data = {}
+        self.lease = lease
+        self.max_attempts = max_attempts
+        init_spool(spool_dir)
+
+    def claim(self):
+        """
+        Claims the oldest pending job.
+
+        Returns:
+        -------
+        tuple
+            (job, path of the claimed file), or None if there is no pending job.
+        """
+        pending_dir = os.path.join(self.spool_dir, PENDING)
+        for name in sorted(os.listdir(pending_dir)):
+            if not name.endswith(".json"):
+                continue
+            pending_path = os.path.join(pending_dir, name)
+            claimed_path = os.path.join(self.spool_dir, CLAIMED, f"{name[:-len('.json')]}.{self.worker_id}.json")
+            try:
+                # le renommage garde la date du fichier : elle est mise à jour avant, pour que le bail commence
+                # dès que le job apparaît dans 'claimed' (recover() ne doit pas le croire abandonné)
+                os.utime(pending_path)
+                os.rename(pending_path, claimed_path)
+                with open(claimed_path, "r") as f:
+                    return json.load(f), claimed_path
+            except FileNotFoundError:
+                # un autre worker a été plus rapide
+                continue
+        return None
+
+    def recover(self):
+        """
+        Puts back in 'pending' the jobs claimed for longer than the lease (their worker stopped), or moves them to
+        'failed' once they were abandoned max_attempts times.
+
+        Returns:
+        -------
+        int
+            The number of jobs recovered.
+        """
+        claimed_dir = os.path.join(self.spool_dir, CLAIMED)
+        now = time.time()
+        recovered = 0
+        for name in sorted(os.listdir(claimed_dir)):
+            claimed_path = os.path.join(claimed_dir, name)
+            recovering_path = os.path.join(self.spool_dir, TMP, f"{name}.{uuid.uuid4().hex}")
+            try:
+                if now - os.stat(claimed_path).st_mtime < self.lease:
+                    continue
+                # un seul worker reprend le job : il est d'abord renommé hors de 'claimed'
+                os.rename(claimed_path, recovering_path)
+            except FileNotFoundError:
+                continue
+
+            with open(recovering_path, "r") as f:
+                job = json.load(f)
+            job["attempts"] = job.get("attempts", 0) + 1
+            if job["attempts"] >= self.max_attempts:
+                record = dict(job, status=FAILED, finished_at=now,
+                              error=f"abandoned {job['attempts']} time(s) (lease of {self.lease:g} s expired)")
+                _write_json(os.path.join(self.spool_dir, FAILED), f"{job['id']}.json", record, self.spool_dir)
+                self.log(f"job {job['id']} failed: {record['error']}")
+            else:
+                _write_json(os.path.join(self.spool_dir, PENDING), f"{job['id']}.json", job, self.spool_dir)
+                self.log(f"job {job['id']} recovered from {name}")
+            os.remove(recovering_path)
+            recovered += 1
+        return recovered
+
+    def _template(self, job):
+        content = _read_source(job["template"], job["template_sha256"], "template")
+        sha256 = job["template_sha256"]
+
+        partial = self.templates.get(sha256)
+        if partial is None or not partial.is_current():
+            # (le template est compilé de nouveau si l'un de ses partials a changé depuis le job précédent)
+            loader = TemplateLoader(self.parser, os.path.dirname(job["template"]))
+            partial = loader.load_source(job["template"], _decode(content))
+            self.templates[sha256] = partial
+        return partial
+
+    def _data(self, job):
+        content = _read_source(job["data"], job["data_sha256"], "data file")
+        sha256 = job["data_sha256"]
+
+        symbol_table = self.data.get(sha256)
+        if symbol_table is None:
+            if is_snapshot(content):
+                # fichier data précompilé (compile-data) : les valeurs sont décodées à la demande
+                symbol_table = load_snapshot(content)
+            else:
+                # les variables sont évaluées à la demande, puis gardées pour les jobs suivants
+                data = _decode(content)
+                symbol_table = load_lazy(data, name=job["data"])
+                if symbol_table is None:
+                    symbol_table = SymbolTable()
+                    parse_inline(data, symbol_table,
+                                 loader=TemplateLoader(self.parser, os.path.dirname(job["data"])), name=job["data"])
+            self.data[sha256] = symbol_table
+        return symbol_table
+
+    def process(self, job):
+        """
+        Renders a job and returns its timing record.
+
+        Parameters:
+        ----------
+        job : dict
+            The job, as written by submit_job().
+
+        Returns:
+        -------
+        dict
+            The job completed with the worker, the status ('done' or 'failed') and the timings (in seconds).
+        """
+        record = dict(job, worker=self.worker_id, claimed_at=time.time())
+        start = time.perf_counter()
+        try:
+            symbol_table = self._data(job)
+            partial = self._template(job)
+            load_time = time.perf_counter() - start
+
+            # chaque job a sa copie du scope global : ses assignations ne changent pas les autres jobs
+            output = partial.render(symbol_table.copy())
+            render_time = time.perf_counter() - start - load_time
+
+            os.makedirs(os.path.dirname(job["output"]), exist_ok=True)
+            temporary_path = f"{job['output']}.{self.worker_id}.tmp"
+            with open(temporary_path, "w") as f:
+                f.write(output)
+            os.replace(temporary_path, job["output"])
+        except Exception as e:
+            record.update(status=FAILED, error=f"{type(e).__name__}: {e}")
+        else:
+            record.update(status=DONE, load_seconds=load_time, render_seconds=render_time)
+        record.update(finished_at=time.time(), total_seconds=time.perf_counter() - start)
+        return record
+
+    def run(self, poll_interval=0.5, exit_when_empty=False):
+        """
+        Claims and renders jobs until stopped.
+
+        Parameters:
+        ----------
+        poll_interval : float
+            The time to wait when there is no pending job, in seconds.
+        exit_when_empty : bool
+            whether to return as soon as there is no pending job or not.
+
+        Returns:
+        -------
+        int
+            The number of processed jobs.
+        """
+        processed = 0
+        next_recovery = 0
+        while True:
+            if time.time() >= next_recovery:
+                # les jobs abandonnés par un worker arrêté sont remis dans 'pending'
+                self.recover()
+                next_recovery = time.time() + self.lease / 4
+
+            claimed = self.claim()
+            if claimed is None:
+                if exit_when_empty:
+                    return processed
+                time.sleep(poll_interval)
+                continue
+
+            job, claimed_path = claimed
+            record = self.process(job)
+            _write_json(os.path.join(self.spool_dir, record["status"]), f"{job['id']}.json", record, self.spool_dir)
+            try:
+                os.remove(claimed_path)
+            except FileNotFoundError:
+                # le bail a expiré pendant le rendu : un autre worker a repris le job
+                self.log(f"job {job['id']}: lease expired while rendering")
+            processed += 1
+
+            if record["status"] == FAILED:
+                self.log(f"job {job['id']} failed: {record['error']}")
@@ -7,6 +7,14 @@ LIST = "LIST"
 FOR_LIST = "FOR_LIST"
 REF = "REFERENCE"
 BOOL = "BOOLEAN"
+RANGE = "RANGE"  # range(a, b) paresseux, jamais converti en liste
+BUILTIN = "BUILTIN"  # appel d'une fonction native (len, join, sum, slice, range, field), évalué à l'exécution
+RECORD = "RECORD"  # enregistrement (champs nommés), valeur Record ou RecordRow
+CONDITION = "CONDITION"  # filtre d'une boucle ('where'), [opérande, opérateur, opérande] évalué à l'exécution
+
+# dispositions des champs partagées par tous les enregistrements qui ont les mêmes champs
+# key: tuple des noms des champs, value: dict nom du champ → index
+_layouts = {}
 
 
 class SymbolTable:
@@ -38,6 +46,8 @@ class SymbolTable:
                 Returns the first subscope (nested symbol table) of the current scope.
             remove_scope(scope: SymbolTable)
                 Removes a subscope (nested symbol table) from the current scope.
+            copy()
+                Returns a copy of the current scope, without its subscopes.
             __contains__(o: str)
                 Checks if a variable name exists in the symbol table or its parent scopes.
         """
@@ -120,6 +130,17 @@ class SymbolTable:
         """Removes a subscope (nested symbol table) from the current scope."""
         self._next.remove(scope)
 
+    def copy(self):
+        """
+        Returns a copy of the current scope, without its subscopes.
+
+        The variables are shared: an assignment replaces the Variable in the table, it never modifies it, so the
+        copy can be used to render a template without changing the original scope.
+        """
+        new_symbol_table = SymbolTable(self.parent)
+        new_symbol_table._table = dict(self._table)
+        return new_symbol_table
+
     def __contains__(self, o):
         if o in self._table.keys():
             return True
@@ -158,12 +179,15 @@ class Variable:
         the type of the variable.
     _value : Any
         the value of the variable.
+    _escaped : tuple, optional
+        (value, escaped string of the value) once the variable has been printed escaped, see dumbo_core.escaping.
     """
 
     def __init__(self, name, vtype, value):
         self._name = name
         self._vtype = vtype
         self._value = value
+        self._escaped = None
 
     def get_name(self):
         return self._name
@@ -190,69 +214,366 @@ class Variable:
 
 class Iterable(Variable):
     """
-    A class used to represent an iterable object, such as a list. Inherits from the Variable class.
+    A class used to represent a loop variable. Inherits from the Variable class.
+
+    The loop consumes its iterable through Python's iterator protocol: the elements are produced one at a time, so a
+    lazy iterable (a range for example) is never materialized.
 
     Specific Attributes:
     -------------------
     index : int
-        The current index of the iterable object.
+        The index of the current element.
+    source : Variable, optional
+        The list variable iterated by a loop variable (its escaped elements are cached on it).
+    _iterator : iterator
+        The iterator of the loop, None until start() is called.
+    _current : Any
+        The current element.
 
     Specific Methods:
     ----------------
-    increment_index()
-        Increment the current index by 1.
-    get_next_value()
-        Get the next value in the iterable based on the current index.
-    get_value(index=None)
-        Get the value at the specified index, or at the current index if none is provided.
+    start()
+        Starts the iteration on the first element.
+    advance()
+        Moves to the next element.
+    get_value()
+        Get the current element.
     """
 
-    EOL = "EOL"  # End Of List
+    EOL = object()  # End Of List
 
-    def __init__(self, name, vtype, value):
+    def __init__(self, name, vtype, value, source=None):
         super().__init__(name, vtype, value)
         self.index = 0
+        self.source = source
+        self._iterator = None
+        self._current = None
+
+    def start(self):
+        """
+        Starts the iteration on the first element.
+
+        Returns:
+        -------
+        bool
+            False if the iterable is empty, True otherwise.
+        """
+        self._iterator = iter(self._value)
+        self.index = 0
+        self._current = next(self._iterator, Iterable.EOL)
+        return self._current is not Iterable.EOL
 
-    def increment_index(self):
-        """Increment the current index by 1."""
+    def advance(self):
+        """
+        Moves to the next element.
+
+        Returns:
+        -------
+        bool
+            False if there is no element left, True otherwise.
+        """
+        self._current = next(self._iterator, Iterable.EOL)
+        if self._current is Iterable.EOL:
+            return False
         self.index += 1
+        return True
+
+    def get_value(self):
+        """Get the current element (None before the iteration starts)."""
+        return self._current
+
+    def __str__(self):
+        return str(self._current)
+
+    def __repr__(self):
+        return f"{{{self._name} := {self._current}, current index = {self.index}}}"
+
+
+class LazyVariable(Variable):
+    """
+    A class used to represent a variable whose value is computed the first time it is read (see
+    dumbo_core.lazy_data, dumbo_core.snapshot and dumbo_core.bindings). Inherits from the Variable class.
+
+    The subclasses implement _load(), which computes the type and the value and gives them to _set(). A variable
+    sent to another process is loaded first: only its result is sent.
+
+    Specific Attributes:
+    -------------------
+    _loaded : bool
+        whether the value has been computed or not.
+
+    Specific Methods:
+    ----------------
+    _load()
+        Computes the type and the value of the variable. (abstract)
+    _set(vtype, value)
+        Keeps the result of the loading.
+    _describe()
+        Returns how the variable is shown before its loading. (abstract)
+    """
+
+    def __init__(self, name, vtype=None):
+        super(LazyVariable, self).__init__(name, vtype, None)
+        self._loaded = False
+
+    def get_type(self):
+        if not self._loaded:
+            self._load()
+        return self._vtype
+
+    def get_value(self):
+        if not self._loaded:
+            self._load()
+        return self._value
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _set(self, vtype, value):
+        self._vtype = vtype
+        self._value = value
+        # le résultat est écrit avant le drapeau : un autre thread ne voit jamais une variable à moitié chargée
+        self._loaded = True
+
+    def _describe(self):
+        raise NotImplementedError
+
+    def __eq__(self, o):
+        self.get_value()
+        return super(LazyVariable, self).__eq__(o)
+
+    def __str__(self):
+        self.get_value()
+        return super(LazyVariable, self).__str__()
+
+    def __repr__(self):
+        if not self._loaded:
+            return f"{{{self._name} := {self._describe()}}}"
+        return super(LazyVariable, self).__repr__()
 
-    def get_next_value(self):
-        """Get the next value in the iterable based on the current index."""
-        try:
-            result = self.get_value(index=self.index + 1)
-        except IndexError:
-            result = Iterable.EOL
-        return result
+    def __reduce__(self):
+        return Variable, (self._name, self.get_type(), self.get_value())
 
-    def get_value(self, index=None):
+
+def record_layout(fields):
+    """
+    Returns the layout (field name → index) shared by all the records having these fields, in this order.
+
+    Parameters:
+    ----------
+    fields : iterable
+        The names of the fields.
+    """
+    fields = tuple(fields)
+    layout = _layouts.get(fields)
+    if layout is None:
+        if len(set(fields)) != len(fields):
+            raise NameError(f"duplicate field in record ({', '.join(fields)})")
+        layout = _layouts.setdefault(fields, {name: index for index, name in enumerate(fields)})
+    return layout
+
+
+def value_variable(value):
+    """Returns an anonymous variable holding a value stored in a record (its type follows the Python type)."""
+    if isinstance(value, str):
+        return Variable("__ANON__", STRING, value)
+    if isinstance(value, bool):
+        return Variable("__ANON__", BOOL, value)
+    if isinstance(value, int):
+        return Variable("__ANON__", INT, value)
+    if isinstance(value, float):
+        return Variable("__ANON__", FLOAT, value)
+    if isinstance(value, range):
+        return Variable("__ANON__", RANGE, value)
+    if isinstance(value, (Record, RecordRow)):
+        return Variable("__ANON__", RECORD, value)
+    return Variable("__ANON__", LIST, value)
+
+
+def _field_str(value):
+    # une liste de variables s'affiche comme un littéral de liste
+    if isinstance(value, list):
+        return "(" + ", ".join(str(item) for item in value) + ")"
+    return str(value)
+
+
+class Record:
+    """
+    A class used to represent a record: the values of named fields.
+
+    The values are kept in a tuple, without any Variable: the field names are only stored once, in a layout shared
+    by all the records having the same fields, so reading a field is a dictionary lookup and an index.
+
+    Attributes:
+    ----------
+    layout : dict
+        The field names as keys and their index in values as values (see record_layout()).
+    values : tuple
+        The values of the fields (str, int, list of Variable, Record or RecordList).
+
+    Methods:
+    -------
+    get_field(name)
+        Returns the value of a field.
+    """
+
+    __slots__ = ("layout", "values")
+
+    def __init__(self, layout, values):
+        self.layout = layout
+        self.values = tuple(values)
+
+    def get_field(self, name):
+        """Returns the value of a field (NameError if the record has no such field)."""
+        index = self.layout.get(name)
+        if index is None:
+            raise NameError(f"record has no field '{name}'")
+        return self.values[index]
+
+    def _fields(self):
+        return dict(zip(self.layout, self.values))
+
+    def __eq__(self, o):
+        if isinstance(o, (Record, RecordRow)):
+            return self._fields() == o._fields()
+        return NotImplemented
+
+    def __str__(self):
+        return "(" + ", ".join(f"{name}: {_field_str(value)}" for name, value in self._fields().items()) + ")"
+
+    def __repr__(self):
+        return f"Record{self}"
+
+
+class RecordList:
+    """
+    A class used to represent a list of records stored by column (struct of arrays).
+
+    All the records share one layout and each field is a single list holding the values of every record: a table
+    costs one reference per cell, not one Variable (nor one dictionary) per record. The records are only created,
+    as light RecordRow views, when they are read.
+
+    Attributes:
+    ----------
+    layout : dict
+        The field names as keys and the index of their column as values (see record_layout()).
+    columns : list
+        One list of values per field.
+
+    Methods:
+    -------
+    from_records(records)
+        Builds a RecordList from Record objects.
+    column(name)
+        Returns the values of a field for every record.
+    """
+
+    __slots__ = ("layout", "columns")
+
+    def __init__(self, layout, columns):
+        self.layout = layout
+        self.columns = columns
+
+    @staticmethod
+    def from_records(records):
         """
-        Get the value at the specified index, or at the current index if none is provided.
+        Builds a RecordList from Record objects.
 
-        Parameters
-        ----------
-        index : int, optional
-            The index of the value to get (default is None).
+        The fields are the union of the fields of the records: a field missing from a record is None in its column
+        (a Dumbo value is never None) and reading it raises NameError.
 
-        Raises
-        ------
-        IndexError
-            If the index is out of range.
+        Parameters:
+        ----------
+        records : list
+            The records, in order.
         """
-        if index:
-            if index < len(self._value):
-                return self._value[index]
-            else:
-                raise IndexError("list index out of range")
-
-        if self.index < len(self._value):
-            return self._value[self.index]
-        else:
-            raise IndexError("list index out of range")
+        if records and all(record.layout is records[0].layout for record in records):
+            # même disposition partout : les colonnes sont les valeurs transposées
+            layout = records[0].layout
+            return RecordList(layout, [list(column) for column in zip(*(record.values for record in records))])
+
+        fields = {}
+        for record in records:
+            fields.update(dict.fromkeys(record.layout))
+        layout = record_layout(fields)
+        columns = [[None] * len(records) for _ in layout]
+        for row, record in enumerate(records):
+            for name, value in zip(record.layout, record.values):
+                columns[layout[name]][row] = value
+        return RecordList(layout, columns)
+
+    def column(self, name):
+        """Returns the values of a field for every record (NameError if there is no such field)."""
+        index = self.layout.get(name)
+        if index is None:
+            raise NameError(f"record has no field '{name}'")
+        return self.columns[index]
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RecordList(self.layout, [column[index] for column in self.columns])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("record index out of range")
+        return Variable("__ANON__", RECORD, RecordRow(self, index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield Variable("__ANON__", RECORD, RecordRow(self, index))
+
+    def __str__(self):
+        return "(" + ", ".join(str(RecordRow(self, index)) for index in range(len(self))) + ")"
+
+    def __repr__(self):
+        return f"RecordList({', '.join(self.layout)}; {len(self)} records)"
+
+
+class RecordRow:
+    """
+    A class used to represent a record of a RecordList, as a view on its columns.
+
+    Attributes:
+    ----------
+    table : RecordList
+        The list of records.
+    index : int
+        The index of the record in the list.
+
+    Methods:
+    -------
+    get_field(name)
+        Returns the value of a field.
+    """
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def get_field(self, name):
+        """Returns the value of a field (NameError if the record has no such field)."""
+        value = self.table.column(name)[self.index]
+        if value is None:
+            raise NameError(f"record has no field '{name}'")
+        return value
+
+    def __eq__(self, o):
+        if isinstance(o, (Record, RecordRow)):
+            return self._fields() == o._fields()
+        return NotImplemented
+
+    def _fields(self):
+        # les champs absents de cet enregistrement sont None dans leur colonne
+        return {name: column[self.index] for name, column in zip(self.table.layout, self.table.columns)
+                if column[self.index] is not None}
 
     def __str__(self):
-        return "(" + ",".join(self._value) + ")"
+        return "(" + ", ".join(f"{name}: {_field_str(value)}" for name, value in self._fields().items()) + ")"
 
     def __repr__(self):
-        return f"{{{self._name} := {self._value[self.index]}, list size = {len(self._value)}, " \
-               f"list content = {self._value}, current index = {self.index}}}"
\ No newline at end of file
+        return f"RecordRow{self}"
@@ -0,0 +1,230 @@
+# encoding: utf-8
+import os
+import time
+
+from dumbo_core.dumbo_transformers import AExpression, SymbolTable, compile_template
+from dumbo_core.metrics import get_metrics
+
+# cache des partials partagé par tout le processus
+# key: chemin absolu du partial, value: (signature du fichier, Partial)
+_partial_cache = {}
+
+
+def file_signature(path):
+    """Returns what identifies a version of a file on disk: its modification time and its size."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class IncludeCycleError(Exception):
+    """
+    Exception raised when a template includes itself, directly or through other partials.
+
+    Attributes:
+    ----------
+    chain : tuple
+        The absolute paths of the templates forming the cycle, the first one being repeated at the end.
+    """
+
+    def __init__(self, chain):
+        self.chain = tuple(chain)
+        super(IncludeCycleError, self).__init__("include cycle detected: " + " -> ".join(self.chain))
+
+
+class Partial:
+    """
+    A class used to represent a compiled partial template, shared by every template including it.
+
+    The partial is lowered once into a CompiledTemplate when it is loaded, then only its compiled blocs are executed,
+    in the scope of each include: the names it reads are resolved at execution, in this scope.
+
+    Attributes:
+    ----------
+    path : str
+        The absolute path of the partial.
+    text : str
+        The content of the partial.
+    loader : TemplateLoader
+        The loader resolving the includes of the partial (relatively to its own directory).
+    includes : list
+        The absolute paths of the partials directly included by this one.
+    partials : list
+        The Partial objects directly included by this one, in the same order (the compiled code refers to them).
+
+    Methods:
+    -------
+    render(symbol_table, DEBUG=False, budget=None, autoescape=False, minify=False)
+        Renders the partial in the given scope.
+    is_current()
+        Checks if the partials included by this one, directly or not, are unchanged on disk.
+    """
+
+    def __init__(self, path, loader, text, compiled):
+        self.path = path
+        self.text = text
+        self.loader = loader
+        # key: minify, value: CompiledTemplate
+        self._compiled = {False: compiled}
+
+        # les includes sont lus dans le code compilé : le partial n'est parsé qu'une fois
+        self.partials = []
+        for part in compiled.parts:
+            if isinstance(part, str):
+                continue
+            for task in part.stack:
+                if task.get_type() == AExpression.INCLUDE and task.get_content() not in self.partials:
+                    self.partials.append(task.get_content())
+        self.includes = [included.path for included in self.partials]
+
+    def render(self, symbol_table, DEBUG=False, budget=None, autoescape=False, minify=False):
+        """
+        Renders the partial in the given scope.
+
+        Parameters:
+        ----------
+        symbol_table : SymbolTable
+            The scope in which the partial is rendered.
+        DEBUG : bool
+            whether to print debug information or not.
+        budget : RenderBudget, optional
+            The limits of the rendering including the partial.
+        autoescape : bool
+            whether to escape the printed values or not.
+        minify : bool
+            whether to collapse the whitespaces of the literal text or not.
+
+        Raises:
+        ------
+        BudgetExceededError
+            If the budget is exceeded.
+        """
+        compiled = self._compiled.get(minify)
+        if compiled is None:
+            compiled = self._compiled[minify] = compile_template(self.text, SymbolTable(), loader=self.loader,
+                                                                 name=self.path, minify=minify, _lenient=True)
+
+        # les blocs sont exécutés dans le scope de l'include : ses assignations sont vues par le template qui l'inclut
+        return "".join(part if isinstance(part, str)
+                       else part.execute(SymbolTable(symbol_table), DEBUG=DEBUG, budget=budget, autoescape=autoescape)
+                       for part in compiled.parts)
+
+    def is_current(self, _stack=None, _validated=None):
+        """
+        Checks if the partials included by this one, directly or not, are unchanged on disk (the compiled code refers
+        to them, so the partial must be loaded again otherwise).
+
+        The includes are loaded again against the include stack, so a partial edited to include one of the templates
+        including it raises IncludeCycleError even if the other ones are in the cache.
+
+        Raises:
+        ------
+        IncludeCycleError
+            If an included partial now includes this one, directly or not.
+        """
+        stack = (self.path,) if _stack is None else _stack
+        validated = set() if _validated is None else _validated
+        return all(self.loader.load(included.path, stack, validated) is included for included in self.partials)
+
+    def __repr__(self):
+        return f"Partial({self.path})"
+
+
+class TemplateLoader:
+    """
+    A class used to load and compile the partials included by a template.
+
+    Every partial is parsed only once per process: the compiled partials are kept in a cache shared by all the
+    loaders and invalidated when the file changes on disk. Include cycles are detected when the partials are loaded,
+    before anything is rendered. A parsing checks each partial on disk only once, however many times it is included.
+
+    Attributes:
+    ----------
+    parser : lark.Lark
+        The parser used to parse the partials.
+    directory : str
+        The directory against which the relative include paths are resolved.
+
+    Methods:
+    -------
+    load(name)
+        Returns the compiled partial corresponding to the given path.
+    load_source(path, text)
+        Returns the compiled partial of a template given by its content.
+    """
+
+    def __init__(self, parser, directory="."):
+        self.parser = parser
+        self.directory = directory
+        # chemins des templates en cours de chargement qui incluent ceux de ce loader (détection des cycles)
+        self._stack = ()
+
+    def load(self, name, _stack=None, _validated=None):
+        """
+        Returns the compiled partial corresponding to the given path, loading it (and its own includes) if needed.
+
+        Parameters:
+        ----------
+        name : str
+            The path of the partial, relative to the directory of the loader.
+
+        Raises:
+        ------
+        IncludeCycleError
+            If the partial includes itself, directly or not.
+        """
+        if _stack is None:
+            _stack = self._stack
+        if _validated is None:
+            _validated = set()
+        path = os.path.abspath(os.path.join(self.directory, name))
+        if path in _stack:
+            raise IncludeCycleError(_stack[_stack.index(path):] + (path,))
+
+        cached = _partial_cache.get(path)
+        if cached is not None and path in _validated:
+            # déjà vérifié (avec ses includes) pendant ce parsing
+            return cached[1]
+
+        metrics = get_metrics()
+        signature = file_signature(path)
+        if cached is not None and cached[0] == signature and cached[1].is_current(_stack + (path,), _validated):
+            if metrics is not None:
+                metrics.inc("dumbo_cache_hits_total", cache="partial")
+            _validated.add(path)
+            return cached[1]
+
+        start = time.perf_counter()
+        with open(path, "r") as f:
+            partial = self.load_source(path, f.read(), _stack, _validated)
+        if metrics is not None:
+            metrics.inc("dumbo_cache_misses_total", cache="partial")
+            metrics.observe("dumbo_stage_seconds", time.perf_counter() - start, stage="parse", template=path)
+
+        _partial_cache[path] = (signature, partial)
+        _validated.add(path)
+        return partial
+
+    def load_source(self, path, text, _stack=(), _validated=None):
+        """
+        Returns the compiled partial of a template given by its content, loading its includes (it isn't cached).
+
+        Parameters:
+        ----------
+        path : str
+            The absolute path of the template: its includes are resolved relatively to its directory.
+        text : str
+            The content of the template.
+
+        Raises:
+        ------
+        IncludeCycleError
+            If the template includes itself, directly or not.
+        """
+        loader = TemplateLoader(self.parser, os.path.dirname(path))
+        loader._stack = _stack + (path,)
+        # les noms sont lus à l'exécution : le partial est compilé avant de connaître le scope de ses includes
+        compiled = compile_template(text, SymbolTable(), loader=loader, name=path, _lenient=True,
+                                    _validated=_validated)
+        # une fois chargé, le partial n'est plus inclus que par lui-même
+        loader._stack = (path,)
+        return Partial(path, loader, text, compiled)
@@ -0,0 +1,403 @@
+# encoding: utf-8
+import os
+import struct
+import time
+
+from dumbo_core.dumbo_transformers import SymbolTable, compile_template, parse_inline
+from dumbo_core.intermediate_code_interpreter import AExpression
+from dumbo_core.lazy_data import load_lazy
+from dumbo_core.output import log_to_stderr
+from dumbo_core.template_loader import TemplateLoader, file_signature
+
+
+# événements inotify qui peuvent changer la signature d'un fichier ou le contenu d'un dossier
+_IN_MODIFY, _IN_ATTRIB, _IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+_IN_MOVED_FROM, _IN_MOVED_TO, _IN_CREATE, _IN_DELETE = 0x40, 0x80, 0x100, 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_EVENTS = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Notifier:
+    """
+    The changes of the files of watched directories, notified by the kernel (inotify, Linux only).
+
+    Raises OSError when inotify isn't available: the watcher then polls the signature of every file.
+    """
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self._fd = -1
+        library = ctypes.util.find_library("c")
+        if library is None:
+            raise OSError("inotify is not available")
+        self._libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._get_errno = ctypes.get_errno
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(self._get_errno(), "inotify_init1 failed")
+        # key: descripteur de la surveillance, value: chemin absolu du dossier
+        self._directories = {}
+        self._watched = set()
+
+    def watch(self, directory):
+        """Watches the files of a directory (FileNotFoundError if it doesn't exist, OSError if the limit of watches is
+        reached)."""
+        if directory in self._watched:
+            return
+        descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _IN_EVENTS)
+        if descriptor < 0:
+            raise OSError(self._get_errno(), f"can't watch {directory}")
+        self._directories[descriptor] = directory
+        self._watched.add(directory)
+
+    def changes(self):
+        """
+        Returns the absolute paths of the files and directories changed since the last call, or None if some events
+        were lost (every file must then be checked).
+        """
+        data = b""
+        while True:
+            try:
+                data += os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                return None
+            directory = self._directories.get(descriptor)
+            if directory is not None:
+                paths.add(os.path.join(directory, os.fsdecode(name)) if name else directory)
+        return paths
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __del__(self):
+        self.close()
+
+
+class Watcher:
+    """
+    A class used to keep the pages of a site rendered while their sources change.
+
+    The data file is evaluated once and the templates are compiled once: they stay in memory between two rebuilds.
+    Each page depends on its template, on the data file and on the partials it includes (directly or not), so a
+    change only re-renders the pages depending on the modified file. On Linux, the kernel notifies the changes of the
+    files (inotify), so a poll only checks the files which were touched. Otherwise the files are polled: only the
+    modification time and size of these dependencies are read. A directory is listed again only when its own
+    modification time changes (a page was added, removed or renamed). A re-rendered page is compiled once
+    (compile_template()), with the partials in the cache of the loader.
+
+    The pages are the '.dumbo' files of the template directory, except the ones starting with '_' (partials).
+
+    Attributes:
+    ----------
+    data_path : str
+        The path of the data file.
+    template_dir : str
+        The directory containing the templates of the pages.
+    output_dir : str
+        The directory where the pages are written.
+    extension : str
+        The extension of the rendered pages.
+    symbol_table : SymbolTable
+        The global symbol table filled by the data file.
+    pages : dict
+        key: absolute path of a page template, value: set of the absolute paths of the partials it depends on.
+    dependents : dict
+        key: absolute path of a partial, value: set of the absolute paths of the pages depending on it.
+    signatures : dict
+        key: absolute path of a watched file, value: its signature when it was last rendered.
+    directories : dict
+        key: absolute path of a directory of templates, value: (its signature when it was last listed, set of the
+        absolute paths of its pages, set of the absolute paths of its subdirectories).
+
+    Methods:
+    -------
+    build()
+        Renders every page.
+    poll()
+        Re-renders the pages whose sources changed since the last call.
+    run(interval)
+        Renders every page, then polls the sources forever.
+    """
+
+    def __init__(self, parser, data_path, template_dir, output_dir, extension=".html", log=log_to_stderr,
+                 notify=True):
+        self.parser = parser
+        self.data_path = os.path.abspath(data_path)
+        self.template_dir = os.path.abspath(template_dir)
+        self.output_dir = output_dir
+        self.extension = extension
+        self.log = log
+
+        self.loader = TemplateLoader(parser, self.template_dir)
+        self.symbol_table = None
+        self.pages = {}
+        self.dependents = {}
+        self.signatures = {}
+        self.directories = {}
+
+        self._notifier = None
+        if notify:
+            try:
+                self._notifier = _Notifier()
+            except OSError:
+                pass
+
+    def _scan(self, directory):
+        """
+        Lists a directory of templates and its subdirectories not listed yet, recording their signatures and pages.
+        The subdirectories which disappeared are forgotten.
+        """
+        # le dossier est surveillé avant d'être listé : un fichier créé entre les deux est signalé
+        self._notify(directory)
+        try:
+            signature = file_signature(directory)
+            entries = list(os.scandir(directory))
+        except OSError:
+            self._forget(directory)
+            return
+        pages = set()
+        subdirectories = set()
+        for entry in entries:
+            if entry.is_dir():
+                subdirectories.add(entry.path)
+            elif entry.name.endswith(".dumbo") and not entry.name.startswith("_"):
+                pages.add(entry.path)
+
+        previous = self.directories.get(directory)
+        self.directories[directory] = (signature, pages, subdirectories)
+        if previous is not None:
+            for subdirectory in previous[2] - subdirectories:
+                self._forget(subdirectory)
+        for subdirectory in subdirectories:
+            if subdirectory not in self.directories:
+                self._scan(subdirectory)
+
+    def _notify(self, directory):
+        """Asks the system to notify the changes of a directory (if the notifications are used)."""
+        if self._notifier is not None:
+            try:
+                self._notifier.watch(directory)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # trop de dossiers surveillés : on revient à la vérification de chaque fichier
+                self._notifier.close()
+                self._notifier = None
+
+    def _forget(self, directory):
+        """Forgets a directory which was removed, and its subdirectories."""
+        listed = self.directories.pop(directory, None)
+        if listed is not None:
+            for subdirectory in listed[2]:
+                self._forget(subdirectory)
+
+    def _scan_pages(self, directories=None):
+        """
+        Returns the absolute paths of the page templates currently in the template directory, or None if no
+        directory changed since the last call.
+
+        Parameters:
+        ----------
+        directories : iterable, optional
+            The directories which may have changed (every listed directory by default).
+        """
+        if not self.directories:
+            self._scan(self.template_dir)
+        else:
+            changed = False
+            for directory in list(self.directories if directories is None else directories):
+                # le dossier a pu être oublié avec son parent pendant la boucle
+                listed = self.directories.get(directory)
+                if listed is None:
+                    continue
+                try:
+                    signature = file_signature(directory)
+                except OSError:
+                    signature = None
+                if signature != listed[0]:
+                    self._scan(directory)
+                    changed = True
+            if not changed:
+                return None
+        return set().union(*(pages for _, pages, _ in self.directories.values()))
+
+    def _watch(self, path):
+        """Records the current signature of a file (None if it doesn't exist)."""
+        if path not in self.signatures:
+            self._notify(os.path.dirname(path))
+        try:
+            self.signatures[path] = file_signature(path)
+        except OSError:
+            self.signatures[path] = None
+
+    def _load_data(self):
+        self._watch(self.data_path)
+        with open(self.data_path, "r") as f:
+            data = f.read()
+        symbol_table = load_lazy(data, name=self.data_path)
+        if symbol_table is None:
+            symbol_table = SymbolTable()
+            parse_inline(data, symbol_table, loader=self.loader)
+        self.symbol_table = symbol_table
+
+    def _dependencies(self, template):
+        """Returns the absolute paths of all the partials included by a compiled template, directly or not."""
+        to_visit = [task.get_content() for part in template.parts if not isinstance(part, str)
+                    for task in part.stack if task.get_type() == AExpression.INCLUDE]
+        dependencies = set()
+        while to_visit:
+            partial = to_visit.pop()
+            if partial.path not in dependencies:
+                dependencies.add(partial.path)
+                to_visit += partial.partials
+        return dependencies
+
+    def _set_dependencies(self, page, dependencies):
+        for dependency in self.pages.get(page, ()):
+            self.dependents[dependency].discard(page)
+        self.pages[page] = dependencies
+        for dependency in dependencies:
+            self.dependents.setdefault(dependency, set()).add(page)
+            if dependency not in self.signatures:
+                self._watch(dependency)
+
+    def _render(self, page):
+        """Compiles a page, renders it and writes it in the output directory."""
+        self._watch(page)
+        try:
+            with open(page, "r") as f:
+                text = f.read()
+            # les includes d'une page sont relatifs à son dossier
+            loader = TemplateLoader(self.parser, os.path.dirname(page))
+            template = compile_template(text, self.symbol_table, loader=loader, name=page)
+            self._set_dependencies(page, self._dependencies(template))
+
+            # le rendu travaille sur sa propre copie du scope global : ses assignations ne changent pas les autres pages
+            output = template.render(self.symbol_table)
+        except Exception as e:
+            # on garde la page dans le graphe pour la réessayer dès que ses sources changent
+            self.pages.setdefault(page, set())
+            self.log(f"error: {os.path.relpath(page, self.template_dir)}: {e}")
+            return False
+
+        output_path = os.path.join(self.output_dir, os.path.splitext(os.path.relpath(page, self.template_dir))[0]
+                                   + self.extension)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "w") as f:
+            f.write(output)
+        return True
+
+    def build(self):
+        """
+        Evaluates the data file and renders every page.
+
+        Returns:
+        -------
+        list
+            The absolute paths of the rendered pages.
+        """
+        start = time.perf_counter()
+        self._load_data()
+        self.directories = {}
+        pages = sorted(self._scan_pages())
+        for page in pages:
+            self._render(page)
+        self.log(f"built {len(pages)} page(s) in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return pages
+
+    def poll(self):
+        """
+        Re-renders the pages whose template, data file or included partials changed since the last call.
+
+        Returns:
+        -------
+        list
+            The absolute paths of the re-rendered pages.
+        """
+        start = time.perf_counter()
+        touched = self._notifier.changes() if self._notifier is not None else None
+        if touched is None:
+            # pas de notification (ou des événements perdus) : chaque fichier et chaque dossier est vérifié
+            candidates = self.signatures
+            directories = None
+        else:
+            candidates = [path for path in touched if path in self.signatures]
+            directories = {os.path.dirname(path) for path in touched} | touched
+
+        changed = set()
+        for path in candidates:
+            try:
+                current = file_signature(path)
+            except OSError:
+                current = None
+            if current != self.signatures[path]:
+                changed.add(path)
+
+        new_pages = set()
+        current_pages = self._scan_pages(directories)
+        if current_pages is not None:
+            for page in set(self.pages) - current_pages:
+                # la page a été supprimée
+                self._set_dependencies(page, set())
+                del self.pages[page]
+                self.signatures.pop(page, None)
+                changed.discard(page)
+            new_pages = current_pages - set(self.pages)
+
+        if not changed and not new_pages:
+            return []
+
+        scan_time = time.perf_counter() - start
+        start = time.perf_counter()
+        if self.data_path in changed:
+            try:
+                self._load_data()
+            except Exception as e:
+                self.log(f"error: {os.path.basename(self.data_path)}: {e}")
+                return []
+            pages = set(self.pages)
+        else:
+            pages = {page for page in changed if page in self.pages}
+            for path in changed:
+                pages |= self.dependents.get(path, set())
+        pages = sorted(pages | new_pages)
+
+        for path in changed:
+            self._watch(path)
+        for page in pages:
+            self._render(page)
+
+        self.log(f"rebuilt {len(pages)} page(s) in {(time.perf_counter() - start) * 1000:.1f} ms "
+                 f"(scan: {scan_time * 1000:.1f} ms)")
+        return pages
+
+    def run(self, interval=0.2):
+        """
+        Renders every page, then polls the sources forever.
+
+        Parameters:
+        ----------
+        interval : float
+            The time between two polls, in seconds.
+        """
+        self.build()
+        while True:
+            time.sleep(interval)
+            self.poll()
@@ -0,0 +1,68 @@
+import pytest
+
+from dumbo import get_parser, load_data, main
+from dumbo_core.batch import BatchPlan, ColumnPiece, render_batch, write_batch
+from dumbo_core.intermediate_code_interpreter import IntermediateCodeInterpreter
+from dumbo_core.template_loader import TemplateLoader
+
+DATA = "{{ site := 'Mon <site>'; langues := ('fr', 'en'); sep := ' '; ville := ' ?'; }}"
+COLUMNS = {
+    "nom": ["Ada", "Al<an>", "Grace"],
+    "age": [36, 41, 85],
+    "p": [{"ville": "Namur", "pays": {"code": "BE"}}, {"ville": "Liège"}, "Lille"],
+    "tags": [["a", "b"], [], ["c"]],
+}
+TEMPLATES = [
+    "<h1>{{ print site; }}</h1><p>{{ print nom.' ('.age.') '.p.ville; }}</p>\n",
+    "<p>{{ print nom; for l in langues do print sep.l; endfor; }}</p>{{ print escape nom; print raw site; }}",
+    "{{ x := nom.'!'; }}<b>{{ print x; print age; }}</b>{{ for t in tags where t != 'b' do print t; endfor; "
+    "print join(tags, ','); }}",
+    "{{ n := age + 1; print n; }} {{ print n.sep.len(langues); }}",
+    "texte seul",
+]
+
+
+@pytest.mark.parametrize("template", TEMPLATES)
+@pytest.mark.parametrize("autoescape", [False, True])
+def test_render_batch(template, autoescape):
+    # même sortie qu'un rendu par enregistrement
+    shared = load_data(DATA, None)
+    expected = []
+    for index in range(3):
+        data = {name: shared.get(name) for name in shared.get_localScope()}
+        data.update({name: column[index] for name, column in COLUMNS.items()})
+        expected.append(main(data, template, autoescape=autoescape))
+    assert list(render_batch(template, COLUMNS, symbol_table=shared, autoescape=autoescape, chunk_size=2)) == expected
+
+
+def test_batch_plan_segments(tmp_path):
+    plan = BatchPlan(TEMPLATES[0], COLUMNS, symbol_table=load_data(DATA, None))
+    # le texte et les valeurs constantes sont fusionnés, les colonnes sont évaluées par colonne
+    assert plan.segments[0] == "<h1>Mon <site></h1><p>"
+    assert [type(segment) for segment in plan.segments] == [str, ColumnPiece, str, ColumnPiece, str, ColumnPiece,
+                                                            str]
+
+    # un partial peut assigner des variables : la suite est exécutée enregistrement par enregistrement
+    (tmp_path / "nom.dumbo").write_text("{{ nom := 'Anonyme'; }}")
+    loader = TemplateLoader(get_parser(), str(tmp_path))
+    plan = BatchPlan("{{ print nom; include 'nom.dumbo'; }}<p>{{ print nom; }}</p>", COLUMNS, loader=loader)
+    assert [type(segment) for segment in plan.segments] == [IntermediateCodeInterpreter, str,
+                                                            IntermediateCodeInterpreter, str]
+    assert list(plan.render(COLUMNS)) == ["Ada<p>Anonyme</p>", "Al<an><p>Anonyme</p>", "Grace<p>Anonyme</p>"]
+
+
+def test_render_batch_errors():
+    with pytest.raises(ValueError):
+        render_batch("{{ print a; }}", {"a": [1, 2], "b": [1]})
+    with pytest.raises(NameError):
+        BatchPlan("{{ print a; }}", {"a": [1]}).render({"b": [1]})
+    assert list(render_batch("{{ print a; }}", {"a": []})) == []
+
+
+def test_write_batch(tmp_path):
+    paths = [tmp_path / f"page{index}.html" for index in range(3)]
+    assert write_batch("<p>{{ print nom; }}</p>", COLUMNS, paths) == 3
+    assert [path.read_text(encoding="utf-8") for path in paths] == ["<p>Ada</p>", "<p>Al<an></p>", "<p>Grace</p>"]
+
+    with pytest.raises(ValueError):
+        write_batch("<p>{{ print nom; }}</p>", COLUMNS, paths[:2])
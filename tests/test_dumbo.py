@@ -1,5 +1,12 @@
 import pytest
-from dumbo import main
+import io
+import subprocess
+import sys
+
+from dumbo import main, main_mapped
+from dumbo_core.intermediate_code_interpreter import BudgetExceededError, RenderBudget
+from dumbo_core.template_loader import IncludeCycleError, TemplateLoader
+from lark import Lark
 
 
 def test_valide():
@@ -21,6 +28,556 @@ def test_output_generation(data_file, template_file, output):
         out = f.read()
     assert main(data, template) == out
 
+
+def test_include_partial(tmp_path):
+    (tmp_path / "row.dumbo").write_text("<li>{{ print nom; }}</li>")
+    data = "{{ noms := ('a', 'b'); }}"
+    template = "<ul>{{ for nom in noms do include 'row.dumbo'; endfor; }}</ul>"
+    assert main(data, template, template_dir=str(tmp_path)) == "<ul><li>a</li><li>b</li></ul>"
+
+
+def test_include_partial_compiled_once(tmp_path):
+    (tmp_path / "header.dumbo").write_text("<h1>{{ print titre; }}</h1>")
+    (tmp_path / "page.dumbo").write_text("{{ include 'header.dumbo'; include 'header.dumbo'; }}")
+    parser = Lark.open("../dumbo_core/dumbo.lark", parser='lalr', rel_to=__file__)
+    loader = TemplateLoader(parser, str(tmp_path))
+    page = loader.load("page.dumbo")
+    assert loader.load("page.dumbo") is page
+    assert page.loader.load("header.dumbo") is loader.load("header.dumbo")
+
+    # le partial est compilé au chargement, puis seuls ses blocs compilés sont exécutés
+    (tmp_path / "row.dumbo").write_text("<li>{{ print nom; n := n + 1; }}</li>")
+    template = "<ul>{{ for nom in noms do include 'row.dumbo'; endfor; print n; }}</ul>"
+    data = "{{ noms := ('a', 'b'); n := 0; }}"
+    assert main(data, template, template_dir=str(tmp_path)) == "<ul><li>a</li><li>b</li>2</ul>"
+    row = loader.load("row.dumbo")
+    compiled = row._compiled[False]
+    assert main(data, template, template_dir=str(tmp_path)) == "<ul><li>a</li><li>b</li>2</ul>"
+    assert row._compiled[False] is compiled
+
+
+def test_include_partial_loaded_without_scope(tmp_path):
+    # le partial est compilé sans connaître le scope de ses includes : les noms sont lus à l'exécution
+    (tmp_path / "user.dumbo").write_text("{{ print user.nom; print ' '; print titre; }}")
+    parser = Lark.open("../dumbo_core/dumbo.lark", parser='lalr', rel_to=__file__)
+    partial = TemplateLoader(parser, str(tmp_path)).load("user.dumbo")
+    assert not hasattr(partial, "tree")
+    assert main("{{ user := (nom: 'a'); titre := 't'; }}", "{{ include 'user.dumbo'; }}",
+                template_dir=str(tmp_path)) == "a t"
+    with pytest.raises(NameError):
+        main("{{ }}", "{{ include 'user.dumbo'; }}", template_dir=str(tmp_path))
+
+
+def test_include_cycle(tmp_path):
+    (tmp_path / "a.dumbo").write_text("{{ include 'b.dumbo'; }}")
+    (tmp_path / "b.dumbo").write_text("{{ include 'a.dumbo'; }}")
+    with pytest.raises(IncludeCycleError):
+        main("{{ }}", "{{ include 'a.dumbo'; }}", template_dir=str(tmp_path))
+
+
+def test_include_cycle_through_cached_partial(tmp_path):
+    (tmp_path / "a.dumbo").write_text("a{{ include 'b.dumbo'; }}")
+    (tmp_path / "b.dumbo").write_text("b")
+    assert main("{{ }}", "{{ include 'a.dumbo'; }}", template_dir=str(tmp_path)) == "ab"
+
+    # a.dumbo est en cache, mais b.dumbo l'inclut maintenant
+    (tmp_path / "b.dumbo").write_text("b{{ include 'a.dumbo'; }}")
+    with pytest.raises(IncludeCycleError):
+        main("{{ }}", "{{ include 'a.dumbo'; }}", template_dir=str(tmp_path))
+
+    (tmp_path / "b.dumbo").write_text("B")
+    assert main("{{ }}", "{{ include 'a.dumbo'; }}", template_dir=str(tmp_path)) == "aB"
+
+
+@pytest.mark.parametrize("i", range(1, 4))
+def test_parallel_output_identical(i):
+    with open(f"tests/examples/data_t{i}.dumbo", "r") as f:
+        data = f.read()
+    with open(f"tests/examples/template{i}.dumbo", "r") as f:
+        template = f.read()
+    assert main(data, template, jobs=2) == main(data, template)
+
+
+def test_parallel_blocs_see_previous_writes():
+    data = "{{ l := ('a', 'b'); }}"
+    template = "{{ t := 'A'; }}{{ for x in l do print t.x; endfor; }}-" \
+               "{{ t := 'B'; }}{{ for x in l do print t.x; endfor; }}"
+    assert main(data, template, jobs=2) == main(data, template) == "AaAb-BaBb"
+
+
+def test_parallel_large_template():
+    # le template n'est pas transformé en arbre : pas de limite de récursion sur le nombre de morceaux
+    data = "{{ t := 'x'; l := ('a', 'b'); }}"
+    template = "<p>{{ print t; }}</p>" * 400 + "{{ for x in l do print x; endfor; }}" + "<p>{{ print t; }}</p>" * 400
+    assert main(data, template, jobs=2) == main(data, template) == "<p>x</p>" * 400 + "ab" + "<p>x</p>" * 400
+
+
+def _read(path):
+    with open(path, "r") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("template", [
+    "  x", "\n\t x}", "{{ print 'a'; }}\n x \n", "a\n{{ print 'b'; }}\n\nc\n", "x }} y",
+    "{{ print 'a}}'; }} {{ print 'b'; }}", "",
+] + [_read(f"tests/examples/template{i}.dumbo") for i in range(1, 4)])
+def test_mapped_output_identical(tmp_path, template):
+    data = "{{ label := 'l'; liste_label := ('a', 'b'); nom := 'n'; listephoto := ('p', 'q'); }}"
+    template_path = tmp_path / "template.dumbo"
+    template_path.write_text(template)
+    sink = io.BytesIO()
+    main_mapped(data, str(template_path), sink)
+    assert sink.getvalue().decode() == main(data, template)
+
+
+def test_import_is_light():
+    # importer dumbo ne charge ni lark, ni dumbo_core, ni multiprocessing
+    code = "import sys, dumbo; print(' '.join(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    modules = result.stdout.split()
+    assert "dumbo" in modules
+    assert not [name for name in modules if name.split(".")[0] in ("lark", "dumbo_core")]
+    assert "concurrent.futures.process" not in modules
+
+
+def _imported_modules(importtime):
+    return [line.split("|")[-1].strip() for line in importtime.splitlines()
+            if line.startswith("import time:") and "self [us]" not in line]
+
+
+@pytest.mark.parametrize("data_file, template_file, exit_code", [
+    ("missing.dumbo", "missing.dumbo", 3),
+    ("missing.dumbo", "tests/examples/template1.dumbo", 2),
+    ("tests/examples/data_t1.dumbo", "missing.dumbo", 1),
+])
+def test_cli_error_path_startup(data_file, template_file, exit_code):
+    # un fichier manquant est signalé sans importer les modules du rendu
+    result = subprocess.run([sys.executable, "-X", "importtime", "dumbo.py", data_file, template_file],
+                            capture_output=True, text=True)
+    assert result.returncode == exit_code
+
+    modules = _imported_modules(result.stderr)
+    assert not [name for name in modules if name.split(".")[0] in ("lark", "dumbo_core")]
+    assert "concurrent.futures.process" not in modules
+
+    # budget : au plus 40 modules de plus que l'interpréteur seul (un rendu en importe plus d'une centaine)
+    startup = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+    assert len(modules) - len(_imported_modules(startup.stderr)) <= 40
+
+
+@pytest.mark.parametrize("i", range(1, 4))
+def test_inline_lowering_matches_tree(i):
+    import dumbo_core.dumbo_transformers as dt
+    from dumbo import get_parser
+
+    with open(f"tests/examples/data_t{i}.dumbo", "r") as f:
+        data = f.read()
+    with open(f"tests/examples/template{i}.dumbo", "r") as f:
+        template = f.read()
+
+    tree_symbol_table = dt.SymbolTable()
+    dt.DumboBlocTransformer(tree_symbol_table, dt.IntermediateCodeInterpreter()).transform(get_parser().parse(data))
+    tree_output = dt.DumboTemplateTransformer(tree_symbol_table).transform(get_parser().parse(template))
+
+    inline_symbol_table = dt.SymbolTable()
+    dt.parse_inline(data, inline_symbol_table)
+    assert dt.parse_inline(template, inline_symbol_table) == tree_output
+    assert not inline_symbol_table._next
+
+
+def test_inline_lowering_large_template():
+    # trop profond pour un Transformer sur l'arbre (récursion), pas pour le parsing LALR
+    template = "<p>{{ print t; }}</p>\n" * 2000
+    assert main("{{ t := 'x'; }}", template) == "<p>x</p>\n" * 2000
+
+
+BIG_LIST_DATA = "{{ l := (" + ", ".join(f"'{i}'" for i in range(400)) + "); }}"
+BIG_LOOP_TEMPLATE = "{{ for x in l do print x; print ' '; print x; endfor; }}"
+
+
+@pytest.mark.parametrize("limit, value", [
+    ("max_instructions", 1000), ("max_loop_iterations", 100), ("max_output_size", 500), ("timeout", 0),
+])
+def test_render_budget_exceeded(limit, value):
+    with pytest.raises(BudgetExceededError) as e:
+        main(BIG_LIST_DATA, BIG_LOOP_TEMPLATE, budget=RenderBudget(**{limit: value}))
+    assert e.value.limit == limit
+
+
+def test_render_budget_not_hit():
+    budget = RenderBudget(max_instructions=10 ** 6, max_loop_iterations=10 ** 6, max_output_size=10 ** 6, timeout=60)
+    assert main(BIG_LIST_DATA, BIG_LOOP_TEMPLATE, budget=budget) == main(BIG_LIST_DATA, BIG_LOOP_TEMPLATE)
+    assert budget.loop_iterations == 399
+
+
+@pytest.mark.parametrize("limit, value", [("max_loop_iterations", 600), ("max_output_size", 3000)])
+def test_render_budget_shared_by_parallel_blocs(limit, value):
+    # chaque bloc tient dans la limite, pas le rendu entier : la limite s'applique au rendu
+    template = BIG_LOOP_TEMPLATE * 2
+    assert main(BIG_LIST_DATA, BIG_LOOP_TEMPLATE, jobs=2, budget=RenderBudget(**{limit: value}))
+    with pytest.raises(BudgetExceededError) as e:
+        main(BIG_LIST_DATA, template, jobs=2, budget=RenderBudget(**{limit: value}))
+    assert e.value.limit == limit
+
+    budget = RenderBudget(max_loop_iterations=10 ** 6)
+    main(BIG_LIST_DATA, template, jobs=2, budget=budget)
+    assert budget.loop_iterations == 2 * 399
+
+
+def test_render_budget_cli(tmp_path):
+    (tmp_path / "data.dumbo").write_text(BIG_LIST_DATA)
+    (tmp_path / "template.dumbo").write_text(BIG_LOOP_TEMPLATE)
+    result = subprocess.run([sys.executable, "dumbo.py", str(tmp_path / "data.dumbo"), str(tmp_path / "template.dumbo"),
+                             "--max-loop-iterations", "10"], capture_output=True, text=True)
+    assert result.returncode == 4
+    assert "max_loop_iterations" in result.stderr
+
+
+ESCAPE_DATA = "{{ t := '<b>'; xs := ('<a>', 'b&c', 'd\"'); }}"
+
+
+def test_print_escape():
+    template = "{{ print t; print escape t; for x in xs do print escape x.'|'; endfor; }}"
+    assert main(ESCAPE_DATA, template) == "<b>&lt;b&gt;&lt;a&gt;|b&amp;c|d&quot;|"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_autoescape(jobs):
+    template = "{{ print raw t; for x in xs do print x; endfor; }}"
+    assert main(ESCAPE_DATA, template, jobs=jobs, autoescape=True) == "<b>&lt;a&gt;b&amp;cd&quot;"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_escape_raw_not_reserved(jobs):
+    # 'escape' et 'raw' ne sont des mots-clés que devant la valeur affichée
+    data = "{{ raw := '<r>'; escape := '<e>'; }}"
+    template = "{{ print raw; print escape; print raw escape; print escape raw; print raw.escape; print escape'<'; " \
+               "for raw in xs do print raw; endfor; }}"
+    assert main(ESCAPE_DATA[:-2] + data[2:], template, jobs=jobs) == "<r><e><e>&lt;r&gt;<r><e>&lt;<a>b&cd\""
+
+
+def test_escaped_list_cached():
+    from dumbo import load_data
+    from dumbo_core.dumbo_transformers import parse_inline
+
+    symbol_table = load_data(ESCAPE_DATA, None)
+    for _ in range(2):
+        assert parse_inline("{{ for x in xs do print x; endfor; }}", symbol_table.copy(), autoescape=True) \
+               == "&lt;a&gt;b&amp;cd&quot;"
+    items, escaped = symbol_table.get("xs")._escaped
+    assert items is symbol_table.get("xs").get_value()
+    assert escaped == ["&lt;a&gt;", "b&amp;c", "d&quot;"]
+
+
+BUILTINS_DATA = "{{ xs := ('a', 'b', 'c', 'd'); ns := (1, 2, 3); sep := ', '; }}"
+
+
+@pytest.mark.parametrize("template, output", [
+    ("{{ print join(xs, ', '); }}", "a, b, c, d"),
+    ("{{ print join(xs[1:3], sep.'|'); }}", "b, |c"),
+    ("{{ print len(xs).' '.sum(ns); }}", "4 6"),
+    ("{{ n := len(xs) - 2; print join(xs[n:], ''); }}", "cd"),
+    ("{{ ys := xs[:2]; for y in ys do print y; endfor; for x in xs[3:] do print x; endfor; }}", "abd"),
+    ("{{ n := sum((4, 5)) + len(xs); print n; }}", "13"),
+])
+def test_list_builtins(template, output):
+    assert main(BUILTINS_DATA, template) == output
+    assert main(BUILTINS_DATA, template, jobs=2) == output
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_builtin_names_not_reserved(jobs):
+    # 'len', 'join', 'sum' ne sont des mots-clés que devant '(' et 'include' que devant une chaîne
+    template = "{{ len := 2; join := 'j'; sum := 's'; include := 'i'; n := len + len(xs); " \
+               "print n.join.sum.include; print join(xs, sum); for len in ns do print len; endfor; }}"
+    assert main(BUILTINS_DATA, template, jobs=jobs) == "6jsiasbscsd123"
+
+
+@pytest.mark.parametrize("template, limit", [
+    ("{{ n := sum(ns); }}", "max_instructions"),
+    ("{{ s := join(xs, ','); }}", "max_instructions"),
+    ("{{ s := join(xs, ','); }}", "max_output_size"),
+])
+def test_builtins_charge_budget(template, limit):
+    data = "{{ xs := (" + ", ".join(f"'{i}'" for i in range(3000)) + "); " \
+           "ns := (" + ", ".join(str(i) for i in range(3000)) + "); }}"
+    with pytest.raises(BudgetExceededError) as error:
+        main(data, template, budget=RenderBudget(**{limit: 2000}))
+    assert error.value.limit == limit
+
+
+def test_sum_of_strings():
+    with pytest.raises(TypeError):
+        main(BUILTINS_DATA, "{{ print sum(xs); }}")
+
+
+@pytest.mark.parametrize("template, output", [
+    ("{{ for x in xs[:2] do for n in ns do print x.n; endfor; endfor; }}", "a1a2a3b1b2b3"),
+    ("{{ for x in xs[4:] do print x; endfor; print 'fin'; }}", "fin"),
+    ("{{ for i in range(2, 5) do print i; endfor; for i in range(5, 2) do print i; endfor; }}", "234"),
+    ("{{ n := len(xs); r := range(0, n); print join(r[1:], ',').' '.sum(range(0, 101)); }}", "1,2,3 5050"),
+])
+def test_loops(template, output):
+    assert main(BUILTINS_DATA, template) == output
+    assert main(BUILTINS_DATA, template, jobs=2) == output
+
+
+@pytest.mark.parametrize("template, limit, value", [
+    ("{{ s := join(range(0, 5000000), ','); }}", "max_output_size", 100),
+    ("{{ r := range(0, 5000000); s := join(r[10:], ''); }}", "max_output_size", 1000),
+    ("{{ s := join(range(0, 5000000), ''); }}", "timeout", 0.05),
+    ("{{ s := join(range(0, 5000000), ''); }}", "max_instructions", 10000),
+    ("{{ r := range(0, 5000000); for i in r[1:] do n := i; endfor; }}", "max_loop_iterations", 1000),
+    ("{{ l := (" + ", ".join(f"'{i}'" for i in range(3000)) + "); m := l[1:]; }}", "max_instructions", 2000),
+])
+def test_range_bounded_by_budget(template, limit, value):
+    with pytest.raises(BudgetExceededError) as error:
+        main("{{ }}", template, budget=RenderBudget(**{limit: value}))
+    assert error.value.limit == limit
+
+
+def test_range_sum_and_name():
+    # la somme d'un range est calculée sans le parcourir
+    template = "{{ n := sum(range(0, 30000000)); print n; range := 'r'; print ' '.range; }}"
+    assert main("{{ }}", template, budget=RenderBudget(timeout=5)) == f"{sum(range(30000000))} r"
+
+
+def test_range_constant_memory():
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        main("{{ }}", "{{ for i in range(0, 100000) do n := i; endfor; }}")
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # une liste de 100000 variables occuperait plusieurs Mo
+    assert peak < 100000
+
+
+LAZY_DATA = "{{ a := 2; b := a * 3; a := 5; c := a; l := ('p', 'q', 'r'); n := len(l) + b; }} " \
+            "texte {{ a := a + 1; k := l[1:]; j := join(k, '-'); z := ';}}'; }}"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_lazy_data(jobs):
+    from dumbo import load_data
+    from dumbo_core.lazy_data import DeferredVariable
+
+    template = "{{ print a.' '.b.' '.c.' '.n.' '.j.' '.z; for x in k do print x; endfor; }}"
+    assert main(LAZY_DATA, template, jobs=jobs) == "6 6 6 9 q-r ;}}qr"
+
+    symbol_table = load_data(LAZY_DATA, None)
+    assert isinstance(symbol_table.get("b"), DeferredVariable)
+    assert main(LAZY_DATA, template) == main(LAZY_DATA, template, jobs=jobs)
+
+
+def test_lazy_data_evaluated_on_demand():
+    from dumbo import load_data
+    from dumbo_core.dumbo_transformers import parse_inline
+
+    symbol_table = load_data(LAZY_DATA, None)
+    assert parse_inline("{{ print n; }}", symbol_table.copy()) == "9"
+    # n lit l et b, qui lit la première assignation de a ; le reste du fichier n'est pas évalué
+    evaluated = {name for name in ("a", "b", "c", "l", "n", "k", "j", "z") if symbol_table.get(name)._loaded}
+    assert evaluated == {"b", "l", "n"}
+    first_a = symbol_table.get("a").previous.previous
+    assert first_a._loaded and first_a.get_value() == 2
+
+
+def test_lazy_data_fallback():
+    from dumbo import load_data
+    from dumbo_core.lazy_data import DeferredVariable
+
+    # une boucle dans le fichier data : il est exécuté en entier
+    symbol_table = load_data("{{ y := 'a'; for x in ('a', 'b') do y := 'b'; endfor; }}", None)
+    assert not isinstance(symbol_table.get("y"), DeferredVariable) and symbol_table.get("y").get_value() == "b"
+    with pytest.raises(NameError):
+        main("{{ a := 1; b := nope; }}", "{{ print b; }}")
+
+
+@pytest.mark.parametrize("data", [
+    "{{ a := 1; b := ; }}",
+    # même forme qu'une assignation valide, à la valeur près : seule la première est parsée
+    "{{ a := 12; b := 1; c := 012; }}",
+    "{{ a := 'x'; b := 'y\n'; }}",
+])
+def test_lazy_data_syntax_checked(data):
+    from lark.exceptions import UnexpectedInput
+
+    # une assignation invalide est refusée au chargement, même si elle n'est jamais lue (comme sans évaluation à
+    # la demande)
+    with pytest.raises(UnexpectedInput):
+        main(data, "{{ print a; }}")
+
+
+RECORDS_DATA = "{{ r := (nom: 'Ada', age: 36, langages: ('fr', 'en'), adresse: (ville: 'Londres')); " \
+               "gens := ((nom: 'Ada', age: 36), (nom: 'Alan', age: 41)); sep := ' '; }}"
+
+
+@pytest.mark.parametrize("template, output", [
+    ("{{ print r.nom.' '.r.age.' '.r.adresse.ville; }}", "Ada 36 Londres"),
+    ("{{ for p in gens do n := p.age + 1; print p.nom.':'.n.sep; endfor; }}", "Ada:37 Alan:42 "),
+    ("{{ for l in r.langages do print l; endfor; print len(gens).sep.len(r.langages).sep.sum((1, 2)); }}", "fren2 2 3"),
+    ("{{ a := r.adresse; print a.ville; for p in gens[1:] do print p.nom.sep; endfor; }}", "LondresAlan "),
+    # r.nom est une chaîne : le nom restant est concaténé
+    ("{{ print r.nom.sep; print sep.sep.'x'; }}", "Ada   x"),
+])
+def test_records(template, output):
+    assert main(RECORDS_DATA, template) == output
+    assert main(RECORDS_DATA, template, jobs=2) == output
+
+
+def test_record_errors():
+    with pytest.raises(NameError):
+        main(RECORDS_DATA, "{{ print r.prenom; }}")
+    with pytest.raises(NameError):
+        main("{{ r := (a: 1, a: 2); }}", "{{ print r.a; }}")
+    with pytest.raises(NameError):
+        main("{{ rs := ((a: 1), (b: 2)); }}", "{{ for x in rs do print x.a; endfor; }}")
+
+
+def test_record_list_columns():
+    from dumbo import load_data
+    from dumbo_core.symbol_table import RecordList
+
+    symbol_table = load_data("{{ rs := ((a: 1, b: 'x'), (a: 2, b: 'y'), (b: 'z')); s := (b: 'w', a: 3); }}", None)
+    records = symbol_table.get("rs").get_value()
+    # une liste par champ, pas une variable par enregistrement
+    assert isinstance(records, RecordList) and records.columns == [[1, 2, None], ["x", "y", "z"]]
+    assert str(records) == "((a: 1, b: x), (a: 2, b: y), (b: z))"
+    assert len(records[1:]) == 2 and records[0].get_value().get_field("b") == "x"
+    # les enregistrements qui ont les mêmes champs partagent leur disposition
+    other = load_data("{{ t := (a: 5, b: 'v'); }}", None).get("t").get_value()
+    assert other.layout is records.layout and symbol_table.get("s").get_value().layout is not records.layout
+
+
+@pytest.mark.parametrize("template, output", [
+    ("{{ for p in gens where p.age > 40 or p.nom = 'Ada' do print p.nom.sep; endfor; }}", "Ada Alan "),
+    ("{{ for p in gens where p.age < 40 limit 5 do print p.nom; endfor; }}", "Ada"),
+    ("{{ for l in r.langages where l != 'fr' do print l; endfor; for p in gens limit 0 do print p.nom; endfor; }}",
+     "en"),
+    # la condition lit une autre variable : filtre évalué par l'interpréteur
+    ("{{ n := 37; for p in gens where p.age < n and 1 = 1 do print p.nom; endfor; }}", "Ada"),
+    ("{{ n := 2; for i in range(0, 10) where i * 2 > 9 limit n do print i; endfor; }}", "56"),
+    ("{{ for i in (3, 1, 4, 1, 5) where i >= 3 and i != 4 do print i; endfor; }}", "35"),
+])
+def test_loop_where_limit(template, output):
+    assert main(RECORDS_DATA, template) == output
+    assert main(RECORDS_DATA, template, jobs=2) == output
+    # avec un budget, chaque élément est testé par l'interpréteur
+    assert main(RECORDS_DATA, template, budget=RenderBudget(max_instructions=10 ** 6)) == output
+
+
+def test_loop_where_limit_stops_early():
+    template = "{{ for i in range(0, 1000000000000) where i > 9 limit 3 do print i.' '; endfor; }}"
+    assert main("{{ }}", template) == "10 11 12 "
+    # un budget compte les éléments filtrés comme des instructions
+    with pytest.raises(BudgetExceededError):
+        main("{{ }}", "{{ for i in range(0, 1000000) where i < 0 do print i; endfor; }}",
+             budget=RenderBudget(max_instructions=5000))
+    with pytest.raises(ValueError):
+        main("{{ n := 0 - 1; }}", "{{ for i in range(0, 5) limit n do print i; endfor; }}")
+
+
+SNAPSHOT_DATA = RECORDS_DATA + "{{ ns := (1, 2, 3); noms := ('a', 'b\x00c'); n := len(ns) * 2; m := n; " \
+                               "g := range(0, 4); }}"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_data_snapshot(jobs):
+    from dumbo_core.snapshot import compile_data
+
+    template = "{{ print r.nom.sep.n.sep.m.sep.sum(ns).sep.len(noms); for p in gens where p.age > 40 do " \
+               "print ' '.p.nom; endfor; for l in r.langages do print sep.l; endfor; for i in g limit 2 do print i; " \
+               "endfor; }}"
+    snapshot = compile_data(SNAPSHOT_DATA)
+    assert main(snapshot, template, jobs=jobs) == main(SNAPSHOT_DATA, template) == "Ada 6 6 6 2 Alan fr en01"
+
+
+def test_data_snapshot_decoded_on_demand():
+    from dumbo import load_data
+    from dumbo_core.dumbo_transformers import parse_inline
+    from dumbo_core.snapshot import SnapshotError, compile_data, load_snapshot
+
+    snapshot = compile_data(SNAPSHOT_DATA)
+    symbol_table = load_data(snapshot, None)
+    assert parse_inline("{{ print n; }}", symbol_table.copy()) == "6"
+    decoded = {name for name in symbol_table.get_localScope() if symbol_table.get(name)._encoded is None}
+    assert decoded == {"n"}
+    assert [item.get_value() for item in symbol_table.get("noms").get_value()] == ["a", "b\x00c"]
+
+    with pytest.raises(SnapshotError):
+        load_snapshot(snapshot[:8] + b"\x63\x00" + snapshot[10:])
+
+
+def test_data_snapshot_little_endian():
+    import struct
+    from dumbo import load_data
+    from dumbo_core.snapshot import compile_data
+
+    # les entiers d'une liste sont écrits en petit-boutiste, quelle que soit la machine
+    snapshot = compile_data("{{ l := (1, 2, 300); }}")
+    assert struct.pack("<3q", 1, 2, 300) in snapshot
+    assert [item.get_value() for item in load_data(snapshot, None).get("l").get_value()] == [1, 2, 300]
+
+
+def test_cli_compile_data(tmp_path):
+    (tmp_path / "data.dumbo").write_text(SNAPSHOT_DATA)
+    (tmp_path / "template.dumbo").write_text("<p>{{ for p in gens do print p.nom.sep; endfor; print n; }}</p>")
+    subprocess.run([sys.executable, "dumbo.py", "compile-data", str(tmp_path / "data.dumbo"), "-o",
+                    str(tmp_path / "data.dumbo.bin")], check=True)
+
+    outputs = [subprocess.run([sys.executable, "dumbo.py", str(tmp_path / data_file), str(tmp_path / "template.dumbo")],
+                              capture_output=True, text=True, check=True).stdout
+               for data_file in ("data.dumbo", "data.dumbo.bin")]
+    assert outputs[0] == outputs[1] == "<p>Ada Alan 6</p>\n"
+
+
+BOUND_DATA = {
+    "titre": "Liste", "n": 3, "noms": ["a", "b", "c"], "r": range(0, 3), "sep": " ",
+    "p": {"nom": "Ada", "langages": ("fr", "en"), "adresse": {"ville": "Namur"}},
+    "gens": [{"nom": "Ada", "age": 36}, {"nom": "Alan", "age": 41}, {"nom": "Grace", "age": 85}],
+}
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_bind_data(jobs):
+    template = "{{ print titre.sep.n.sep.len(noms).sep.sum(r).sep.join(noms, '-').' '.p.adresse.ville; " \
+               "for l in p.langages do print sep.l; endfor; for g in gens where g.age > 40 limit 1 do " \
+               "print ' '.g.nom; endfor; for s in noms[1:] do print s; endfor; }}"
+    source = "{{ titre := 'Liste'; n := 3; noms := ('a', 'b', 'c'); r := range(0, 3); sep := ' '; " \
+             "p := (nom: 'Ada', langages: ('fr', 'en'), adresse: (ville: 'Namur')); " \
+             "gens := ((nom: 'Ada', age: 36), (nom: 'Alan', age: 41), (nom: 'Grace', age: 85)); }}"
+    assert main(BOUND_DATA, template, jobs=jobs) == main(source, template) == "Liste 3 3 3 a-b-c Namur fr en Alanbc"
+
+
+def test_bind_data_converted_on_demand():
+    from dumbo import load_data
+    from dumbo_core.bindings import BoundVariable, ValueList, bind_data
+    from dumbo_core.dumbo_transformers import parse_inline
+    from dumbo_core.symbol_table import LIST, RecordList
+
+    noms = ["a", "b"]
+    symbol_table = load_data({"noms": noms, "gens": BOUND_DATA["gens"], "n": 1}, None)
+    assert parse_inline("{{ print n; }}", symbol_table.copy()) == "1"
+    converted = {name for name in symbol_table.get_localScope() if symbol_table.get(name)._loaded}
+    assert converted == {"n"}
+
+    # la liste Python n'est pas copiée, une liste d'enregistrements est rangée par colonne
+    assert symbol_table.get("noms").get_type() == LIST and symbol_table.get("noms").get_value().values is noms
+    assert isinstance(symbol_table.get("noms").get_value(), ValueList)
+    assert symbol_table.get("gens").get_value().column("age") == [36, 41, 85]
+    assert isinstance(symbol_table.get("gens").get_value(), RecordList)
+
+    with pytest.raises(TypeError):
+        bind_data({"v": None}).get("v").get_value()
+    with pytest.raises(TypeError):
+        bind_data({1: "a"})
+    assert isinstance(bind_data({"v": object()}).get("v"), BoundVariable)
+    assert parse_inline("{{ print x; }}", bind_data({"x": 1.5})) == "1.5"
+
+
 # TODO : Faire le reste des tests
 
 # Vous pouvez ajouter des fonctions de test supplémentaires si nécessaire :
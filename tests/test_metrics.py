@@ -0,0 +1,90 @@
+import json
+
+import pytest
+from dumbo import main
+from dumbo_core.metrics import MetricsRegistry, disable_metrics, enable_metrics, get_metrics
+
+
+@pytest.fixture
+def metrics():
+    registry = enable_metrics()
+    yield registry
+    disable_metrics()
+
+
+def test_metrics_disabled_by_default():
+    assert get_metrics() is None
+
+
+def test_metrics_render(metrics):
+    output = main("{{ l := ('a', 'b'); }}", "<p>{{ for x in l do print x; endfor; }}</p>", template_name="page")
+    snapshot = metrics.snapshot()
+
+    counters = {(name, tuple(sorted(sample["labels"].items()))): sample["value"]
+                for name, samples in snapshot["counters"].items() for sample in samples}
+    assert counters[("dumbo_renders_total", (("template", "page"),))] == 1
+    assert counters[("dumbo_output_bytes_total", (("template", "page"),))] == len(output)
+    # FOR, 2 x PRINT, 2 x ENDFOR
+    assert counters[("dumbo_instructions_total", (("template", "page"),))] == 5
+
+    stages = {sample["labels"]["stage"] for sample in snapshot["histograms"]["dumbo_stage_seconds"]
+              if sample["labels"]["template"] == "page"}
+    assert stages == {"parse_lower", "execute"}
+
+
+def test_metrics_keep_native_filter(metrics, monkeypatch):
+    import dumbo_core.intermediate_code_interpreter as ici
+
+    calls = []
+    native_filter = ici._native_filter
+    monkeypatch.setattr(ici, "_native_filter", lambda *args: calls.append(args) or native_filter(*args))
+
+    output = main("{{ l := (1, 5, 2, 7); }}", "{{ for x in l where x > 3 do print x; endfor; }}", template_name="where")
+    assert output == "57"
+    # le budget qui compte les instructions n'empêche pas le filtre natif
+    assert len(calls) == 1
+    counters = {(name, tuple(sorted(sample["labels"].items()))): sample["value"]
+                for name, samples in metrics.snapshot()["counters"].items() for sample in samples}
+    # FOR, 2 x PRINT, 2 x ENDFOR : les éléments écartés par le filtre ne sont pas comptés
+    assert counters[("dumbo_instructions_total", (("template", "where"),))] == 5
+
+
+def test_metrics_prometheus_format():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.inc("dumbo_cache_hits_total", cache="partial")
+    registry.observe("dumbo_stage_seconds", 0.5, stage="execute", template="a")
+    lines = [line for line in registry.to_prometheus().splitlines() if not line.startswith("# HELP")]
+    assert lines == [
+        "# TYPE dumbo_cache_hits_total counter",
+        'dumbo_cache_hits_total{cache="partial"} 1',
+        "# TYPE dumbo_stage_seconds histogram",
+        'dumbo_stage_seconds_bucket{stage="execute",template="a",le="0.1"} 0',
+        'dumbo_stage_seconds_bucket{stage="execute",template="a",le="1.0"} 1',
+        'dumbo_stage_seconds_bucket{stage="execute",template="a",le="+Inf"} 1',
+        'dumbo_stage_seconds_sum{stage="execute",template="a"} 0.5',
+        'dumbo_stage_seconds_count{stage="execute",template="a"} 1',
+    ]
+
+
+def test_metrics_write(tmp_path, metrics):
+    main("{{ }}", "x")
+    metrics.write(str(tmp_path / "metrics.json"))
+    metrics.write(str(tmp_path / "metrics.prom"))
+    assert "dumbo_renders_total" in json.loads((tmp_path / "metrics.json").read_text())["counters"]
+    assert "# TYPE dumbo_renders_total counter" in (tmp_path / "metrics.prom").read_text()
+
+
+def test_metrics_partial_checked_once_per_render(metrics, tmp_path):
+    # une chaîne de 30 partials, incluse 400 fois
+    for i in range(29):
+        (tmp_path / f"p{i}.dumbo").write_text(f"{{{{ include 'p{i + 1}.dumbo'; }}}}")
+    (tmp_path / "p29.dumbo").write_text("x")
+    template = "{{ " + "include 'p0.dumbo'; " * 400 + "}}"
+    assert main("{{ }}", template, template_dir=str(tmp_path)) == "x" * 400
+    assert main("{{ }}", template, template_dir=str(tmp_path)) == "x" * 400
+
+    counters = {(name, tuple(sorted(sample["labels"].items()))): sample["value"]
+                for name, samples in metrics.snapshot()["counters"].items() for sample in samples}
+    assert counters[("dumbo_cache_misses_total", (("cache", "partial"),))] == 30
+    # au second rendu, chaque partial n'est vérifié qu'une fois
+    assert counters[("dumbo_cache_hits_total", (("cache", "partial"),))] == 30
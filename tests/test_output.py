@@ -0,0 +1,65 @@
+import gzip
+import io
+import subprocess
+import sys
+import zlib
+
+import pytest
+
+from dumbo import main, main_mapped
+from dumbo_core.output import CompressedSink, WhitespaceMinifier
+
+DATA = "{{ t := 'Titre'; l := ('a', 'b'); }}"
+TEMPLATE = "<html>\n   <body>\n\n  <h1>{{ print t; }}</h1>   <ul>\n {{ for x in l do include 'row.dumbo'; endfor; }}" \
+           "</ul>\n<pre>\n  a   b\n</pre>  <p>  fin\t</p>\n</body>\n</html>\n"
+MINIFIED = "<html>\n<body>\n<h1>Titre</h1> <ul>\n<li> a </li><li> b </li></ul>\n<pre>\n  a   b\n</pre> <p> fin </p>\n" \
+           "</body>\n</html>\n"
+
+
+def test_minifier_keeps_raw_elements():
+    minifier = WhitespaceMinifier()
+    # un élément <script> peut commencer dans un segment et finir dans un autre
+    assert minifier.minify("<p>  a \n\n b</p>  <SCRIPT>\n  x  = 1;") == "<p> a\nb</p> <SCRIPT>\n  x  = 1;"
+    assert minifier.raw_element == "script"
+    assert minifier.minify("  y;\n</script>   <pre> </pre>  ") == "  y;\n</script> <pre> </pre> "
+
+
+def test_minify(tmp_path):
+    (tmp_path / "row.dumbo").write_text("<li>  {{ print x; }}  </li>")
+    (tmp_path / "template.dumbo").write_text(TEMPLATE)
+
+    assert main(DATA, TEMPLATE, template_dir=str(tmp_path), minify=True) == MINIFIED
+    assert main(DATA, TEMPLATE, template_dir=str(tmp_path), jobs=2, minify=True) == MINIFIED
+    sink = io.BytesIO()
+    main_mapped(DATA, str(tmp_path / "template.dumbo"), sink, minify=True)
+    assert sink.getvalue().decode() == MINIFIED
+
+
+def test_streamed_output(tmp_path):
+    (tmp_path / "row.dumbo").write_text("<li>{{ print x; }}</li>")
+    sink = io.BytesIO()
+    assert main(DATA, TEMPLATE, template_dir=str(tmp_path), sink=sink) == ""
+    assert sink.getvalue().decode() == main(DATA, TEMPLATE, template_dir=str(tmp_path))
+
+
+@pytest.mark.parametrize("compression, decompress", [("gzip", gzip.decompress), ("zlib", zlib.decompress)])
+def test_compressed_sink(compression, decompress):
+    chunks = [f"<li>{i}</li>".encode() for i in range(10000)]
+    buffer = io.BytesIO()
+    with CompressedSink(buffer, compression) as sink:
+        for chunk in chunks:
+            sink.write(chunk)
+    assert decompress(buffer.getvalue()) == b"".join(chunks)
+    assert sink.bytes_in == len(b"".join(chunks)) and sink.bytes_out == len(buffer.getvalue())
+
+
+@pytest.mark.parametrize("options", [["--gzip"], ["--gzip", "--mmap"], ["--gzip", "--minify", "-v"]])
+def test_cli_gzip(tmp_path, options):
+    (tmp_path / "data.dumbo").write_text(DATA)
+    (tmp_path / "template.dumbo").write_text(TEMPLATE.replace("include 'row.dumbo';", "print x;"))
+    command = [sys.executable, "dumbo.py", str(tmp_path / "data.dumbo"), str(tmp_path / "template.dumbo")]
+
+    plain = subprocess.run(command + [o for o in options if o != "--gzip"], capture_output=True, check=True)
+    compressed = subprocess.run(command + options, capture_output=True, check=True)
+    # les messages de -v restent sur la sortie d'erreur
+    assert gzip.decompress(compressed.stdout) == plain.stdout.replace(b"\r\n", b"\n").split(b"#\n\n")[-1]
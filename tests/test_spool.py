@@ -0,0 +1,131 @@
+import json
+import os
+import subprocess
+import sys
+
+from dumbo import get_parser, main
+from dumbo_core.snapshot import compile_data
+from dumbo_core.spool import SpoolWorker, submit_job
+
+DUMBO = os.path.join(os.path.dirname(__file__), "..", "dumbo.py")
+
+
+def make_jobs(tmp_path, count):
+    (tmp_path / "data.dumbo").write_text("{{ noms := ('a', 'b', 'c'); }}")
+    (tmp_path / "page.dumbo").write_text("<p>{{ for n in noms do print n; endfor; }}</p>")
+    spool = tmp_path / "spool"
+    jobs = [submit_job(str(spool), str(tmp_path / "page.dumbo"), str(tmp_path / "data.dumbo"),
+                       str(tmp_path / "out" / f"page{i}.html"))
+            for i in range(count)]
+    return spool, jobs
+
+
+def test_worker_renders_jobs_with_warm_cache(tmp_path):
+    spool, jobs = make_jobs(tmp_path, 3)
+    worker = SpoolWorker(str(spool), get_parser(), worker_id="w1", log=lambda message: None)
+    assert worker.run(exit_when_empty=True) == 3
+
+    for i, job in enumerate(jobs):
+        assert (tmp_path / "out" / f"page{i}.html").read_text() == "<p>abc</p>"
+        record = json.loads((spool / "done" / f"{job['id']}.json").read_text())
+        assert record["status"] == "done" and record["worker"] == "w1"
+        assert record["render_seconds"] >= 0
+    assert len(worker.templates) == 1 and len(worker.data) == 1
+    assert os.listdir(spool / "pending") == [] and os.listdir(spool / "claimed") == []
+
+
+def test_worker_refuses_changed_sources(tmp_path):
+    spool, jobs = make_jobs(tmp_path, 1)
+    (tmp_path / "page.dumbo").write_text("modifié")
+    worker = SpoolWorker(str(spool), get_parser(), log=lambda message: None)
+    worker.run(exit_when_empty=True)
+
+    record = json.loads((spool / "failed" / f"{jobs[0]['id']}.json").read_text())
+    assert "changed since the job was submitted" in record["error"]
+    assert not (tmp_path / "out" / "page0.html").exists()
+
+
+def test_worker_reads_crlf_and_snapshot_sources(tmp_path):
+    # les empreintes sont celles des octets du fichier, fins de ligne comprises
+    (tmp_path / "data.dumbo").write_bytes(b"{{\r\n noms := ('a', 'b');\r\n}}\r\n")
+    (tmp_path / "page.dumbo").write_bytes(b"<p>\r\n{{ for n in noms do print n; endfor; }}</p>\r\n")
+    (tmp_path / "data.dumbo.bin").write_bytes(compile_data("{{ noms := ('c', 'd'); }}"))
+    spool = tmp_path / "spool"
+    submit_job(str(spool), str(tmp_path / "page.dumbo"), str(tmp_path / "data.dumbo"), str(tmp_path / "crlf.html"))
+    submit_job(str(spool), str(tmp_path / "page.dumbo"), str(tmp_path / "data.dumbo.bin"), str(tmp_path / "bin.html"))
+
+    worker = SpoolWorker(str(spool), get_parser(), log=lambda message: None)
+    assert worker.run(exit_when_empty=True) == 2
+    assert os.listdir(spool / "failed") == []
+    with open(tmp_path / "data.dumbo", "r") as f, open(tmp_path / "page.dumbo", "r") as g:
+        assert (tmp_path / "crlf.html").read_text() == main(f.read(), g.read()) == "<p>\nab</p>\n"
+    assert (tmp_path / "bin.html").read_text() == "<p>\ncd</p>\n"
+
+
+def test_worker_reloads_changed_partials(tmp_path):
+    (tmp_path / "data.dumbo").write_text("{{ nom := 'a'; }}")
+    (tmp_path / "page.dumbo").write_text("<p>{{ include 'nom.dumbo'; }}</p>")
+    (tmp_path / "nom.dumbo").write_text("{{ print nom; }}")
+    spool = tmp_path / "spool"
+    worker = SpoolWorker(str(spool), get_parser(), log=lambda message: None)
+    submit_job(str(spool), str(tmp_path / "page.dumbo"), str(tmp_path / "data.dumbo"), str(tmp_path / "1.html"))
+    assert worker.run(exit_when_empty=True) == 1
+
+    # le template n'a pas changé, le partial qu'il inclut si
+    (tmp_path / "nom.dumbo").write_text("{{ print nom.nom; }}")
+    submit_job(str(spool), str(tmp_path / "page.dumbo"), str(tmp_path / "data.dumbo"), str(tmp_path / "2.html"))
+    assert worker.run(exit_when_empty=True) == 1
+    assert (tmp_path / "1.html").read_text() == "<p>a</p>"
+    assert (tmp_path / "2.html").read_text() == "<p>aa</p>"
+
+
+def test_worker_recovers_abandoned_jobs(tmp_path):
+    spool, jobs = make_jobs(tmp_path, 2)
+    crashed = SpoolWorker(str(spool), get_parser(), worker_id="crashed", log=lambda message: None)
+    claimed = [crashed.claim()[1], crashed.claim()[1]]
+
+    # le bail du premier job n'a pas expiré
+    past = os.stat(claimed[1]).st_mtime - 600
+    os.utime(claimed[1], (past, past))
+    worker = SpoolWorker(str(spool), get_parser(), worker_id="w1", log=lambda message: None, lease=60)
+    assert worker.run(exit_when_empty=True) == 1
+    assert json.loads((spool / "done" / f"{jobs[1]['id']}.json").read_text())["attempts"] == 1
+    assert os.listdir(spool / "claimed") == [os.path.basename(claimed[0])]
+
+    # un job abandonné trop souvent échoue
+    os.utime(claimed[0], (past, past))
+    worker = SpoolWorker(str(spool), get_parser(), log=lambda message: None, lease=60, max_attempts=1)
+    assert worker.run(exit_when_empty=True) == 0
+    record = json.loads((spool / "failed" / f"{jobs[0]['id']}.json").read_text())
+    assert "abandoned 1 time(s)" in record["error"]
+    assert os.listdir(spool / "claimed") == []
+
+
+def test_claim_starts_the_lease(tmp_path, monkeypatch):
+    spool, jobs = make_jobs(tmp_path, 2)
+    # un job soumis depuis longtemps n'est pas repris dès qu'il est réclamé
+    for job in jobs:
+        os.utime(spool / "pending" / f"{job['id']}.json", (0, 0))
+    worker = SpoolWorker(str(spool), get_parser(), log=lambda message: None)
+    claimed_path = worker.claim()[1]
+    assert SpoolWorker(str(spool), get_parser(), log=lambda message: None, lease=60).recover() == 0
+    assert os.path.exists(claimed_path)
+
+    # le job réclamé disparaît avant d'être lu (repris par un autre worker) : il est ignoré
+    rename = os.rename
+    monkeypatch.setattr(os, "rename", lambda source, destination: rename(source, destination) or os.remove(destination))
+    assert worker.claim() is None
+
+
+def test_several_worker_processes(tmp_path):
+    spool, jobs = make_jobs(tmp_path, 40)
+    workers = [subprocess.Popen([sys.executable, DUMBO, "worker", str(spool), "--id", f"w{i}", "--exit-when-empty"])
+               for i in range(3)]
+    for worker in workers:
+        assert worker.wait(timeout=120) == 0
+
+    # chaque job est rendu exactement une fois
+    assert sorted(os.listdir(spool / "done")) == sorted(f"{job['id']}.json" for job in jobs)
+    assert os.listdir(spool / "failed") == [] and os.listdir(spool / "claimed") == []
+    for i in range(40):
+        assert (tmp_path / "out" / f"page{i}.html").read_text() == "<p>abc</p>"
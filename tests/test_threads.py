@@ -0,0 +1,58 @@
+import sys
+import threading
+
+from dumbo import get_parser, load_data
+from dumbo_core.dumbo_transformers import compile_template
+from dumbo_core.intermediate_code_interpreter import RenderBudget
+from dumbo_core.template_loader import TemplateLoader
+
+DATA = "{{ titre := '<Liste>'; lignes := (" + ", ".join(f"'l{i}'" for i in range(20)) + "); }}"
+TEMPLATE = "<h1>{{ print escape titre; }}</h1>{{ compte := len(lignes); titre := 'fin'; }}" \
+           "<ul>{{ for l in lignes do for m in lignes[:3] do include 'row.dumbo'; endfor; endfor; }}</ul>" \
+           "{{ print titre.' '.compte; }}"
+
+
+def test_compiled_template_is_not_modified(tmp_path):
+    (tmp_path / "row.dumbo").write_text("<li>{{ print l.m; }}</li>")
+    symbol_table = load_data(DATA, None)
+    template = compile_template(TEMPLATE, symbol_table, loader=TemplateLoader(get_parser(), str(tmp_path)))
+
+    first = template.render(symbol_table)
+    assert first.startswith("<h1>&lt;Liste&gt;</h1><ul><li>l0l0</li>") and first.endswith("</ul>fin 20")
+    assert template.render(symbol_table) == first
+    # les assignations du rendu restent dans son contexte
+    assert symbol_table.get("titre").get_value() == "<Liste>" and "compte" not in symbol_table
+
+
+def test_render_from_32_threads(tmp_path):
+    (tmp_path / "row.dumbo").write_text("<li>{{ print l.m; }}</li>")
+    symbol_table = load_data(DATA, None)
+    template = compile_template(TEMPLATE, symbol_table, loader=TemplateLoader(get_parser(), str(tmp_path)))
+    expected = template.render(symbol_table)
+
+    results = []
+    errors = []
+    barrier = threading.Barrier(32)
+
+    def render():
+        try:
+            barrier.wait()
+            for _ in range(3):
+                results.append(template.render(symbol_table, budget=RenderBudget(max_loop_iterations=10 ** 6)))
+        except Exception as e:
+            errors.append(e)
+
+    # changements de thread très fréquents pour provoquer les entrelacements
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        threads = [threading.Thread(target=render) for _ in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert not errors
+    assert len(results) == 96 and all(result == expected for result in results)
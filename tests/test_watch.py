@@ -0,0 +1,78 @@
+import shutil
+
+import pytest
+
+from dumbo import get_parser
+from dumbo_core.watch import Watcher
+
+
+@pytest.fixture(params=[True, False], ids=["notified", "polled"])
+def notify(request):
+    return request.param
+
+
+def make_site(tmp_path, notify=True):
+    (tmp_path / "data.dumbo").write_text("{{ titre := 'Site'; }}")
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    (templates / "_header.dumbo").write_text("<h1>{{ print titre; }}</h1>")
+    (templates / "index.dumbo").write_text("{{ include '_header.dumbo'; }}index")
+    (templates / "about.dumbo").write_text("about")
+    watcher = Watcher(get_parser(), str(tmp_path / "data.dumbo"), str(templates), str(tmp_path / "out"),
+                      log=lambda message: None, notify=notify)
+    watcher.build()
+    return watcher, templates, tmp_path / "out"
+
+
+def test_watch_build(tmp_path, notify):
+    watcher, templates, out = make_site(tmp_path, notify)
+    assert (out / "index.html").read_text() == "<h1>Site</h1>index"
+    assert (out / "about.html").read_text() == "about"
+    assert not (out / "_header.html").exists()
+    assert watcher.poll() == []
+
+
+def test_watch_rebuilds_only_dependent_pages(tmp_path, notify):
+    watcher, templates, out = make_site(tmp_path, notify)
+    (templates / "_header.dumbo").write_text("<h2>{{ print titre; }}</h2>")
+    assert watcher.poll() == [str(templates / "index.dumbo")]
+    assert (out / "index.html").read_text() == "<h2>Site</h2>index"
+
+    (templates / "about.dumbo").write_text("about us")
+    assert watcher.poll() == [str(templates / "about.dumbo")]
+    assert (out / "about.html").read_text() == "about us"
+
+
+def test_watch_data_change_and_new_page(tmp_path, notify):
+    watcher, templates, out = make_site(tmp_path, notify)
+    (tmp_path / "data.dumbo").write_text("{{ titre := 'Nouveau'; }}")
+    assert len(watcher.poll()) == 2
+    assert (out / "index.html").read_text() == "<h1>Nouveau</h1>index"
+
+    (templates / "contact.dumbo").write_text("{{ print titre; }}")
+    assert watcher.poll() == [str(templates / "contact.dumbo")]
+    assert (out / "contact.html").read_text() == "Nouveau"
+
+
+def test_watch_subdirectories(tmp_path, notify):
+    watcher, templates, out = make_site(tmp_path, notify)
+    (templates / "blog").mkdir()
+    (templates / "blog" / "post.dumbo").write_text("{{ include '../_header.dumbo'; }}post")
+    assert watcher.poll() == [str(templates / "blog" / "post.dumbo")]
+    assert (out / "blog" / "post.html").read_text() == "<h1>Site</h1>post"
+
+    (templates / "_header.dumbo").write_text("<h2>{{ print titre; }}</h2>")
+    assert watcher.poll() == [str(templates / "blog" / "post.dumbo"), str(templates / "index.dumbo")]
+
+    shutil.rmtree(templates / "blog")
+    (templates / "_header.dumbo").write_text("<h3>{{ print titre; }}</h3>")
+    assert watcher.poll() == [str(templates / "index.dumbo")]
+    assert str(templates / "blog" / "post.dumbo") not in watcher.pages
+
+
+def test_watch_lists_only_changed_directories(tmp_path, monkeypatch, notify):
+    watcher, templates, out = make_site(tmp_path, notify)
+    # aucun dossier n'a changé : les templates ne sont pas listés à nouveau
+    monkeypatch.setattr("dumbo_core.watch.os.scandir", None)
+    (templates / "about.dumbo").write_text("about us")
+    assert watcher.poll() == [str(templates / "about.dumbo")]